@@ -14,11 +14,17 @@ from .config import (
     get_defaults_for_argparse, build_config, entrypoint_configurables,
     Namespace
 )
-from .diffing.generic import set_text_similarity_options
-from .diffing.notebooks import set_notebook_diff_targets, set_notebook_diff_ignores
+from .diffing.generic import (
+    set_text_similarity_options, text_similarity_engines, set_similarity_cache_options,
+    SimilarityCache)
+from .diff_format import (
+    set_diff_validation, diff_validation_modes, DIFF_VALIDATION_ENV)
+from .diffing.notebooks import (
+    set_notebook_diff_targets, set_notebook_diff_ignores, set_notebook_cell_anchoring)
+from .diffing.snakes import set_subdiff_processes
 from .gitfiles import is_gitref
 from .ignorables import diff_ignorables
-from .log import init_logging, set_nbdime_log_level
+from .log import init_logging, set_nbdime_log_level, warning
 
 
 class ConfigBackedParser(argparse.ArgumentParser):
@@ -357,6 +363,58 @@ def add_diff_args(parser):
         default=True,
         help='do not drop whitespace-only lines before computing similarity',
     )
+    similarity.add_argument(
+        '--text-similarity-engine',
+        dest='text_similarity_engine',
+        choices=sorted(text_similarity_engines),
+        default='fast',
+        help='engine deciding whether text blocks are similar: "difflib" always '
+             'computes the difflib ratio, "fast" gives the same results but rejects '
+             'dissimilar texts early',
+    )
+    similarity.add_argument(
+        '--anchor-cells',
+        dest='anchor_cells',
+        action='store_true',
+        default=False,
+        help='align cells with a unique id or source first, and only estimate '
+             'similarity of the cells in between (faster for large notebooks)',
+    )
+    similarity.add_argument(
+        '--similarity-cache-size',
+        dest='similarity_cache_size',
+        metavar='N',
+        type=int,
+        default=4096,
+        help='maximum number of text comparisons to remember between diffs '
+             'in the same process, 0 disables the cache',
+    )
+    similarity.add_argument(
+        '--similarity-cache-eviction',
+        dest='similarity_cache_eviction',
+        choices=SimilarityCache.evictions,
+        default='lru',
+        help='which cached text comparison to forget when the cache is full',
+    )
+
+    parser.add_argument(
+        '--subdiff-processes',
+        dest='subdiff_processes',
+        metavar='N',
+        type=int,
+        default=0,
+        help='number of processes used to diff the matched cells of large '
+             'notebooks in parallel, 0 or 1 to diff sequentially. The web '
+             'servers always diff sequentially',
+    )
+    parser.add_argument(
+        '--diff-validation',
+        dest='diff_validation',
+        choices=diff_validation_modes,
+        default=None,
+        help='validate the format of computed diffs, for debugging. Defaults '
+             'to the %s environment variable, or "off".' % DIFF_VALIDATION_ENV,
+    )
 
 
 def add_diff_cli_args(parser):
@@ -365,8 +423,8 @@ def add_diff_cli_args(parser):
     parser.add_argument(
         '--color-words',
         action='store_true', default=False,
-        help=("whether to pass the --color-words flag to any internal calls "
-              "to git diff")
+        help=("whether to show changed words in multiline strings in color, "
+              "like git diff --color-words")
     )
 
 
@@ -417,7 +475,12 @@ def add_git_diff_driver_args(diff_parser):
     diff_parser.add_argument('rename_metadata', type=Path, nargs='?', default=None, action=SkipAction)
 
 
-def process_diff_flags(args):
+def process_diff_flags(args, server=False):
+    """Set up diffing from the diff arguments.
+
+    Servers pass server=True, as their threads cannot safely fork the
+    processes for diffing cells in parallel.
+    """
     any_flags_given = process_exclusive_ignorables(args, diff_ignorables)
     if any_flags_given:
         # Note: This will blow away any options set via config (for these fields)
@@ -428,7 +491,23 @@ def process_diff_flags(args):
     set_text_similarity_options(
         threshold=getattr(args, 'text_similarity_threshold', None),
         ignore_whitespace_lines=getattr(args, 'text_similarity_ignore_whitespace', None),
+        engine=getattr(args, 'text_similarity_engine', None),
+    )
+    set_similarity_cache_options(
+        maxsize=getattr(args, 'similarity_cache_size', None),
+        eviction=getattr(args, 'similarity_cache_eviction', None),
     )
+    set_notebook_cell_anchoring(getattr(args, 'anchor_cells', False))
+    subdiff_processes = getattr(args, 'subdiff_processes', None)
+    if server:
+        if subdiff_processes and subdiff_processes > 1:
+            warning('Ignoring subdiff_processes=%d in the server, diffing '
+                    'cells sequentially', subdiff_processes)
+        subdiff_processes = 0
+    set_subdiff_processes(subdiff_processes)
+    diff_validation = getattr(args, 'diff_validation', None)
+    if diff_validation is not None:
+        set_diff_validation(diff_validation)
 
 
 def resolve_diff_args(args):
@@ -542,6 +621,16 @@ def add_prettyprint_args(parser):
         default=True,
         help=("prevent use of diff/diff3 for formatting diff/merge text output")
     )
+    parser.add_argument(
+        '--render-in-process',
+        dest='render_in_process',
+        action="store_true",
+        default=False,
+        help=("format diffs of multiline strings in process from nbdime's own "
+              "diff, in the format of git diff, instead of with git or diff. "
+              "This is faster, but ambiguous changes can be placed differently "
+              "than by git")
+    )
 
 
 def prettyprint_config_from_args(arguments, **kwargs):
@@ -552,6 +641,7 @@ def prettyprint_config_from_args(arguments, **kwargs):
         use_color=getattr(arguments, 'use_color', True),
         use_git=getattr(arguments, 'use_git', True),
         use_diff=getattr(arguments, 'use_diff', True),
+        render_in_process=getattr(arguments, 'render_in_process', False),
         **kwargs
     )
 
@@ -217,8 +217,8 @@ class _Diffing(_Ignorables):
 
     color_words = Bool(
         False,
-        help=("whether to pass the --color-words flag to any internal calls "
-              "to git diff"),
+        help=("whether to show changed words in multiline strings in color, "
+              "like git diff --color-words"),
     ).tag(config=True)
 
     text_similarity_threshold = Float(
@@ -234,6 +234,50 @@ class _Diffing(_Ignorables):
         help=("ignore whitespace-only lines when estimating text similarity"),
     ).tag(config=True)
 
+    text_similarity_engine = Enum(
+        ('difflib', 'fast'),
+        'fast',
+        help=("engine deciding whether text blocks are similar: 'difflib' always "
+              "computes the difflib ratio, 'fast' gives the same results but "
+              "rejects dissimilar texts early"),
+    ).tag(config=True)
+
+    anchor_cells = Bool(
+        False,
+        help=("align cells with a unique id or source first, and only "
+              "estimate similarity of the cells in between"),
+    ).tag(config=True)
+
+    similarity_cache_size = Integer(
+        4096,
+        min=0,
+        help=("maximum number of text comparisons to remember between "
+              "diffs in the same process, 0 disables the cache"),
+    ).tag(config=True)
+
+    similarity_cache_eviction = Enum(
+        ('lru', 'fifo'),
+        'lru',
+        help=("which cached text comparison to forget when the cache is full: "
+              "the least recently used ('lru') or the oldest ('fifo')"),
+    ).tag(config=True)
+
+    subdiff_processes = Integer(
+        0,
+        min=0,
+        help=("number of processes used to diff the matched cells of large "
+              "notebooks in parallel, 0 or 1 to diff sequentially. The web "
+              "servers always diff sequentially"),
+    ).tag(config=True)
+
+    diff_validation = Enum(
+        ('off', 'shallow', 'deep'),
+        None,
+        allow_none=True,
+        help=("validate the format of computed diffs, for debugging. If unset, "
+              "the NBDIME_VALIDATE_DIFF environment variable is used, or 'off'"),
+    ).tag(config=True)
+
 
 class Diff(_Diffing):
     pass
@@ -3,7 +3,10 @@
 # Copyright (c) Jupyter Development Team.
 # Distributed under the terms of the Modified BSD License.
 
-from .log import NBDiffFormatError
+import os
+import struct
+
+from .log import NBDiffFormatError, warning
 
 
 # Sentinel to allow None as a value
@@ -16,22 +19,120 @@ ParentDeleted = object()
 Deleted = object()
 
 
-class DiffEntry(dict):
+# Validation of diffs while they are computed, one of
+#   "off": no validation,
+#   "shallow": type check entries added to diff builders, and validate
+#       the entries of diffs returned by top-level calls of
+#       nbdime.diffing.diff, i.e. with an empty path,
+#   "deep": as "shallow", but also validate nested diffs recursively.
+# Validation is off by default, as it has a measurable cost for large
+# notebooks, but the test suite turns it on.
+diff_validation_modes = ("off", "shallow", "deep")
+
+DIFF_VALIDATION_ENV = "NBDIME_VALIDATE_DIFF"
+
+
+def _diff_validation_from_env():
+    mode = os.environ.get(DIFF_VALIDATION_ENV, "off")
+    if mode not in diff_validation_modes:
+        warning("Ignoring invalid value %r of %s, expected one of %r",
+                mode, DIFF_VALIDATION_ENV, diff_validation_modes)
+        mode = "off"
+    return mode
+
+
+_diff_validation = {"mode": _diff_validation_from_env()}
+
+
+def set_diff_validation(mode):
+    """Set how diffs are validated while they are computed.
+
+    Parameters
+    ----------
+    mode: str
+        One of "off", "shallow" or "deep", see diff_validation_modes.
+    """
+    if mode not in diff_validation_modes:
+        raise ValueError("unknown diff validation mode %r, expected one of %r" % (
+            mode, diff_validation_modes))
+    _diff_validation["mode"] = mode
+
+
+def get_diff_validation():
+    """Get the current diff validation mode."""
+    return _diff_validation["mode"]
+
+
+class DiffEntry(object):
     """For internal usage in nbdime library.
 
-    Minimal class providing attribute access to diff entiry keys.
+    Compact diff entry with attribute access to its fields.
 
-    Tip: If performance dictates, we can easily replace this
-    with a namedtuple during processing of diffs and convert
-    to dicts before any json conversions.
+    Large diffs contain many entries, so the fields are stored in slots
+    instead of a dict. For compatibility, entries can also be accessed
+    as a mapping of the fields that are set, and compare equal to dicts
+    with the same items. Diffs must be converted to plain dicts with
+    diff_utils.to_clean_dicts before json serialization.
     """
-    def __getattr__(self, name):
-        if name.startswith("__") and name.endswith("__"):
-            return self.__getattribute__(name)
-        return self[name]
+    __slots__ = ("op", "key", "value", "valuelist", "length", "diff")
+
+    def __init__(self, *args, **kwargs):
+        if args:
+            # Copy fields of another entry or a dict
+            other, = args
+            for name, value in other.items():
+                setattr(self, name, value)
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except (AttributeError, TypeError):
+            raise KeyError(name)
+
+    def __setitem__(self, name, value):
+        setattr(self, name, value)
+
+    def __contains__(self, name):
+        return name in DiffEntry.__slots__ and hasattr(self, name)
+
+    def __iter__(self):
+        return (name for name in DiffEntry.__slots__ if hasattr(self, name))
 
-    def __setattr__(self, name, value):
-        self[name] = value
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [getattr(self, name) for name in self]
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self]
+
+    def get(self, name, default=None):
+        return getattr(self, name, default) if name in DiffEntry.__slots__ else default
+
+    def to_dict(self):
+        "Convert to a dict, not recursing into the fields."
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, (DiffEntry, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "DiffEntry(%s)" % ", ".join(
+            "%s=%r" % (name, value) for name, value in self.items())
 
 
 class DiffOp:
@@ -81,8 +182,22 @@ class SequenceDiffBuilder(object):
 
     def __init__(self):
         self._diff = []
+        self._sorted = True
 
     def validated(self):
+        if not self._sorted:
+            # Sort by key, with addranges before other entries on the
+            # same key. Addranges on the same key are ordered last added
+            # first, other entries in the order they were added. This is
+            # the same order as if each entry was inserted at its sorted
+            # position when added.
+            def sort_key(item):
+                i, e = item
+                if e.op == DiffOp.ADDRANGE:
+                    return (e.key, 0, -i)
+                return (e.key, 1, i)
+            self._diff = [e for i, e in sorted(enumerate(self._diff), key=sort_key)]
+            self._sorted = True
         return self._diff
 
     def append(self, entry):
@@ -91,22 +206,22 @@ class SequenceDiffBuilder(object):
             return
 
         # Typechecking (just for internal consistency checking)
-        assert isinstance(entry, DiffEntry)
-        assert "op" in entry
-        assert entry.op in SequenceDiffBuilder.OPS
-        assert "key" in entry
-
-        # Insert new entry at sorted position
-        n = len(self._diff)
-        pos = n
-        if entry.op == DiffOp.ADDRANGE:
-            # Insert addrange before removerange or patch
-            while pos > 0 and self._diff[pos-1].key >= entry.key:
-                pos -= 1
-        else:
-            while pos > 0 and self._diff[pos-1].key > entry.key:
-                pos -= 1
-        self._diff.insert(pos, entry)
+        if _diff_validation["mode"] != "off":
+            assert isinstance(entry, DiffEntry)
+            assert "op" in entry
+            assert entry.op in SequenceDiffBuilder.OPS
+            assert "key" in entry
+
+        # Entries are usually added in sorted order, otherwise
+        # defer sorting to validated()
+        if self._sorted and self._diff:
+            last = self._diff[-1].key
+            if entry.op == DiffOp.ADDRANGE:
+                # Addrange goes before removerange or patch on the same key
+                self._sorted = last < entry.key
+            else:
+                self._sorted = last <= entry.key
+        self._diff.append(entry)
 
     def patch(self, key, diff):
         if diff:
@@ -143,10 +258,11 @@ class MappingDiffBuilder(object):
             return
 
         # Typechecking (just for internal consistency checking)
-        assert isinstance(entry, DiffEntry)
-        assert "op" in entry
-        assert entry.op in MappingDiffBuilder.OPS
-        assert "key" in entry
+        if _diff_validation["mode"] != "off":
+            assert isinstance(entry, DiffEntry)
+            assert "op" in entry
+            assert entry.op in MappingDiffBuilder.OPS
+            assert "key" in entry
         assert entry.key not in self._diff
 
         # Add entry!
@@ -250,3 +366,240 @@ def validate_diff_entry(e, deep=False):
     # Note that false positives are possible, for example
     # we're not checking the values in any way, as they
     # can in principle be arbitrary json objects
+
+
+# Compact binary encoding of diffs.
+#
+# After the magic header, the diff is written as a sequence of diff
+# entries, each encoded as an op code byte followed by the key and the
+# fields of that op. Values are tagged with a type byte. Ints use
+# zigzag varints, and strings are length prefixed utf-8. Keys and
+# short strings are interned: the first occurrence is written in full
+# and added to a table, later ones by their index.
+
+BINARY_DIFF_MAGIC = b"NBDD\x01"
+
+_op_codes = {
+    DiffOp.ADD: 1,
+    DiffOp.REMOVE: 2,
+    DiffOp.REPLACE: 3,
+    DiffOp.ADDRANGE: 4,
+    DiffOp.REMOVERANGE: 5,
+    DiffOp.PATCH: 6,
+}
+_code_ops = {code: op for op, code in _op_codes.items()}
+
+(_T_NONE, _T_FALSE, _T_TRUE, _T_INT, _T_FLOAT, _T_STR, _T_NEWKEY, _T_KEY,
+ _T_LIST, _T_DICT) = range(10)
+
+_float_struct = struct.Struct(">d")
+
+# Short strings are interned like keys
+_INTERN_MAX_LENGTH = 32
+
+
+class _BinaryDiffWriter(object):
+
+    def __init__(self, fp, buffer_size=65536):
+        self.fp = fp
+        self.buffer_size = buffer_size
+        self.buf = bytearray()
+        self.keys = {}
+
+    def flush(self):
+        self.fp.write(bytes(self.buf))
+        del self.buf[:]
+
+    def uint(self, n):
+        buf = self.buf
+        while n > 0x7f:
+            buf.append((n & 0x7f) | 0x80)
+            n >>= 7
+        buf.append(n)
+
+    def key(self, s):
+        index = self.keys.get(s)
+        if index is None:
+            self.keys[s] = len(self.keys)
+            self.buf.append(_T_NEWKEY)
+            data = s.encode("utf8")
+            self.uint(len(data))
+            self.buf += data
+        else:
+            self.buf.append(_T_KEY)
+            self.uint(index)
+
+    def value(self, v):
+        buf = self.buf
+        if v is None:
+            buf.append(_T_NONE)
+        elif v is True:
+            buf.append(_T_TRUE)
+        elif v is False:
+            buf.append(_T_FALSE)
+        elif isinstance(v, int):
+            buf.append(_T_INT)
+            self.uint(v << 1 if v >= 0 else ((-v) << 1) - 1)
+        elif isinstance(v, float):
+            buf.append(_T_FLOAT)
+            buf += _float_struct.pack(v)
+        elif isinstance(v, str) and len(v) <= _INTERN_MAX_LENGTH:
+            self.key(v)
+        elif isinstance(v, str):
+            buf.append(_T_STR)
+            data = v.encode("utf8")
+            self.uint(len(data))
+            buf += data
+        elif isinstance(v, (list, tuple)):
+            buf.append(_T_LIST)
+            self.uint(len(v))
+            for item in v:
+                self.value(item)
+        elif isinstance(v, dict):
+            buf.append(_T_DICT)
+            self.uint(len(v))
+            for k, item in v.items():
+                self.key(k)
+                self.value(item)
+        else:
+            raise TypeError("Cannot encode value of type {}".format(type(v).__name__))
+        if len(buf) >= self.buffer_size:
+            self.flush()
+
+    def diff(self, di):
+        self.uint(len(di))
+        for e in di:
+            op = e.op
+            self.buf.append(_op_codes[op])
+            if isinstance(e.key, str):
+                self.key(e.key)
+            else:
+                self.value(e.key)
+            if op in (DiffOp.ADD, DiffOp.REPLACE):
+                self.value(e.value)
+            elif op == DiffOp.ADDRANGE:
+                self.value(e.valuelist)
+            elif op == DiffOp.REMOVERANGE:
+                self.uint(e.length)
+            elif op == DiffOp.PATCH:
+                self.diff(e.diff)
+
+
+class _BinaryDiffReader(object):
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+        self.keys = []
+
+    def byte(self):
+        b = self.data[self.pos]
+        self.pos += 1
+        return b
+
+    def uint(self):
+        data = self.data
+        n = 0
+        shift = 0
+        while True:
+            b = data[self.pos]
+            self.pos += 1
+            n |= (b & 0x7f) << shift
+            if b < 0x80:
+                return n
+            shift += 7
+
+    def str(self):
+        n = self.uint()
+        start = self.pos
+        self.pos += n
+        return bytes(self.data[start:self.pos]).decode("utf8")
+
+    def value(self):
+        t = self.byte()
+        if t == _T_STR:
+            return self.str()
+        elif t == _T_INT:
+            n = self.uint()
+            return -((n + 1) >> 1) if n & 1 else n >> 1
+        elif t == _T_KEY:
+            return self.keys[self.uint()]
+        elif t == _T_NEWKEY:
+            s = self.str()
+            self.keys.append(s)
+            return s
+        elif t == _T_DICT:
+            d = {}
+            for _ in range(self.uint()):
+                k = self.value()
+                d[k] = self.value()
+            return d
+        elif t == _T_LIST:
+            return [self.value() for _ in range(self.uint())]
+        elif t == _T_NONE:
+            return None
+        elif t == _T_TRUE:
+            return True
+        elif t == _T_FALSE:
+            return False
+        elif t == _T_FLOAT:
+            start = self.pos
+            self.pos += 8
+            return _float_struct.unpack(self.data[start:self.pos])[0]
+        raise NBDiffFormatError("Invalid value type {} in binary diff.".format(t))
+
+    def diff(self):
+        di = []
+        for _ in range(self.uint()):
+            op = _code_ops.get(self.byte())
+            if op is None:
+                raise NBDiffFormatError("Invalid op in binary diff.")
+            key = self.value()
+            if op in (DiffOp.ADD, DiffOp.REPLACE):
+                e = DiffEntry(op=op, key=key, value=self.value())
+            elif op == DiffOp.REMOVE:
+                e = DiffEntry(op=op, key=key)
+            elif op == DiffOp.ADDRANGE:
+                e = DiffEntry(op=op, key=key, valuelist=self.value())
+            elif op == DiffOp.REMOVERANGE:
+                e = DiffEntry(op=op, key=key, length=self.uint())
+            else:
+                e = DiffEntry(op=op, key=key, diff=self.diff())
+            di.append(e)
+        return di
+
+
+def write_binary_diff(diff, fp):
+    """Write diff to the binary file fp in the compact binary format.
+
+    Values must be json-like, as for the JSON format.
+    """
+    writer = _BinaryDiffWriter(fp)
+    writer.buf += BINARY_DIFF_MAGIC
+    writer.diff(diff)
+    writer.flush()
+
+
+def read_binary_diff(fp):
+    "Read a diff written by write_binary_diff from the binary file fp."
+    data = memoryview(fp.read())
+    if bytes(data[:len(BINARY_DIFF_MAGIC)]) != BINARY_DIFF_MAGIC:
+        raise NBDiffFormatError("Not a binary diff.")
+    reader = _BinaryDiffReader(data)
+    reader.pos = len(BINARY_DIFF_MAGIC)
+    try:
+        diff = reader.diff()
+    except (IndexError, struct.error, UnicodeDecodeError):
+        raise NBDiffFormatError("Truncated or corrupt binary diff.")
+    if reader.pos != len(data):
+        raise NBDiffFormatError("Trailing data after binary diff.")
+    return diff
+
+
+def is_binary_diff(fp):
+    "Check whether the binary file fp holds a binary diff, without moving the file position."
+    pos = fp.tell()
+    try:
+        return fp.read(len(BINARY_DIFF_MAGIC)) == BINARY_DIFF_MAGIC
+    finally:
+        fp.seek(pos)
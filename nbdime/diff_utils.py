@@ -3,7 +3,9 @@
 # Copyright (c) Jupyter Development Team.
 # Distributed under the terms of the Modified BSD License.
 
+import hashlib
 import itertools
+import json
 import copy
 
 from .diff_format import DiffOp, DiffEntry, op_addrange, op_removerange
@@ -149,8 +151,8 @@ def flatten_list_of_string_diff(a, linebased_diff):
 
 
 def to_clean_dicts(di):
-    "Recursively convert dict-like objects to straight python dicts."
-    if isinstance(di, dict):
+    "Recursively convert dict-like objects and diff entries to straight python dicts."
+    if isinstance(di, (dict, DiffEntry)):
         return {k: to_clean_dicts(v) for k, v in di.items()}
     elif isinstance(di, list):
         return [to_clean_dicts(v) for v in di]
@@ -158,14 +160,220 @@ def to_clean_dicts(di):
         return di
 
 
+class _DiffEncoder(json.JSONEncoder):
+    "Encodes diff entries nested in plain values like dicts."
+    def default(self, o):
+        if isinstance(o, DiffEntry):
+            return dict(o.items())
+        return super().default(o)
+
+
+_compact_encoder = _DiffEncoder(separators=(",", ":"))
+
+
+def _leaf_encoder(indent):
+    if indent is None:
+        return _compact_encoder
+    return _DiffEncoder(indent=indent, separators=(",", ": "))
+
+
+def _is_diff(items):
+    return bool(items) and isinstance(items[0], DiffEntry)
+
+
+def iter_json(di, indent=None, _level=0):
+    """Serialize dict-like objects and diff entries to JSON, piece by piece.
+
+    Produces the same text as json.dumps(to_clean_dicts(di)), compact
+    unless indent is given, without building the whole string or
+    converting the diff entries to dicts first.
+
+    Only the top-level container, its items, and diffs down to their
+    entries without subdiffs are serialized piece by piece, all other
+    values are encoded in one go by the json module.
+    """
+    if (isinstance(di, DiffEntry) and "diff" in di) or (
+            _level < 2 and isinstance(di, dict)):
+        open_, close = "{", "}"
+        items = di.items()
+    elif isinstance(di, (list, tuple)) and (_level < 2 or _is_diff(di)):
+        open_, close = "[", "]"
+        items = di
+    else:
+        text = _leaf_encoder(indent).encode(di)
+        if indent is not None and _level:
+            # Strings never contain raw newlines in JSON
+            text = text.replace("\n", "\n" + " " * (indent * _level))
+        yield text
+        return
+    if not items:
+        yield open_ + close
+        return
+    if indent is None:
+        newline = ""
+        separator = ","
+    else:
+        newline = "\n" + " " * (indent * (_level + 1))
+        separator = "," + newline
+    yield open_ + newline
+    first = True
+    for item in items:
+        if not first:
+            yield separator
+        first = False
+        if open_ == "{":
+            key, item = item
+            if not isinstance(key, str):
+                key = _compact_encoder.encode(key).strip('"')
+            yield _compact_encoder.encode(key) + (":" if indent is None else ": ")
+        yield from iter_json(item, indent, _level + 1)
+    if indent is None:
+        yield close
+    else:
+        yield "\n" + " " * (indent * _level) + close
+
+
+def iter_json_chunks(di, indent=None, chunk_size=65536):
+    "Serialize to JSON like iter_json, but in chunks of about chunk_size characters."
+    chunk = []
+    size = 0
+    for s in iter_json(di, indent):
+        chunk.append(s)
+        size += len(s)
+        if size >= chunk_size:
+            yield "".join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield "".join(chunk)
+
+
+def write_json(di, fp, indent=None):
+    "Write dict-like objects and diff entries as JSON to the text file fp incrementally."
+    for chunk in iter_json_chunks(di, indent):
+        fp.write(chunk)
+
+
+BLOB_REF_KEY = "nbdime_blob"
+
+# Wraps dicts in externalized values that could be mistaken
+# for blob references, or for such wrapped dicts
+BLOB_ESCAPE_KEY = "nbdime_blob_escaped"
+
+
+def blob_digest(value):
+    "Content address of a string blob."
+    return "sha256:" + hashlib.sha256(value.encode("utf8")).hexdigest()
+
+
+def blobs_filename(filename):
+    "Name of the file storing the blobs externalized from the diff in filename."
+    return str(filename) + ".blobs.json"
+
+
+def _is_blob_marker(value):
+    return len(value) == 1 and (BLOB_REF_KEY in value or BLOB_ESCAPE_KEY in value)
+
+
+def _externalize_value(value, threshold, blobs):
+    if isinstance(value, str):
+        if len(value) < threshold:
+            return value
+        digest = blob_digest(value)
+        blobs[digest] = value
+        return {BLOB_REF_KEY: digest}
+    elif isinstance(value, dict):
+        items = [(k, _externalize_value(v, threshold, blobs)) for k, v in value.items()]
+        if _is_blob_marker(value):
+            return {BLOB_ESCAPE_KEY: type(value)(items)}
+        if all(v is value[k] for k, v in items):
+            return value
+        return type(value)(items)
+    elif isinstance(value, list):
+        values = [_externalize_value(v, threshold, blobs) for v in value]
+        if all(v is w for v, w in zip(values, value)):
+            return value
+        return values
+    return value
+
+
+def _internalize_value(value, blobs):
+    if isinstance(value, dict):
+        if len(value) == 1 and BLOB_REF_KEY in value:
+            try:
+                return blobs[value[BLOB_REF_KEY]]
+            except KeyError:
+                raise NBDiffFormatError("Missing blob {}".format(value[BLOB_REF_KEY]))
+        if len(value) == 1 and BLOB_ESCAPE_KEY in value:
+            value = value[BLOB_ESCAPE_KEY]
+            if not isinstance(value, dict):
+                raise NBDiffFormatError("Invalid escaped blob reference {!r}".format(value))
+        return type(value)((k, _internalize_value(v, blobs)) for k, v in value.items())
+    elif isinstance(value, list):
+        return [_internalize_value(v, blobs) for v in value]
+    return value
+
+
+def _map_diff_values(di, f):
+    "Recreate diff with f applied to the values of add, replace and addrange entries."
+    newdi = []
+    for e in di:
+        op = e.op
+        if op in (DiffOp.ADD, DiffOp.REPLACE):
+            value = f(e.value)
+            if value is not e.value:
+                e = DiffEntry(e)
+                e.value = value
+        elif op == DiffOp.ADDRANGE and isinstance(e.valuelist, list):
+            valuelist = f(e.valuelist)
+            if valuelist is not e.valuelist:
+                e = DiffEntry(e)
+                e.valuelist = valuelist
+        elif op == DiffOp.PATCH:
+            subdi = _map_diff_values(e.diff, f)
+            if any(a is not b for a, b in zip(subdi, e.diff)):
+                e = DiffEntry(e)
+                e.diff = subdi
+        newdi.append(e)
+    return newdi
+
+
+def externalize_blobs(di, threshold, blobs=None):
+    """Replace large strings in the values of a diff by blob references.
+
+    Strings of at least threshold characters in values that are added
+    or replaced by diff are replaced by {BLOB_REF_KEY: digest}, where
+    digest is the blob_digest of the string. Returns the new diff,
+    sharing unchanged entries with di, and a dict mapping the digests
+    to the strings. If blobs is given, it is updated and returned.
+
+    Dicts in the values that could be mistaken for blob references
+    are wrapped as {BLOB_ESCAPE_KEY: dict}, which internalize_blobs
+    unwraps.
+    """
+    if blobs is None:
+        blobs = {}
+    di = _map_diff_values(di, lambda v: _externalize_value(v, threshold, blobs))
+    return di, blobs
+
+
+def internalize_blobs(di, blobs):
+    "Reverse externalize_blobs, replacing blob references by the strings in blobs."
+    return _map_diff_values(di, lambda v: _internalize_value(v, blobs))
+
+
 def to_diffentry_dicts(di):  # TODO: Better name, validate_diff? as_diff?
-    "Recursively convert dict objects to DiffEntry objects with attribute access."
-    if isinstance(di, dict):
-        return DiffEntry(**{k: to_diffentry_dicts(v) for k, v in di.items()})
-    elif isinstance(di, list):
+    """Recursively convert a diff of dict objects to DiffEntry objects.
+
+    Only the diff entries are converted, any values to add
+    or replace are left as they are.
+    """
+    if isinstance(di, list):
         return [to_diffentry_dicts(v) for v in di]
-    else:
-        return di
+    e = DiffEntry(di)
+    if "diff" in e:
+        e.diff = to_diffentry_dicts(e.diff)
+    return e
 
 def as_dict_based_diff(di):
     """Converting to dict-based diff format for dicts for convenience.
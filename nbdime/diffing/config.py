@@ -2,7 +2,7 @@
 class DiffConfig:
     """Set of predicates/differs/other configs to pass around"""
 
-    def __init__(self, *, predicates=None, differs=None, atomic_paths=None):
+    def __init__(self, *, predicates=None, differs=None, atomic_paths=None, anchors=None):
         if predicates is None:
             from .generic import default_predicates
             predicates = default_predicates()
@@ -14,6 +14,11 @@ class DiffConfig:
         self.predicates = predicates
         self.differs = differs
         self._atomic_paths = atomic_paths or {}
+        # Key functions for anchoring sequences before multilevel diffing, by path
+        self.anchors = anchors if anchors is not None else {}
+        # Interning table for lines, shared by the string diffs of one
+        # diff call if set (see diffing.sequences.LineTable)
+        self.line_table = None
 
     def diff_item_at_path(self, a, b, path):
         """Calculate the diff for path."""
@@ -31,4 +36,5 @@ class DiffConfig:
             predicates=self.predicates.copy(),
             differs=self.differs.copy(),
             atomic_paths=self._atomic_paths.copy(),
+            anchors=self.anchors.copy(),
         )
@@ -4,15 +4,19 @@
 # Distributed under the terms of the Modified BSD License.
 
 import operator
-from collections import defaultdict
+from collections import defaultdict, namedtuple, Counter, OrderedDict
 import difflib
+import hashlib
+import threading
 
-from ..diff_format import SequenceDiffBuilder, MappingDiffBuilder, validate_diff
+from ..diff_format import (
+    SequenceDiffBuilder, MappingDiffBuilder, validate_diff, get_diff_validation)
 from ..diff_utils import count_consumed_symbols
 
 from .config import DiffConfig
 from .sequences import diff_strings_linewise, diff_sequence
-from .snakes import compute_snakes_multilevel, compute_diff_from_snakes
+from .snakes import (
+    compute_snakes_multilevel, compute_snakes_anchored, compute_diff_from_snakes)
 
 __all__ = ["diff"]
 
@@ -20,10 +24,11 @@ __all__ = ["diff"]
 _text_similarity_settings = {
     "threshold": 0.3,
     "ignore_whitespace_lines": True,
+    "engine": "fast",
 }
 
 
-def set_text_similarity_options(threshold: int | float | None = None, ignore_whitespace_lines: bool | None = None) -> None:
+def set_text_similarity_options(threshold: int | float | None = None, ignore_whitespace_lines: bool | None = None, engine: str | None = None) -> None:
     """Configure defaults for approximate string comparisons.
 
     Parameters
@@ -33,6 +38,9 @@ def set_text_similarity_options(threshold: int | float | None = None, ignore_whi
         explicit threshold is provided.
     ignore_whitespace_lines: bool, optional
         Whether to drop whitespace-only lines before computing similarity.
+    engine: str, optional
+        Name of the similarity engine used by compare_strings_approximate,
+        one of the keys of text_similarity_engines.
     """
 
     if threshold is not None:
@@ -45,6 +53,12 @@ def set_text_similarity_options(threshold: int | float | None = None, ignore_whi
     if ignore_whitespace_lines is not None:
         _text_similarity_settings["ignore_whitespace_lines"] = bool(ignore_whitespace_lines)
 
+    if engine is not None:
+        if engine not in text_similarity_engines:
+            raise ValueError("unknown text similarity engine %r, expected one of %r" % (
+                engine, sorted(text_similarity_engines)))
+        _text_similarity_settings["engine"] = engine
+
 
 def get_text_similarity_options() -> dict:
     """Return a copy of the current similarity defaults."""
@@ -60,28 +74,23 @@ def default_differs():
     return defaultdict(lambda: diff)
 
 
-def compare_strings_approximate(x: str, y: str, threshold: float=0.7, maxlen: int | None = None, min_divergence_to_be_unsimilar: int | None = None, min_match_length_to_be_similar: int | None = None):
-    "Compare two strings with approximate heuristics."
-
-    # Fast cutoff when one is empty
-    if bool(x) != bool(y):
+def _difflib_ratio_decision(s, threshold, min_match_length_to_be_similar):
+    "Final decision of approximate comparison from a SequenceMatcher."
+    if not s.ratio() > threshold:
         return False
 
-    # Cutoff on equality: Python has fast hash functions for strings,
-    # and lists of strings also works fine
-    if len(x) == len(y) and x == y:
-        return True
-    
-    if min_divergence_to_be_unsimilar is not None and len(x) <= min_divergence_to_be_unsimilar and len(y) <= min_divergence_to_be_unsimilar:
+    if min_match_length_to_be_similar is not None:
+        longest = max((m.size for m in s.get_matching_blocks()), default=0)
+        return longest >= min_match_length_to_be_similar
+    else:
         return True
 
-    if min_match_length_to_be_similar is not None and (len(x) < min_match_length_to_be_similar or len(y) < min_match_length_to_be_similar):
-        return False
 
-    # TODO: Investigate performance and quality of this difflib ratio approach,
-    # possibly one of the weakest links of the notebook diffing algorithm.
-    # Alternatives to try are the libraries diff-patch-match and Levenschtein
+def similar_difflib(x, y, threshold, maxlen=None, min_match_length_to_be_similar=None):
+    """Decide similarity of x and y by the difflib SequenceMatcher ratio.
 
+    This is the reference similarity engine.
+    """
     # Informal benchmark normalized to operator ==:
     #    1.0  operator ==
     #  438.2  real_quick_ratio
@@ -96,9 +105,6 @@ def compare_strings_approximate(x: str, y: str, threshold: float=0.7, maxlen: in
     # s = difflib.SequenceMatcher(lambda c: c in (" ", "\t"), x, y, autojunk=False)
     s = difflib.SequenceMatcher(None, x, y, autojunk=False)
 
-    if min_divergence_to_be_unsimilar is not None:
-        threshold = max(threshold, min_divergence_to_be_unsimilar / max(len(x), len(y)))
-
     # Use only the fast ratio approximations first
     if s.real_quick_ratio() < threshold:
         return False
@@ -109,14 +115,244 @@ def compare_strings_approximate(x: str, y: str, threshold: float=0.7, maxlen: in
         # We know from above that there is not an exact similarity
         return False
 
-    if not s.ratio() > threshold:
+    return _difflib_ratio_decision(s, threshold, min_match_length_to_be_similar)
+
+
+def _lcs_upper_bound_exceeds(x, y, threshold):
+    """Check whether 2*llcs(x, y)/(len(x)+len(y)) > threshold.
+
+    Computes the length of the longest common subsequence with the
+    bit-parallel algorithm of Allison-Dix/Hyyrö, processing one item of
+    the shortest sequence per iteration, and exits early once the
+    threshold is provably unreachable.
+    """
+    if len(x) < len(y):
+        x, y = y, x
+    n, m = len(x), len(y)
+    total = n + m
+
+    # Bit masks of positions of each item in x
+    masks = {}
+    for i, c in enumerate(x):
+        masks[c] = masks.get(c, 0) | (1 << i)
+
+    # Zero bits in V mark the matched positions of x
+    full = (1 << n) - 1
+    V = full
+    for k, c in enumerate(y, 1):
+        U = V & masks.get(c, 0)
+        V = ((V + U) | (V - U)) & full
+        if not k & 31:
+            # At most one more match per remaining item of y
+            if not 2.0 * (n - V.bit_count() + m - k) / total > threshold:
+                return False
+    return 2.0 * (n - V.bit_count()) / total > threshold
+
+
+def similar_fast(x, y, threshold, maxlen=None, min_match_length_to_be_similar=None):
+    """Decide similarity of x and y with the same result as similar_difflib.
+
+    The difflib ratio is 2*M/T where M is the number of items in the
+    matching blocks found by SequenceMatcher, which form a common
+    subsequence of x and y. This engine first rejects pairs with cheap
+    upper bounds of M: the shortest length, the multiset intersection
+    (as quick_ratio, but counted in C), and the length of the longest
+    common subsequence. The expensive SequenceMatcher is only used for
+    pairs that may be similar.
+    """
+    total = len(x) + len(y)
+
+    # Same as real_quick_ratio
+    if 2.0 * min(len(x), len(y)) / total < threshold:
         return False
-    
-    if min_match_length_to_be_similar is not None:
-        longest = max((m.size for m in s.get_matching_blocks()), default=0)
-        return longest >= min_match_length_to_be_similar
+
+    if maxlen is not None and len(x) > maxlen and len(y) > maxlen:
+        return False
+
+    # Same as quick_ratio
+    matches = sum((Counter(x) & Counter(y)).values())
+    if 2.0 * matches / total < threshold:
+        return False
+
+    if not _lcs_upper_bound_exceeds(x, y, threshold):
+        return False
+
+    s = difflib.SequenceMatcher(None, x, y, autojunk=False)
+    return _difflib_ratio_decision(s, threshold, min_match_length_to_be_similar)
+
+
+# Engines for deciding similarity in compare_strings_approximate,
+# selectable with set_text_similarity_options(engine=...)
+text_similarity_engines = {
+    "difflib": similar_difflib,
+    "fast": similar_fast,
+}
+
+
+SimilarityCacheInfo = namedtuple(
+    "SimilarityCacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+def content_digest(value):
+    """Compute a digest of a string or a list of strings.
+
+    Returns None for other values, which can not be cached.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(value, str):
+        h.update(b"s")
+        h.update(value.encode("utf-8", "surrogatepass"))
+    elif isinstance(value, list) and all(isinstance(v, str) for v in value):
+        h.update(b"l")
+        for v in value:
+            v = v.encode("utf-8", "surrogatepass")
+            h.update(len(v).to_bytes(8, "little"))
+            h.update(v)
     else:
+        return None
+    return h.digest()
+
+
+class SimilarityCache(object):
+    """Bounded cache of the decisions of compare_strings_approximate.
+
+    Entries are keyed on content digests of the compared texts together
+    with all parameters of the decision, so entries stay valid across
+    diffs and configuration changes without holding on to the texts.
+    A single instance, similarity_cache, is shared by all diffs in a
+    process, such that e.g. the server extension reuses comparisons
+    when diffing revisions of the same notebook repeatedly.
+
+    Parameters
+    ----------
+    maxsize: int
+        Maximum number of entries, 0 disables the cache.
+    eviction: str
+        Which entry to evict when full: "lru" for the least recently
+        used, or "fifo" for the oldest.
+    """
+
+    evictions = ("lru", "fifo")
+
+    def __init__(self, maxsize=4096, eviction="lru"):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.maxsize = 0
+        self.eviction = "lru"
+        self.configure(maxsize, eviction)
+
+    def configure(self, maxsize=None, eviction=None):
+        "Change size and/or eviction policy, evicting entries if needed."
+        if maxsize is not None:
+            if not isinstance(maxsize, int) or maxsize < 0:
+                raise ValueError("similarity cache size must be a non-negative integer")
+            self.maxsize = maxsize
+        if eviction is not None:
+            if eviction not in self.evictions:
+                raise ValueError("unknown similarity cache eviction %r, expected one of %r" % (
+                    eviction, self.evictions))
+            self.eviction = eviction
+        with self._lock:
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        "Return the cached decision for key, or None if missing."
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                if self.eviction == "lru":
+                    self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        "Store a decision for key."
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._entries[key] = value
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        "Remove all entries and reset the counters."
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def cache_info(self):
+        "Report cache statistics, similar to functools.lru_cache."
+        return SimilarityCacheInfo(
+            self.hits, self.misses, self.maxsize, len(self._entries))
+
+
+similarity_cache = SimilarityCache()
+
+
+def set_similarity_cache_options(maxsize=None, eviction=None):
+    """Configure the similarity cache shared by all diffs in this process.
+
+    Parameters
+    ----------
+    maxsize: int, optional
+        Maximum number of cached comparisons, 0 disables the cache.
+    eviction: str, optional
+        Eviction policy when the cache is full, "lru" or "fifo".
+    """
+    similarity_cache.configure(maxsize, eviction)
+
+
+def compare_strings_approximate(x: str, y: str, threshold: float=0.7, maxlen: int | None = None, min_divergence_to_be_unsimilar: int | None = None, min_match_length_to_be_similar: int | None = None):
+    "Compare two strings with approximate heuristics."
+
+    # Fast cutoff when one is empty
+    if bool(x) != bool(y):
+        return False
+
+    # Cutoff on equality: Python has fast hash functions for strings,
+    # and lists of strings also works fine
+    if len(x) == len(y) and x == y:
         return True
+    
+    if min_divergence_to_be_unsimilar is not None and len(x) <= min_divergence_to_be_unsimilar and len(y) <= min_divergence_to_be_unsimilar:
+        return True
+
+    if min_match_length_to_be_similar is not None and (len(x) < min_match_length_to_be_similar or len(y) < min_match_length_to_be_similar):
+        return False
+
+    if min_divergence_to_be_unsimilar is not None:
+        threshold = max(threshold, min_divergence_to_be_unsimilar / max(len(x), len(y)))
+
+    # All engines reject on the length ratio first (as real_quick_ratio),
+    # which is cheaper than computing the digests for the cache
+    if 2.0 * min(len(x), len(y)) / (len(x) + len(y)) < threshold:
+        return False
+
+    engine = _text_similarity_settings["engine"]
+    key = None
+    if similarity_cache.maxsize:
+        dx = content_digest(x)
+        dy = content_digest(y)
+        if dx is not None and dy is not None:
+            key = (dx, dy, engine, threshold, maxlen, min_match_length_to_be_similar)
+            similar = similarity_cache.get(key)
+            if similar is not None:
+                return similar
+
+    # The difflib ratio approach is possibly one of the weakest links
+    # of the notebook diffing algorithm, see text_similarity_engines
+    # for alternative implementations of the decision.
+    similar = text_similarity_engines[engine](
+        x, y, threshold, maxlen, min_match_length_to_be_similar)
+    if key is not None:
+        similarity_cache.put(key, similar)
+    return similar
 
 
 def diff(a, b, path="", config=None):
@@ -133,12 +369,16 @@ def diff(a, b, path="", config=None):
         # Don't pass differs/predicates as the only possible use case is to
         # use a different character differ within each line or predicates
         # for comparing lines
-        d = diff_strings_linewise(a, b)
+        d = diff_strings_linewise(a, b, line_table=config.line_table)
     else:
         raise RuntimeError("Can currently only diff list, dict, or str objects.")
 
-    # We can turn this off for performance after the library has been well tested:
-    validate_diff(d)
+    # Off by default for performance, see nbdime.diff_format.set_diff_validation.
+    # Subdiffs are diffed at a subpath, validate only the diff of the top-level
+    # call, which includes them
+    validation = get_diff_validation()
+    if validation != "off" and not path:
+        validate_diff(d, deep=validation == "deep")
 
     return d
 
@@ -150,8 +390,8 @@ def diff_string_lines(a, b, path="", config=None):
     # since we know we can rely on __eq__ comparison
     if len(a) == len(b) and a == b:
         return []
-    
-    return diff_strings_linewise(a, b)
+
+    return diff_strings_linewise(a, b, line_table=config.line_table if config else None)
 
 
 def diff_sequence_multilevel(a, b, path="", config=None):
@@ -160,9 +400,14 @@ def diff_sequence_multilevel(a, b, path="", config=None):
     if config is None:
         config = DiffConfig()
 
-    # Invoke multilevel snake computation algorithm
+    # Invoke multilevel snake computation algorithm, optionally
+    # anchored on items that are uniquely identified by a key
     compares = config.predicates[path or '/']
-    snakes = compute_snakes_multilevel(a, b, compares)
+    anchors = config.anchors.get(path or '/')
+    if anchors:
+        snakes = compute_snakes_anchored(a, b, compares, anchors)
+    else:
+        snakes = compute_snakes_multilevel(a, b, compares)
 
     # Convert snakes to diff
     return compute_diff_from_snakes(a, b, snakes, path=path, config=config)
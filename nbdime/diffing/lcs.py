@@ -18,14 +18,33 @@ def diff_from_lcs(A, B, A_indices, B_indices):
     for r in range(llcs):
         i = A_indices[r]
         j = B_indices[r]
-        if i > x:
-            di.removerange(x, i-x)
         if j > y:
             di.addrange(x, B[y:j])
+        if i > x:
+            di.removerange(x, i-x)
         x = i + 1
         y = j + 1
-    if x < N:
-        di.removerange(x, N-x)
     if y < M:
         di.addrange(x, B[y:M])
+    if x < N:
+        di.removerange(x, N-x)
     return di.validated()
+
+
+def snakes_from_lcs(A_indices, B_indices):
+    """Compute snakes from indices of the lcs of two sequences.
+
+    Return a list of snakes, where each snake is a tuple (i,j,n)
+    representing a range of n elements that compare equal
+    in A and B starting at i and j, merging contiguous lcs entries.
+    """
+    snakes = [(0, 0, 0)]
+    for i, j in zip(A_indices, B_indices):
+        if snakes[-1][0] + snakes[-1][2] == i and snakes[-1][1] + snakes[-1][2] == j:
+            snake = snakes[-1]
+            snakes[-1] = (snake[0], snake[1], snake[2] + 1)
+        else:
+            snakes.append((i, j, 1))
+    if snakes[0][2] == 0:
+        snakes.pop(0)
+    return snakes
@@ -13,7 +13,7 @@ Up- and down-conversion is handled by nbformat.
 import operator
 import re
 import copy
-from functools import lru_cache
+from collections import Counter
 
 from ..diff_format import MappingDiffBuilder, DiffOp
 from ..utils import defaultdict2
@@ -23,6 +23,10 @@ from .generic import (
     diff, diff_sequence_multilevel, compare_strings_approximate,
     diff_string_lines, get_text_similarity_options,
 )
+from .sequences import LineTable
+from .snakes import (
+    compute_snakes_multilevel, compute_snakes_anchored, compute_diff_from_snakes,
+)
 
 __all__ = ["diff_notebooks"]
 
@@ -66,7 +70,6 @@ def _prepare_text_for_similarity(value: str | list[str], ignore_whitespace_lines
     return value
 
 
-@lru_cache(maxsize=1024, typed=False)
 def compare_text_approximate(x, y, maxlen=None):
     settings = get_text_similarity_options()
 
@@ -109,7 +112,6 @@ def compare_base64_strict(x, y):
     return x == y
 
 
-@lru_cache(maxsize=128, typed=False)
 def _compare_mimedata_strings(x, y, comp_text, comp_base64):
     # Most likely base64 encoded data
     if _is_base64(x):
@@ -384,6 +386,213 @@ def compare_cell_by_ids(x, y):
     return 'id' in x and 'id' in y and x['id'] == y['id']
 
 
+def cell_id_key(cell):
+    """Key for anchoring cells on their id (nbformat 4.5+)."""
+    return cell.get("id")
+
+
+def cell_source_key(cell):
+    """Key for anchoring cells on their cell type and exact source."""
+    source = cell.get("source")
+    if isinstance(source, list):
+        source = "".join(source)
+    if not source:
+        # Empty cells are too common to be good anchors
+        return None
+    return (cell["cell_type"], source)
+
+
+def _freeze(value):
+    """Convert a json-like value to a hashable value with the same equality."""
+    if isinstance(value, dict):
+        return frozenset((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class CellFingerprint(object):
+    """Precomputed summary of a cell, used to cheaply reject cell pairs.
+
+    The cell predicates in notebook_predicates["/cells"] are evaluated
+    for many pairs of cells, and each level would otherwise join and
+    normalize the sources and walk the outputs of both cells again for
+    every pair. A fingerprint is computed once per cell and diff, and the
+    rejection tests made by make_cell_rejects only answer True for pairs
+    that the full predicate would also find unequal, so the alignment
+    is unaffected.
+    """
+
+    __slots__ = (
+        "cell", "cell_type", "string_source", "source", "source_hash",
+        "normalized_length", "_source_counts",
+        "output_signature", "output_hashes",
+    )
+
+    def __init__(self, cell, ignore_whitespace_lines):
+        self.cell = cell
+        self.cell_type = cell.get("cell_type")
+
+        source = cell.get("source", "")
+        # compare_text_approximate is given the raw source
+        self.string_source = isinstance(source, str)
+        source = _prepare_text_for_similarity(source, False)
+        self.source = source
+        self.source_hash = hash(source)
+        self.normalized_length = len(
+            _prepare_text_for_similarity(source, ignore_whitespace_lines))
+        self._source_counts = None
+
+        # Parts of the outputs that must match exactly for the outputs
+        # to be approximately (signature) or strictly (hashes) equal
+        outputs = cell.get("outputs") or ()
+        self.output_signature = tuple(
+            hash((o.get("output_type"), frozenset(o), _freeze(o.get("name")),
+                  _freeze(o.get("ename")), _freeze(o.get("evalue"))))
+            for o in outputs)
+        self.output_hashes = tuple(
+            hash((o.get("output_type"), frozenset(o), _freeze(
+                {k: v for k, v in o.items() if k not in ("output_type", "data")})))
+            for o in outputs)
+
+    @property
+    def source_counts(self):
+        "Character counts of the source, computed on first use."
+        if self._source_counts is None:
+            self._source_counts = Counter(self.source)
+        return self._source_counts
+
+
+def _reject_by_ratio_bounds(fx, fy, threshold):
+    """Whether the difflib ratio of the sources is certainly below threshold.
+
+    Uses the same real_quick_ratio and quick_ratio bounds as the text
+    similarity engines, with the character counts computed once per cell.
+    """
+    lx = len(fx.source)
+    ly = len(fy.source)
+    total = lx + ly
+    if 2.0 * min(lx, ly) / total < threshold:
+        return True
+    matches = sum((fx.source_counts & fy.source_counts).values())
+    return 2.0 * matches / total < threshold
+
+
+def _maybe_equal_sources(fx, fy):
+    return len(fx.source) == len(fy.source) and fx.source_hash == fy.source_hash
+
+
+def make_cell_rejects(settings):
+    """Make fingerprint based rejection tests for the cell predicates.
+
+    Returns a dict mapping each cell predicate to a function taking two
+    CellFingerprint objects, which returns True only if the predicate
+    would return False for the cells.
+    """
+
+    def reject_text_approximate(fx, fy):
+        # Mirrors compare_text_approximate and compare_strings_approximate
+        if not (fx.string_source and fy.string_source):
+            return False
+        lx = len(fx.source)
+        ly = len(fy.source)
+        if bool(lx) != bool(ly):
+            return True
+        if _maybe_equal_sources(fx, fy):
+            return False
+        if lx <= 10 and ly <= 10:
+            return False
+        max_len = max(fx.normalized_length, fy.normalized_length)
+        min_match_length = min(MIN_MATCH_LENGTH, max_len - 1)
+        if lx < min_match_length or ly < min_match_length:
+            return True
+        threshold = max(settings["threshold"], 10 / max(lx, ly))
+        return _reject_by_ratio_bounds(fx, fy, threshold)
+
+    def reject_text_strict(fx, fy):
+        # Mirrors compare_text_strict
+        if bool(fx.source) != bool(fy.source):
+            return True
+        if _maybe_equal_sources(fx, fy):
+            return False
+        return _reject_by_ratio_bounds(fx, fy, 0.95)
+
+    # Outputs can only be aligned without additions or removals if
+    # all pairs of outputs have the same signature, as long as the
+    # outputs are aligned by the default predicates
+    outputs_by_signature = (
+        notebook_differs["/cells/*/outputs"] is diff_sequence_multilevel and
+        notebook_predicates["/cells/*/outputs"] == [
+            compare_output_approximate, compare_output_strict])
+
+    def reject_approximate(fx, fy):
+        return fx.cell_type != fy.cell_type or reject_text_approximate(fx, fy)
+
+    def reject_moderate(fx, fy):
+        if reject_approximate(fx, fy):
+            return True
+        if fx.cell_type == "code":
+            if bool(fx.output_signature) != bool(fy.output_signature):
+                return True
+            if outputs_by_signature:
+                return fx.output_signature != fy.output_signature
+        return False
+
+    def reject_strict(fx, fy):
+        if fx.cell_type != fy.cell_type or reject_text_strict(fx, fy):
+            return True
+        if fx.cell_type == "code":
+            return fx.output_hashes != fy.output_hashes
+        return False
+
+    return {
+        compare_cell_approximate: reject_approximate,
+        compare_cell_moderate: reject_moderate,
+        compare_cell_strict: reject_strict,
+    }
+
+
+def _fingerprint_compare(compare, reject):
+    "Make a predicate on fingerprints from a cell predicate."
+    if reject is None:
+        return lambda fx, fy: compare(fx.cell, fy.cell)
+    return lambda fx, fy: not reject(fx, fy) and compare(fx.cell, fy.cell)
+
+
+def _fingerprint_key(key):
+    "Make an anchoring key on fingerprints from a cell key."
+    return lambda f: key(f.cell)
+
+
+def diff_cells_multilevel(a, b, path="/cells", config=None):
+    """Compute diff of two lists of cells.
+
+    Same as diff_sequence_multilevel, except that the cells are
+    fingerprinted once up front, such that each level of predicates
+    can reject most unequal pairs without comparing the cells.
+    """
+    if config is None:
+        config = notebook_config
+
+    settings = get_text_similarity_options()
+    ignore_whitespace_lines = settings["ignore_whitespace_lines"]
+    fa = [CellFingerprint(cell, ignore_whitespace_lines) for cell in a]
+    fb = [CellFingerprint(cell, ignore_whitespace_lines) for cell in b]
+
+    rejects = make_cell_rejects(settings)
+    compares = [_fingerprint_compare(c, rejects.get(c))
+                for c in config.predicates[path]]
+    anchors = config.anchors.get(path)
+    if anchors:
+        keys = [_fingerprint_key(key) for key in anchors]
+        snakes = compute_snakes_anchored(fa, fb, compares, keys)
+    else:
+        snakes = compute_snakes_multilevel(fa, fb, compares)
+
+    # Convert snakes to diff
+    return compute_diff_from_snakes(a, b, snakes, path=path, config=config)
+
+
 def diff_single_outputs(a, b, path="/cells/*/outputs/*", config=None):
     """DiffOp a pair of output cells."""
     assert path == "/cells/*/outputs/*", 'Invalid path for ouput: %r' % path
@@ -392,13 +601,10 @@ def diff_single_outputs(a, b, path="/cells/*/outputs/*", config=None):
     if a.output_type in ("execute_result", "display_data"):
         di = MappingDiffBuilder()
 
-        # Separate data from output during diffing:
-        tmp_data = a.pop('data')
-        a_conj = copy.deepcopy(a)  # Output without data
-        a.data = tmp_data          # Restore output
-        tmp_data = b.pop('data')
-        b_conj = copy.deepcopy(b)
-        b.data = tmp_data
+        # Separate data from output during diffing, the values
+        # are shared with the outputs but diff doesn't modify them
+        a_conj = {k: v for k, v in a.items() if k != 'data'}
+        b_conj = {k: v for k, v in b.items() if k != 'data'}
         # Only diff outputs without data:
         dd_conj = diff(a_conj, b_conj)
         if dd_conj:
@@ -515,6 +721,9 @@ def diff_ignore_keys(inner_differ, ignore_keys):
             if e.key not in ignore_keys:
                 ret.append(e)
         return ret
+    # For notebooks_equivalent
+    ignored_diff.inner_differ = inner_differ
+    ignored_diff.ignore_keys = ignore_keys
     return ignored_diff
 
 
@@ -538,7 +747,7 @@ notebook_predicates = defaultdict2(lambda: [operator.__eq__], {
 
 # Recursive diffing of substructures should pick a rule from here, with diff as fallback
 notebook_differs = defaultdict2(lambda: diff, {
-    "/cells": diff_sequence_multilevel,
+    "/cells": diff_cells_multilevel,
     "/cells/*": diff,
     "/cells/*/source": diff_string_lines,
     "/cells/*/outputs": diff_sequence_multilevel,
@@ -547,12 +756,18 @@ notebook_differs = defaultdict2(lambda: diff, {
     })
 
 
+# Key functions for anchoring sequences before multilevel diffing,
+# empty unless enabled by set_notebook_cell_anchoring
+notebook_anchors = {}
+
+
 notebook_config = DiffConfig(
     predicates=notebook_predicates,
     differs=notebook_differs,
     atomic_paths={
         "/cells/*/id": True
-    }
+    },
+    anchors=notebook_anchors,
 )
 
 
@@ -605,6 +820,21 @@ def set_notebook_diff_targets(sources=True, outputs=True, attachments=True,
     set_notebook_diff_ignores(config)
 
 
+def set_notebook_cell_anchoring(enabled=True):
+    """Enable/disable anchoring of cells before aligning them.
+
+    When enabled, cells that are unique on both sides by id, or else by
+    their exact source, are aligned first, and the multilevel cell
+    predicates are only evaluated in the gaps between these anchors.
+    This makes diffs of large notebooks with few changes near-linear,
+    but may align a moved cell differently than the full algorithm.
+    """
+    if enabled:
+        notebook_anchors["/cells"] = [cell_id_key, cell_source_key]
+    else:
+        notebook_anchors.pop("/cells", None)
+
+
 def diff_cells(a, b):
     "This is currently just used by some tests."
     path = "/cells"
@@ -616,6 +846,95 @@ def diff_item_at_path(a, b, path):
     return notebook_differs[path](a, b, path=path, config=notebook_config)
 
 
+def _configured_differ(path):
+    "Look up the differ for path without inserting defaults in notebook_differs."
+    if path in notebook_differs:
+        return notebook_differs[path]
+    return notebook_differs.default_values.get(path, diff)
+
+
+# Paths of lists whose items are matched and patched with the
+# differ of path + "/*", instead of only being compared by equality
+_patched_item_paths = {
+    "/cells": (diff_cells_multilevel,),
+    "/cells/*/outputs": (diff_sequence_multilevel,),
+}
+
+
+def _equivalence_ignores(path):
+    """The differ configured for path and the keys it ignores.
+
+    Ignores are only taken into account where path is not None,
+    elsewhere all of a value is compared.
+    """
+    differ = None if path is None else _configured_differ(path)
+    ignore_keys = set()
+    while hasattr(differ, "ignore_keys"):
+        ignore_keys.update(differ.ignore_keys)
+        differ = differ.inner_differ
+    return differ, ignore_keys
+
+
+def _equivalence_subpath(differ, path, key, item):
+    """The path to compare the item of a dict under, or None for all of it.
+
+    Returns False for an ignored item, where only its presence and
+    type matter.
+    """
+    subpath = "/".join((path, key)) if differ is diff else None
+    if (subpath is not None and _configured_differ(subpath) is diff_ignore and
+            not notebook_config.is_atomic(item, subpath)):
+        return False
+    return subpath
+
+
+def _equivalent(a, b, path):
+    "Check if the diff of a and b is known to be empty, stopping at the first difference."
+    if path is None:
+        return a == b
+    differ, ignore_keys = _equivalence_ignores(path)
+
+    if isinstance(a, dict) and isinstance(b, dict):
+        keys = [key for key in a if key not in ignore_keys]
+        if len(keys) != sum(1 for key in b if key not in ignore_keys):
+            return False
+        for key in keys:
+            if key not in b:
+                return False
+            aitem, bitem = a[key], b[key]
+            asubpath = _equivalence_subpath(differ, path, key, aitem)
+            bsubpath = _equivalence_subpath(differ, path, key, bitem)
+            if asubpath is False or bsubpath is False:
+                if not (type(aitem) is type(bitem) or aitem == bitem):
+                    return False
+            elif not _equivalent(aitem, bitem, asubpath):
+                return False
+        return True
+    elif isinstance(a, list) and isinstance(b, list):
+        if len(a) != len(b):
+            return False
+        if differ in _patched_item_paths.get(path, ()):
+            subpath = path + "/*"
+        else:
+            subpath = None
+        return all(_equivalent(x, y, subpath) for x, y in zip(a, b))
+    # Scalars are compared like the generic differ does
+    return a == b
+
+
+def notebooks_equivalent(a, b):
+    """Check if notebooks a and b are known to have an empty diff.
+
+    The notebooks are equivalent if they only differ in parts ignored
+    by the current configuration, see set_notebook_diff_targets and
+    set_notebook_diff_ignores. Ignores are only taken into account in
+    parts of the notebook where the differs are known, so notebooks
+    that are not equivalent can still have an empty diff. Stops at
+    the first difference instead of diffing the notebooks in full.
+    """
+    return _equivalent(a, b, "")
+
+
 def diff_notebooks(a, b):
     """Compute the diff of two notebooks using customized heuristics and diff rules.
 
@@ -623,4 +942,11 @@ def diff_notebooks(a, b):
     """
     if not (isinstance(a, dict) and isinstance(b, dict)):
         raise TypeError("Expected inputs to be dicts, got %r and %r" % (a, b))
-    return diff(a, b, path="", config=notebook_config)
+    # Notebooks that only differ in ignored parts have an empty diff,
+    # even if the cell matching would pair such cells differently
+    if notebooks_equivalent(a, b):
+        return []
+    # Share one line interning table between all string diffs of this pair
+    config = copy.copy(notebook_config)
+    config.line_table = LineTable()
+    return diff(a, b, path="", config=config)
@@ -4,18 +4,64 @@
 # Distributed under the terms of the Modified BSD License.
 
 import operator
-from .lcs import diff_from_lcs
+from .lcs import diff_from_lcs, snakes_from_lcs
 
 __all__ = ["diff_sequence_bruteforce"]
 
 
-def bruteforce_compare_grid(A, B, compare=operator.__eq__):
-    "Brute force compute grid G[i, j] == compare(A[i], B[j])."
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Minimal length of both sequences for using the numpy implementations.
+# The llcs grid is updated one anti-diagonal at a time, so below this
+# the per-operation overhead of numpy dominates (the crossover is at
+# about 140x140, see nbdime.profiling.benchmark_bruteforce_grids).
+NUMPY_GRID_THRESHOLD = 150
+
+
+def use_numpy_grid(N, M):
+    "Whether to use numpy for computing grids of size N*M."
+    return np is not None and min(N, M) >= NUMPY_GRID_THRESHOLD
+
+
+def _compare_grid_python(A, B, compare):
     return [[compare(a, b) for b in B] for a in A]
 
 
-def bruteforce_llcs_grid(G):
-    "Brute force compute grid R[x][y] == llcs(A[:x], B[:y]), given G[i][j] = compare(A[i], B[j])."
+def _compare_grid_numpy(A, B, compare):
+    N, M = len(A), len(B)
+    if compare is operator.__eq__:
+        try:
+            # Intern values to ints and compare all pairs in one operation
+            ids = {}
+            ia = np.fromiter((ids.setdefault(a, len(ids)) for a in A), dtype=np.intp, count=N)
+            ib = np.fromiter((ids.get(b, -1) for b in B), dtype=np.intp, count=M)
+            return ia[:, None] == ib[None, :]
+        except TypeError:
+            # Unhashable values
+            pass
+    G = np.fromiter((compare(a, b) for a in A for b in B), dtype=bool, count=N*M)
+    return G.reshape(N, M)
+
+
+def _llcs_grid_numpy(G):
+    N, M = G.shape
+    R = np.zeros((N+1, M+1), dtype=np.intp)
+    # All entries on an anti-diagonal x+y=d only depend
+    # on the two previous anti-diagonals, update them at once
+    for d in range(2, N+M+1):
+        x = np.arange(max(1, d-M), min(N, d-1)+1)
+        y = d - x
+        R[x, y] = np.where(G[x-1, y-1],
+                           R[x-1, y-1] + 1,
+                           np.maximum(R[x-1, y], R[x, y-1]))
+    return R
+
+
+def _llcs_grid_python(G):
     N = len(G)
     M = len(G[0]) if N else 0
 
@@ -29,6 +75,26 @@ def bruteforce_llcs_grid(G):
     return R
 
 
+def bruteforce_compare_grid(A, B, compare=operator.__eq__):
+    """Brute force compute grid G[i, j] == compare(A[i], B[j]).
+
+    Uses a boolean numpy array for large grids if numpy is available.
+    """
+    if use_numpy_grid(len(A), len(B)):
+        return _compare_grid_numpy(A, B, compare)
+    return _compare_grid_python(A, B, compare)
+
+
+def bruteforce_llcs_grid(G):
+    """Brute force compute grid R[x][y] == llcs(A[:x], B[:y]), given G[i][j] = compare(A[i], B[j]).
+
+    Computes R with numpy if G is a numpy array.
+    """
+    if np is not None and isinstance(G, np.ndarray):
+        return _llcs_grid_numpy(G)
+    return _llcs_grid_python(G)
+
+
 def bruteforce_lcs_indices(A, B, G, R, compare=operator.__eq__):
     """Brute force compute the lcs of A and B.
 
@@ -68,16 +134,7 @@ def bruteforce_compute_snakes(A, B, compare):
     G = bruteforce_compare_grid(A, B, compare)
     R = bruteforce_llcs_grid(G)
     A_indices, B_indices = bruteforce_lcs_indices(A, B, G, R, compare)
-    snakes = [(0, 0, 0)]
-    for i, j in zip(A_indices, B_indices):
-        if snakes[-1][0] == i and snakes[-1][1] == j:
-            snake = snakes[-1]
-            snakes[-1] = (snake[0], snake[1], snake[2] + 1)
-        else:
-            snakes.append((i, j, 1))
-    if snakes[0][2] == 0:
-        snakes.pop(0)
-    return snakes
+    return snakes_from_lcs(A_indices, B_indices)
 
 
 def diff_sequence_bruteforce(A, B, compare=operator.__eq__):
@@ -21,8 +21,8 @@ def opcodes_to_diff(a, b, opcodes):
             # Unlike difflib we don't represent equal stretches explicitly
             pass
         elif action == "replace":
-            di.removerange(abegin, asize)
             di.addrange(abegin, b[bbegin:bend])
+            di.removerange(abegin, asize)
         elif action == "insert":
             di.addrange(abegin, b[bbegin:bend])
         elif action == "delete":
@@ -3,11 +3,146 @@
 # Copyright (c) Jupyter Development Team.
 # Distributed under the terms of the Modified BSD License.
 
+"""Linear space variant of Myers' O(ND) difference algorithm.
+
+Reference: E. W. Myers, "An O(ND) Difference Algorithm and Its Variations",
+Algorithmica 1 (1986), sections 3 and 4b.
+
+The algorithm finds a longest common subsequence by alternating a forward
+and a reverse greedy search for the furthest reaching D-paths along the
+k-diagonals of the edit graph, until the two searches overlap in the
+"middle snake". The problem is then split in two at the middle snake and
+solved recursively. Only O(N+M) memory is used, and the compare predicate
+is only evaluated along the diagonals actually explored.
+"""
+
 import operator
 
-__all__ = ["diff_sequence_myers"]
+from .lcs import diff_from_lcs, snakes_from_lcs
+
+__all__ = ["diff_sequence_myers", "myers_compute_snakes"]
+
+
+def myers_find_middle_snake(A, B, i0, i1, j0, j1, compare=operator.__eq__):
+    """Find the middle snake of the edit graph for A[i0:i1] and B[j0:j1].
+
+    Returns (x, y, u, v) such that A[x:u] and B[y:v] is a (possibly empty)
+    snake on an optimal path, i.e. compare(A[x+k], B[y+k]) is True
+    for 0 <= k < u-x.
+
+    Assumes both ranges are nonempty.
+    """
+    N = i1 - i0
+    M = j1 - j0
+    delta = N - M
+    odd = delta & 1
+
+    # Furthest reaching x values for forward (Vf) and reverse (Vr) paths,
+    # indexed by diagonal k = x - y (relative to delta for the reverse
+    # search) offset by V0 to map to 0-based list indices
+    Dmax = (N + M + 1) // 2
+    V0 = Dmax + 1
+    Vf = [0] * (2*V0 + 1)
+    Vr = [0] * (2*V0 + 1)
+    # Seeds for the first iteration, corresponding to x just outside of range
+    Vf[V0+1] = 0
+    Vr[V0-1] = N
+
+    for D in range(Dmax + 1):
+        # Forward search along k-diagonals
+        for k in range(-D, D+1, 2):
+            if k == -D or (k != D and Vf[V0+k-1] < Vf[V0+k+1]):
+                # Coming from diagonal k+1, the diagonal above k, so keeping x
+                x = Vf[V0+k+1]
+            else:
+                # Coming from diagonal k-1, the diagonal to the left of k, so incrementing x
+                x = Vf[V0+k-1] + 1
+            y = x - k
+            xs, ys = x, y
+            # Follow the snake along the k-diagonal
+            while x < N and y < M and compare(A[i0+x], B[j0+y]):
+                x += 1
+                y += 1
+            Vf[V0+k] = x
+            # Look for overlap with the furthest reaching reverse (D-1)-path
+            if odd and -(D-1) <= k - delta <= D-1 and x >= Vr[V0+k-delta]:
+                return i0+xs, j0+ys, i0+x, j0+y
+
+        # Reverse search along k-diagonals, centered around diagonal delta
+        for k in range(-D, D+1, 2):
+            if k == D or (k != -D and Vr[V0+k-1] < Vr[V0+k+1]):
+                # Coming from diagonal k-1, the diagonal below k, so keeping x
+                x = Vr[V0+k-1]
+            else:
+                # Coming from diagonal k+1, the diagonal to the right of k, so decrementing x
+                x = Vr[V0+k+1] - 1
+            y = x - k - delta
+            xe, ye = x, y
+            # Follow the snake backwards along the diagonal
+            while x > 0 and y > 0 and compare(A[i0+x-1], B[j0+y-1]):
+                x -= 1
+                y -= 1
+            Vr[V0+k] = x
+            # Look for overlap with the furthest reaching forward D-path
+            if not odd and -D <= k + delta <= D and Vf[V0+k+delta] >= x:
+                return i0+x, j0+y, i0+xe, j0+ye
+
+    raise RuntimeError("Failed to find middle snake!")
+
+
+def myers_lcs_indices(A, B, compare=operator.__eq__):
+    """Compute the lcs of A and B using the linear space Myers algorithm.
+
+    Returns two lists (A_indices, B_indices) with length == llcs(A, B),
+    such that lcs(A, B) == A[A_indices] == B[B_indices].
+    """
+    A_indices = []
+    B_indices = []
+
+    def _lcs(i0, i1, j0, j1):
+        # Measure common suffix, consumed after the recursion below
+        n = 0
+        while i0 < i1 - n and j0 < j1 - n and compare(A[i1-n-1], B[j1-n-1]):
+            n += 1
+        i1 -= n
+        j1 -= n
+        # Consume common prefix
+        while i0 < i1 and j0 < j1 and compare(A[i0], B[j0]):
+            A_indices.append(i0)
+            B_indices.append(j0)
+            i0 += 1
+            j0 += 1
+
+        if i0 < i1 and j0 < j1:
+            x, y, u, v = myers_find_middle_snake(A, B, i0, i1, j0, j1, compare)
+            # Lcs of the upper/left corner rectangle
+            _lcs(i0, x, j0, y)
+            # The middle snake
+            A_indices.extend(range(x, u))
+            B_indices.extend(range(y, v))
+            # Lcs of the lower/right corner rectangle
+            _lcs(u, i1, v, j1)
+
+        A_indices.extend(range(i1, i1 + n))
+        B_indices.extend(range(j1, j1 + n))
+
+    _lcs(0, len(A), 0, len(B))
+    return A_indices, B_indices
+
+
+def myers_compute_snakes(A, B, compare=operator.__eq__):
+    """Compute snakes using the linear space Myers algorithm.
+
+    Return a list of snakes, where each snake is a tuple (i,j,n)
+    representing a range of n elements that compare equal
+    in A and B starting at i and j, i.e. compare(x,y) returns
+    True for x,y in zip(A[i:i+n], B[j:j+n]).
+    """
+    A_indices, B_indices = myers_lcs_indices(A, B, compare)
+    return snakes_from_lcs(A_indices, B_indices)
 
 
 def diff_sequence_myers(A, B, compare=operator.__eq__):
     """Compute the diff of A and B using Myers' O(ND) algorithm."""
-    raise NotImplementedError("Work in progress...")
+    A_indices, B_indices = myers_lcs_indices(A, B, compare)
+    return diff_from_lcs(A, B, A_indices, B_indices)
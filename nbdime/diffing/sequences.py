@@ -11,12 +11,14 @@ from .seq_difflib import diff_sequence_difflib
 from .seq_bruteforce import diff_sequence_bruteforce
 from .seq_myers import diff_sequence_myers
 
-__all__ = ["diff_strings_by_char", "diff_sequence", "diff_strings_linewise"]
+__all__ = ["diff_strings_by_char", "diff_sequence", "diff_strings_linewise", "LineTable"]
 
 
 # TODO: Configuration framework?
 # legal_diff_sequence_algorithms = ["bruteforce", "difflib", "myers"]
-diff_sequence_algorithm = "bruteforce"
+# The linear space Myers algorithm gives diffs identical to the bruteforce
+# algorithm on the test corpus, without the O(NM) time and memory cost.
+diff_sequence_algorithm = "myers"
 
 
 def diff_sequence(a, b, compare=operator.__eq__):
@@ -48,8 +50,50 @@ def diff_strings_by_char(a, b, path="", config=None):
         return diff_sequence_difflib(a, b)
 
 
-def diff_strings_linewise(a, b):
+class LineTable(object):
+    """Interning table mapping lines of text to integer ids.
+
+    Sharing one table between the string diffs of a notebook pair
+    means that each distinct line is hashed once, that exact line
+    comparisons are integer comparisons, and that the approximate
+    comparison of a given pair of lines is only computed once.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.lines = []
+        self._similar = {}
+
+    def intern(self, lines):
+        "Return the list of ids of lines, adding new lines to the table."
+        ids = self.ids
+        result = []
+        for line in lines:
+            i = ids.get(line)
+            if i is None:
+                i = ids[line] = len(self.lines)
+                self.lines.append(line)
+            result.append(i)
+        return result
+
+    def compare_approximate(self, x, y):
+        "Compare the lines with ids x and y with approximate heuristics."
+        key = (x, y)
+        try:
+            return self._similar[key]
+        except KeyError:
+            from .generic import compare_strings_approximate
+            result = compare_strings_approximate(self.lines[x], self.lines[y])
+            self._similar[key] = result
+            return result
+
+
+def diff_strings_linewise(a, b, line_table=None):
     """Do a line-wise diff of two strings
+
+    Lines are aligned on their ids in line_table, which may be shared
+    between multiple calls. The approximate comparison of lines is only
+    done for the lines between runs of exactly equal lines.
     """
     assert isinstance(a, str) and isinstance(b, str), (
         'Arguments need to be string types. Got %r and %r' % (a, b))
@@ -58,11 +102,16 @@ def diff_strings_linewise(a, b):
     lines_a = a.splitlines(True)
     lines_b = b.splitlines(True)
 
-    from .generic import diff_lists, compare_strings_approximate
+    if line_table is None:
+        line_table = LineTable()
+    ids_a = line_table.intern(lines_a)
+    ids_b = line_table.intern(lines_b)
+
+    from .snakes import compute_snakes_multilevel, compute_diff_from_snakes
+    snakes = compute_snakes_multilevel(
+        ids_a, ids_b, [line_table.compare_approximate, operator.__eq__])
+
     config = DiffConfig(
-        predicates=defaultdict(lambda: [
-            compare_strings_approximate,
-            operator.__eq__]),
         differs=defaultdict(lambda: diff_strings_by_char)
     )
-    return diff_lists(lines_a, lines_b, config=config)
+    return compute_diff_from_snakes(lines_a, lines_b, snakes, config=config)
@@ -7,10 +7,19 @@
 Utilities for computing 'snakes', or contiguous sequences of equal elements of two sequences.
 """
 
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
 from ..diff_format import SequenceDiffBuilder
 from .seq_bruteforce import bruteforce_compute_snakes
+from .seq_myers import myers_compute_snakes
+
+__all__ = ["compute_snakes_multilevel", "compute_snakes_anchored"]
 
-__all__ = ["compute_snakes_multilevel"]
+
+# legal_compute_snakes_algorithms = ["bruteforce", "myers"]
+compute_snakes_algorithm = "myers"
 
 
 def compute_snakes(A, B, compare, rect=None):
@@ -18,11 +27,17 @@ def compute_snakes(A, B, compare, rect=None):
         rect = (0, 0, len(A), len(B))
     i0, j0, i1, j1 = rect
 
-    # TODO: Implement this using difflib or recursive Myers or simpler
-    # non-recursive Myers algorithm without the middle snake stuff
+    # The Myers algorithm only evaluates compare along the diagonals
+    # it explores, i.e. O((N+M)D) calls instead of N*M for bruteforce
+    if compute_snakes_algorithm == "myers":
+        compute = myers_compute_snakes
+    elif compute_snakes_algorithm == "bruteforce":
+        compute = bruteforce_compute_snakes
+    else:
+        raise RuntimeError("Unknown compute_snakes_algorithm {}.".format(compute_snakes_algorithm))
 
     # snakes = [(i, j, n)]
-    snakes = bruteforce_compute_snakes(A[i0:i1], B[j0:j1], compare)
+    snakes = compute(A[i0:i1], B[j0:j1], compare)
     snakes = [(i+i0, j+j0, n) for (i, j, n) in snakes]
 
     assert all(compare(A[i+k], B[j+k]) for (i, j, n) in snakes for k in range(n)), (
@@ -71,24 +86,203 @@ def compute_snakes_multilevel(A, B, compares, rect=None, level=None):
     return newsnakes
 
 
+def find_unique_anchors(A, B, key, rect=None):
+    """Find pairs (i, j) of items with a key that is unique in both A and B.
+
+    Items for which key returns None are never anchored. Of the unique
+    matches, the longest subset in increasing order of both i and j
+    is returned (the patience diff anchoring).
+    """
+    if rect is None:
+        rect = (0, 0, len(A), len(B))
+    i0, j0, i1, j1 = rect
+
+    def unique_keys(X, k0, k1):
+        # Map key -> index, or None if key is repeated
+        keys = {}
+        for k in range(k0, k1):
+            x = key(X[k])
+            if x is not None:
+                keys[x] = None if x in keys else k
+        return keys
+
+    akeys = unique_keys(A, i0, i1)
+    bkeys = unique_keys(B, j0, j1)
+    matches = []
+    for x, i in akeys.items():
+        j = bkeys.get(x)
+        if i is not None and j is not None:
+            matches.append((i, j))
+    matches.sort()
+
+    # Longest increasing subsequence of j by patience sorting
+    tails = []          # tails[n] = smallest j ending an increasing run of length n+1
+    tail_indices = []   # tail_indices[n] = index into matches of that j
+    previous = [None] * len(matches)
+    for m, (i, j) in enumerate(matches):
+        n = bisect_left(tails, j)
+        if n == len(tails):
+            tails.append(j)
+            tail_indices.append(m)
+        else:
+            tails[n] = j
+            tail_indices[n] = m
+        previous[m] = tail_indices[n-1] if n > 0 else None
+
+    anchors = []
+    m = tail_indices[-1] if tail_indices else None
+    while m is not None:
+        anchors.append(matches[m])
+        m = previous[m]
+    anchors.reverse()
+    return anchors
+
+
+def compute_snakes_anchored(A, B, compares, keys, rect=None):
+    """Compute snakes by anchoring on unique keys before the multilevel algorithm.
+
+    Items with a key that is unique in both A and B are aligned first,
+    using each of the key functions in keys in turn on the gaps left
+    by the previous ones. Only the small rectangles between these anchors
+    are passed to compute_snakes_multilevel, which avoids evaluating the
+    (possibly expensive) compare predicates over the full N*M grid when
+    most items are unchanged.
+    """
+    if rect is None:
+        rect = (0, 0, len(A), len(B))
+    if not keys:
+        return compute_snakes_multilevel(A, B, compares, rect)
+
+    i0, j0, i1, j1 = rect
+    anchors = find_unique_anchors(A, B, keys[0], rect)
+
+    newsnakes = [(0, 0, 0)]
+
+    def add_snake(snake):
+        i, j, n = snake
+        li, lj, ln = newsnakes[-1]
+        if li+ln == i and lj+ln == j:
+            # Merge contiguous snakes
+            newsnakes[-1] = (li, lj, ln + n)
+        else:
+            # Add new snake
+            newsnakes.append(snake)
+
+    for snake in [(i, j, 1) for (i, j) in anchors] + [(i1, j1, 0)]:
+        i, j, n = snake
+        if i > i0 and j > j0:
+            # Align the gap between anchors using the remaining keys,
+            # merging the gap's snakes with the anchors they touch
+            subrect = (i0, j0, i, j)
+            for subsnake in compute_snakes_anchored(A, B, compares, keys[1:], subrect):
+                add_snake(subsnake)
+        if n > 0:
+            add_snake(snake)
+        i0 = i + n
+        j0 = j + n
+    # Pop empty snake from beginning if it wasn't extended inside the loop
+    if newsnakes[0][2] == 0:
+        newsnakes.pop(0)
+    return newsnakes
+
+
+# Options for computing the diffs of matched items in parallel
+_subdiff_options = {"processes": 0, "min_pairs": 64}
+
+# The arguments of the current parallel subdiff computation, which
+# forked worker processes inherit instead of having them pickled
+_subdiff_state = None
+
+
+def set_subdiff_processes(processes=None, min_pairs=None):
+    """Set the number of processes used to diff matched sequence items.
+
+    With processes > 1, the subdiffs of notebooks with at least min_pairs
+    matched cells are computed by a pool of forked worker processes.
+    Nested sequences are diffed by the workers themselves. Platforms
+    without fork always diff sequentially, as does processes=0 (the
+    default) or 1. Processes must not be enabled in threaded programs,
+    such as the nbdime servers.
+    """
+    if processes is not None:
+        if processes < 0:
+            raise ValueError("Number of processes must be >= 0, got %r" % processes)
+        _subdiff_options["processes"] = processes
+    if min_pairs is not None:
+        _subdiff_options["min_pairs"] = min_pairs
+
+
+# Only the cells of notebooks are worth diffing in parallel, each
+# diff_notebooks call uses at most one pool of processes for them
+_parallel_subdiff_path = "/cells"
+
+
+def _use_parallel_subdiffs(path, n_pairs):
+    return (
+        path == _parallel_subdiff_path and
+        _subdiff_options["processes"] > 1 and
+        n_pairs >= max(2, _subdiff_options["min_pairs"]) and
+        _subdiff_state is None and  # Not in a worker process
+        "fork" in multiprocessing.get_all_start_methods()
+    )
+
+
+def _subdiff_chunk(start, stop):
+    a, b, pairs, subpath, config = _subdiff_state
+    diffit = config.differs[subpath]
+    return [diffit(a[i], b[j], path=subpath, config=config)
+            for i, j in pairs[start:stop]]
+
+
+def _parallel_subdiffs(a, b, pairs, subpath, config):
+    "Diff the items in pairs of (i, j) indices of a and b in worker processes."
+    global _subdiff_state
+    processes = _subdiff_options["processes"]
+    # A few chunks per process balances the load, while amortizing
+    # the pickling of results per chunk
+    chunk_size = max(1, len(pairs) // (4 * processes))
+    _subdiff_state = (a, b, pairs, subpath, config)
+    try:
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(processes, mp_context=context) as executor:
+            futures = [
+                executor.submit(_subdiff_chunk, start, min(start + chunk_size, len(pairs)))
+                for start in range(0, len(pairs), chunk_size)
+            ]
+            subdiffs = []
+            for future in futures:
+                subdiffs.extend(future.result())
+    finally:
+        _subdiff_state = None
+    return subdiffs
+
+
 def compute_diff_from_snakes(a, b, snakes, path="", config=None):
     "Compute diff from snakes."
 
     subpath = "/".join((path, "*"))
     diffit = config.differs[subpath]
 
+    subdiffs = None
+    if _use_parallel_subdiffs(path, sum(n for i, j, n in snakes)):
+        pairs = [(i + k, j + k) for i, j, n in snakes for k in range(n)]
+        subdiffs = iter(_parallel_subdiffs(a, b, pairs, subpath, config))
+
     di = SequenceDiffBuilder()
     i0, j0, i1, j1 = 0, 0, len(a), len(b)
     for i, j, n in snakes + [(i1, j1, 0)]:
-        if i > i0:
-            di.removerange(i0, i-i0)
         if j > j0:
             di.addrange(i0, b[j0:j])
+        if i > i0:
+            di.removerange(i0, i-i0)
 
         for k in range(n):
-            aval = a[i + k]
-            bval = b[j + k]
-            cd = diffit(aval, bval, path=subpath, config=config)
+            if subdiffs is not None:
+                cd = next(subdiffs)
+            else:
+                aval = a[i + k]
+                bval = b[j + k]
+                cd = diffit(aval, bval, path=subpath, config=config)
             if cd:
                 di.patch(i + k, cd)
 
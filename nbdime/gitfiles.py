@@ -3,6 +3,8 @@
 
 import io
 import os
+import subprocess
+import threading
 from collections import deque
 
 os.environ['GIT_PYTHON_REFRESH'] = 'quiet'
@@ -11,7 +13,7 @@ from git import (
     GitCommandNotFound, Diffable
 )
 
-from nbdime.vcs.git.filter_integration import apply_possible_filter
+from nbdime.vcs.git.filter_integration import apply_possible_filter, GitFilters
 from .utils import EXPLICIT_MISSING_FILE, pushd
 
 
@@ -98,12 +100,74 @@ def is_path_in_repo(path):
         return False
 
 
-def _get_diff_entry_stream(path, blob, ref_name, repo_dir):
+def _is_notebook_path(path):
+    "Whether path of a diff entry is a notebook, or missing (None)."
+    return not path or path.endswith('.ipynb')
+
+
+def _write_batch_requests(stdin, hexshas):
+    try:
+        for hexsha in hexshas:
+            stdin.write(hexsha.encode('ascii') + b'\n')
+        stdin.close()
+    except (OSError, ValueError):
+        # The reading side has stopped early
+        pass
+
+
+def read_blobs(repo, blobs):
+    """Iterator over the contents of blobs, as bytes
+
+    All blobs are requested up front from a single `git cat-file --batch`
+    process, whose output is then read as the iterator is consumed.
+    Falls back to reading the blobs one by one with GitPython if the
+    git process cannot be started.
+    """
+    blobs = list(blobs)
+    if not blobs:
+        return
+    try:
+        proc = subprocess.Popen(
+            ['git', '--git-dir', repo.git_dir, 'cat-file', '--batch'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    except OSError:
+        for blob in blobs:
+            yield blob.data_stream.read()
+        return
+    # Write the requests from a separate thread, so that git is never
+    # blocked by a full output pipe while we are still writing
+    writer = threading.Thread(
+        target=_write_batch_requests,
+        args=(proc.stdin, [blob.hexsha for blob in blobs]),
+        daemon=True)
+    writer.start()
+    try:
+        for blob in blobs:
+            header = proc.stdout.readline().split()
+            if len(header) != 3 or header[0].decode('ascii') != blob.hexsha:
+                raise ValueError(
+                    'Unexpected output from git cat-file for blob %s: %r' % (
+                        blob.hexsha, b' '.join(header)))
+            size = int(header[2])
+            data = proc.stdout.read(size)
+            proc.stdout.read(1)  # Skip the newline after the content
+            yield data
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        writer.join()
+
+
+def _get_diff_entry_stream(path, blob, ref_name, repo_dir, data=None, filters=None):
     """Get a stream to the notebook, for a given diff entry's path and blob
 
     Returns None if path is not a Notebook file, and EXPLICIT_MISSING_FILE
     if path is missing, or the blob is None (unless diffing against working
-    tree).
+    tree). The content of the blob can be passed as data if it has
+    already been read, and a GitFilters instance for repo_dir as filters
+    to share it between several working tree files.
     """
     if path:
         if not path.endswith('.ipynb'):
@@ -113,7 +177,7 @@ def _get_diff_entry_stream(path, blob, ref_name, repo_dir):
             with pushd(repo_dir):
                 # We are diffing against working dir, so ensure we apply
                 # any git filters before comparing:
-                ret = apply_possible_filter(path)
+                ret = apply_possible_filter(path, filters=filters)
                 # ret == path means no filter was applied
                 if ret != path:
                     return ret
@@ -130,7 +194,9 @@ def _get_diff_entry_stream(path, blob, ref_name, repo_dir):
             # so we solve this by reading into a StringIO buffer.
             # The penalty should be low as long as changed_notebooks are used
             # properly as an iterator.
-            f = BlobWrapper(blob.data_stream.read().decode('utf-8'))
+            if data is None:
+                data = blob.data_stream.read()
+            f = BlobWrapper(data.decode('utf-8'))
             f.name = '%s (%s)' % (
                 path,
                 ref_name if ref_name != GitRefIndex else '<INDEX>'
@@ -170,14 +236,42 @@ def changed_notebooks(ref_base, ref_remote, paths=None, repo_dir=None):
         tree_remote = repo.commit(ref_remote).tree
         diff = tree_base.diff(tree_remote, paths)
 
+    entries = [
+        entry for entry in diff
+        if _is_notebook_path(entry.a_path) and _is_notebook_path(entry.b_path)
+    ]
+
+    # Resolve all the blobs to read from git up front, so they can
+    # be streamed through a single process:
+    def needs_read(path, blob, ref_name):
+        return bool(path) and blob is not None and ref_name is not GitRefWorkingTree
+    blobs = []
+    for entry in entries:
+        if needs_read(entry.a_path, entry.a_blob, ref_base):
+            blobs.append(entry.a_blob)
+        if needs_read(entry.b_path, entry.b_blob, ref_remote):
+            blobs.append(entry.b_blob)
+    contents = read_blobs(repo, blobs)
+
+    # Working tree files are cleaned by any configured git filters,
+    # looked up for all of them at once:
+    filters = None
+    if ref_remote is GitRefWorkingTree:
+        filters = GitFilters(repo_dir)
+        filters.lookup([entry.b_path for entry in entries if entry.b_path])
+
     # Return the base/remote pair of Notebook file streams
-    for entry in diff:
-        fa = _get_diff_entry_stream(
-            entry.a_path, entry.a_blob, ref_base, repo_dir)
-        if fa is None:
-            continue
-        fb = _get_diff_entry_stream(
-            entry.b_path, entry.b_blob, ref_remote, repo_dir)
-        if fb is None:
-            continue
-        yield (fa, fb)
+    try:
+        for entry in entries:
+            streams = []
+            for path, blob, ref_name in (
+                    (entry.a_path, entry.a_blob, ref_base),
+                    (entry.b_path, entry.b_blob, ref_remote)):
+                data = next(contents) if needs_read(path, blob, ref_name) else None
+                streams.append(_get_diff_entry_stream(
+                    path, blob, ref_name, repo_dir, data, filters))
+            yield tuple(streams)
+    finally:
+        contents.close()
+        if filters is not None:
+            filters.close()
@@ -16,7 +16,7 @@ def patch_item(value, diffentry):
     if op == DiffOp.REPLACE:
         return diffentry.value
     elif op == DiffOp.PATCH:
-        return patch(value, diffentry.diff)
+        return patch(value, diffentry.diff, share=True)
     elif op == DiffOp.REMOVE:
         return Deleted
     else:
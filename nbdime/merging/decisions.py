@@ -9,7 +9,7 @@ import nbformat
 import nbdime.log
 from ..diff_format import (
     DiffOp, op_removerange, op_remove, op_patch, op_replace)
-from ..patching import patch
+from ..patching import patch, as_notebook_node
 from ..utils import (
     r_is_int, star_path, join_path, is_prefix_array, find_shared_prefix)
 
@@ -599,12 +599,20 @@ def resolve_action(base, decision):
         raise NotImplementedError("The action \"%s\" is not defined" % a)
 
 
-def apply_decisions(base, decisions):
+def apply_decisions(base, decisions, share=False):
     """Apply a list of merge decisions to base.
+
+    Content of base that the decisions leave unchanged is deep copied,
+    unless share is true, see patch.
     """
     from .strategies import combine_patches
 
-    merged = copy.deepcopy(base)
+    if not share:
+        base = copy.deepcopy(base)
+    # Containers in base are shared with merged until they are modified,
+    # owned maps the id of containers that belong to merged to themselves
+    merged = copy.copy(base)
+    owned = {id(merged): merged}
     prev_path = None
     parent = None
     last_key = None
@@ -638,12 +646,13 @@ def apply_decisions(base, decisions):
                 # First, apply previous diffs
                 if parent is None:
                     # Operations on root create new merged object
-                    merged = patch(resolved, diffs)
+                    merged = patch(resolved, diffs, share=True)
+                    owned[id(merged)] = merged
                 else:
                     # If not, overwrite entry in parent (which is an entry in
                     # merged). This is ok, as no paths should point to
                     # subobjects of the patched object
-                    parent[last_key] = patch(resolved, diffs)
+                    parent[last_key] = patch(resolved, diffs, share=True)
 
             prev_path = path
             # Resolve path in base and output
@@ -651,6 +660,11 @@ def apply_decisions(base, decisions):
             parent = None
             last_key = None
             for key in path:
+                if id(resolved) not in owned:
+                    # Copy the container before it is modified
+                    resolved = copy.copy(resolved)
+                    owned[id(resolved)] = resolved
+                    parent[last_key] = resolved
                 parent = resolved
                 resolved = resolved[key]   # Should raise if key missing
                 last_key = key
@@ -661,12 +675,13 @@ def apply_decisions(base, decisions):
     # Apply the last collection of diffs, if present (same as above)
     if prev_path is not None:
         if parent is None:
-            merged = patch(resolved, diffs)
+            merged = patch(resolved, diffs, share=True)
         else:
-            parent[last_key] = patch(resolved, diffs)
+            parent[last_key] = patch(resolved, diffs, share=True)
 
-    merged = nbformat.from_dict(merged)
-    return merged
+    if share:
+        return as_notebook_node(merged)
+    return nbformat.from_dict(merged)
 
 
 def _merge_tree(tree, sorted_paths):
@@ -168,10 +168,11 @@ def decide_notebook_merge(base, local, remote, args=None):
     return decisions
 
 
-def merge_notebooks(base, local, remote, args=None):
+def merge_notebooks(base, local, remote, args=None, share=False):
     """Merge changes introduced by notebooks local and remote from a shared ancestor base.
 
     Return new (partially) merged notebook and unapplied diffs from the local and remote side.
+    The merged notebook shares unchanged content with base if share is true, see patch.
     """
     if args and args.log_level == "DEBUG":
         # log pretty-print config object:
@@ -184,7 +185,7 @@ def merge_notebooks(base, local, remote, args=None):
 
     decisions = decide_notebook_merge(base, local, remote, args)
 
-    merged = apply_decisions(base, decisions)
+    merged = apply_decisions(base, decisions, share=share)
 
     if args and args.log_level == "DEBUG":
         nbdime.log.debug("In merge, merged notebook:")
@@ -16,6 +16,7 @@ from .decisions import MergeDecisionBuilder, push_patch_decision
 from ..diff_format import (
     DiffOp, ParentDeleted,
     op_patch, op_addrange, op_removerange, op_add, op_replace)
+from ..diff_utils import to_clean_dicts
 from ..patching import patch
 from ..prettyprint import merge_render
 from ..utils import join_path, resolve_path
@@ -198,7 +199,7 @@ def resolve_strategy_inline_attachments(base_path, attachments, decisions):
                 local = ld.value
             else:
                 assert ld.op == DiffOp.PATCH
-                local = patch(base, ld.diff)
+                local = patch(base, ld.diff, share=True)
 
             if rd.op == DiffOp.ADD:
                 remote = rd.value
@@ -206,7 +207,7 @@ def resolve_strategy_inline_attachments(base_path, attachments, decisions):
                 remote = rd.value
             else:
                 assert rd.op == DiffOp.PATCH
-                remote = patch(base, rd.diff)
+                remote = patch(base, rd.diff, share=True)
 
             local_name = "LOCAL_" + key
             remote_name = "REMOTE_" + key
@@ -275,7 +276,7 @@ def get_outputs_and_note(base, removes, patches):
         else:
             note = ""
 
-        suboutputs = [patch(base, e.diff)]
+        suboutputs = [patch(base, e.diff, share=True)]
     else:
         note = " <unchanged>"
         suboutputs = [base]
@@ -452,10 +453,11 @@ def resolve_strategy_record_conflicts(base_path, base, decisions):
     #conflict_decisions = [d for d in decisions if d.conflict]
     decisions.decisions = [d for d in decisions if not d.conflict]
 
-    # Record remaining conflicts in field nbdime-conflicts
+    # Record remaining conflicts in field nbdime-conflicts,
+    # as plain dicts that can be written with the notebook
     conflicts_dict = {
-        "local_diff": local_conflict_diffs,
-        "remote_diff": remote_conflict_diffs,
+        "local_diff": to_clean_dicts(local_conflict_diffs),
+        "remote_diff": to_clean_dicts(remote_conflict_diffs),
         # TODO: Record local and remote versions of full metadata, easier to manually select one?
         #"base_metadata": base,
         #"local_metadata": patch(base, local_diff),
@@ -3,19 +3,32 @@
 # Copyright (c) IPython Development Team.
 # Distributed under the terms of the Modified BSD License.
 
-import json
+import argparse
+from collections import deque
+from contextlib import contextmanager
+import io
+import multiprocessing
 import os
+import shlex
+import shutil
+from subprocess import Popen, PIPE
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 
+from . import log
 from .args import (
     add_generic_args, add_diff_args, process_diff_flags, resolve_diff_args,
     add_diff_cli_args, add_prettyprint_args, ConfigBackedParser,
     prettyprint_config_from_args,
     Path,
     )
-from .diffing.notebooks import diff_notebooks
-from .gitfiles import changed_notebooks, is_gitref
-from .prettyprint import pretty_print_notebook_diff
+from .diff_format import write_binary_diff
+from .diff_utils import write_json, externalize_blobs, blobs_filename
+from .diffing.notebooks import diff_notebooks, notebooks_equivalent
+from .diffing.snakes import set_subdiff_processes
+from .gitfiles import BlobWrapper, changed_notebooks, is_gitref
+from .prettyprint import BufferedOutput, pretty_print_notebook_diff
 from .utils import EXPLICIT_MISSING_FILE, read_notebook, setup_std_streams
 
 
@@ -28,29 +41,226 @@ def main_diff(args):
     process_diff_flags(args)
     base, remote, paths = resolve_diff_args(args)
 
-    # Check if base/remote are gitrefs:
-    if is_gitref(base) and is_gitref(remote):
-        # We are asked to do a diff of git revisions:
-        status = 0
-        for fbase, fremote in changed_notebooks(base, remote, paths):
-            status = _handle_diff(fbase, fremote, output, args)
-            if status != 0:
-                # Short-circuit on error in diff handling
-                return status
-        return status
-    else:  # Not gitrefs:
-        return _handle_diff(base, remote, output, args)
-
-
-def _handle_diff(base, remote, output, args):
+    status = 0
+    pager = _start_pager(args)
+    with _printed_output(pager) as out:
+        # Check if base/remote are gitrefs:
+        if is_gitref(base) and is_gitref(remote):
+            # We are asked to do a diff of git revisions:
+            jobs = getattr(args, 'jobs', 1)
+            # Forked workers inherit the diff configuration set up above
+            if jobs > 1 and "fork" in multiprocessing.get_all_start_methods():
+                status = _handle_diffs_parallel(
+                    changed_notebooks(base, remote, paths), output, args, jobs, out)
+            else:
+                for fbase, fremote in changed_notebooks(base, remote, paths):
+                    status = _handle_diff(fbase, fremote, output, args, out)
+                    if status != 0:
+                        # Short-circuit on error in diff handling
+                        break
+        else:  # Not gitrefs:
+            status = _handle_diff(base, remote, output, args, out)
+    if pager is not None and pager.returncode != 0:
+        log.error("The pager exited with status %d", pager.returncode)
+        status = status or 1
+    return status
+
+
+def _start_pager(args):
+    """Start the pager process if the diff is to be printed to a pager.
+
+    The pager is given by the NBDIME_PAGER or PAGER environment
+    variables, or is less. If it cannot be found or started, this
+    warns and returns None to print the diff to stdout instead.
+    """
+    printing = not (getattr(args, 'out', None) or getattr(args, 'quiet', False))
+    if not (printing and getattr(args, 'pager', False)):
+        return None
+    cmd = os.environ.get('NBDIME_PAGER') or os.environ.get('PAGER') or 'less'
+    try:
+        program = shlex.split(cmd)[0]
+    except (ValueError, IndexError):
+        program = cmd
+    if shutil.which(program) is None:
+        log.warning("Pager %r not found, printing to stdout", program)
+        return None
+    env = dict(os.environ)
+    # Let less show colors, and quit if there is less than a screen
+    env.setdefault('LESS', 'FRX')
+    try:
+        return Popen(cmd, shell=True, stdin=PIPE, env=env,
+                     universal_newlines=True, errors='backslashreplace')
+    except OSError as e:
+        log.warning("Could not start pager %r, printing to stdout: %s", cmd, e)
+        return None
+
+
+@contextmanager
+def _printed_output(pager=None):
+    """Output for printing diffs, buffered to be written in chunks.
+
+    With a pager process from _start_pager, the output is streamed
+    to the pager. If the reader closes the output, e.g. by quitting
+    the pager, the diffing stops early and quietly.
+    """
+    if pager is not None:
+        out = BufferedOutput(pager.stdin)
+    else:
+        out = BufferedOutput(_Printer())
+    try:
+        yield out
+        out.flush()
+    except BrokenPipeError:
+        log.debug('Output closed by reader, stopping')
+        if pager is None:
+            # Python would fail to flush what is left of stdout at exit
+            try:
+                devnull = os.open(os.devnull, os.O_WRONLY)
+                os.dup2(devnull, sys.stdout.fileno())
+            except (AttributeError, ValueError, OSError, io.UnsupportedOperation):
+                pass
+    finally:
+        if pager is not None:
+            try:
+                pager.stdin.close()
+            except BrokenPipeError:
+                pass
+            pager.wait()
+
+
+def _detach_stream(f):
+    """Read a notebook stream from changed_notebooks into memory.
+
+    Open files cannot be passed to worker processes, while the
+    in-memory copy can.
+    """
+    if isinstance(f, str):
+        return f
+    with f:
+        content = f.read()
+    detached = BlobWrapper(content)
+    detached.name = f.name
+    return detached
+
+
+def _init_diff_worker():
+    # Workers are busy with a notebook each, and cannot start
+    # their own pool for subdiffs
+    set_subdiff_processes(0)
+
+
+def _diff_job(base, remote, output, args):
+    """Diff and render a pair of notebooks in a worker process.
+
+    Returns the exit status, the diff if it is to be written to output,
+    the rendered text and the time spent.
+    """
+    start = time.perf_counter()
+    out = io.StringIO()
+    status, d = 1, None
+    notebooks = _read_notebooks(base, remote, out)
+    if notebooks is None:
+        pass
+    elif getattr(args, 'quiet', False):
+        status = _quiet_status(*notebooks)
+    else:
+        a, b = notebooks
+        d = diff_notebooks(a, b)
+        if output:
+            # Written by the main process, in order
+            status = 0
+        else:
+            status = _output_diff(base, remote, a, d, None, args, out)
+            d = None
+    return status, d, out.getvalue(), time.perf_counter() - start
+
+
+def _handle_diffs_parallel(pairs, output, args, jobs, out):
+    """Handles diffs of the notebook pairs from changed_notebooks in
+    a pool of jobs worker processes.
+
+    The notebooks are read, diffed and rendered by the workers, while
+    the results are output here to out, in the order of pairs. Like the
+    sequential diffing, this stops at the first pair with a non-zero
+    exit status, or when the output is closed.
+
+    Only a window of pairs is read and submitted ahead of the output,
+    so that the notebooks are not all held in memory at once.
+    """
+    start = time.perf_counter()
+    work_time = 0.0
+    count = 0
+    status = 0
+    window = 2 * jobs
+    pairs = iter(pairs)
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(jobs, mp_context=context,
+                             initializer=_init_diff_worker) as executor:
+        def submit_next():
+            pair = next(pairs, None)
+            if pair is not None:
+                fbase, fremote = pair
+                futures.append(executor.submit(
+                    _diff_job, _detach_stream(fbase), _detach_stream(fremote),
+                    output, args))
+
+        futures = deque()
+        try:
+            for _ in range(window):
+                submit_next()
+            while futures:
+                status, d, text, elapsed = futures.popleft().result()
+                count += 1
+                work_time += elapsed
+                if text:
+                    out.write(text)
+                if d is not None:
+                    _write_diff(d, output, args)
+                if status != 0:
+                    # Short-circuit on error in diff handling
+                    break
+                submit_next()
+        finally:
+            # Don't wait for diffs that will not be output
+            executor.shutdown(cancel_futures=True)
+    log.info("Diffed %d notebook(s) in %.2fs with %d jobs (%.2fs in jobs)",
+             count, time.perf_counter() - start, jobs, work_time)
+    return status
+
+
+class _Printer:
+    # This printer is to keep the unit tests passing,
+    # some tests capture output with capsys which doesn't
+    # pick up on sys.stdout.write()
+    def write(self, text):
+        print(text, end="")
+
+
+def _handle_diff(base, remote, output, args, out=None):
     """Handles diffs of files, either as filenames or file-like objects"""
+    if out is None:
+        out = _Printer()
+    notebooks = _read_notebooks(base, remote, out)
+    if notebooks is None:
+        return 1
+    if getattr(args, 'quiet', False):
+        return _quiet_status(*notebooks)
+    a, b = notebooks
+    return _output_diff(base, remote, a, diff_notebooks(a, b), output, args, out)
+
+
+def _read_notebooks(base, remote, out):
+    """Reads two notebooks, given as filenames or file-like objects
+
+    Returns the notebooks, or None if a file is missing.
+    """
     # Check that if args are filenames they either exist, or are
     # explicitly marked as missing (added/removed):
     for fn in (base, remote):
         if (isinstance(fn, str) and not os.path.exists(fn) and
                 fn != EXPLICIT_MISSING_FILE):
-            print("Missing file {}".format(fn))
-            return 1
+            out.write("Missing file {}\n".format(fn))
+            return None
     # Both files cannot be missing
     assert not (base == EXPLICIT_MISSING_FILE and remote == EXPLICIT_MISSING_FILE), (
         'cannot diff %r against %r' % (base, remote))
@@ -58,25 +268,25 @@ def _handle_diff(base, remote, output, args):
     # Perform actual work:
     a = read_notebook(base, on_null='empty')
     b = read_notebook(remote, on_null='empty')
+    return a, b
 
-    d = diff_notebooks(a, b)
 
-    # Output as JSON to file, or print to stdout:
+def _quiet_status(a, b):
+    """Only reports through the exit status if the notebooks differ.
+
+    Stops at the first difference, without diffing the notebooks.
+    """
+    return 0 if notebooks_equivalent(a, b) else 1
+
+
+def _output_diff(base, remote, a, d, output, args, out):
+    """Outputs a diff according to args, returning the exit status"""
+    # Output as JSON to file, or print to out:
     if output:
-        with open(output, "w") as df:
-            # Compact version:
-            #json.dump(d, df)
-            # Verbose version:
-            json.dump(d, df, indent=2, separators=(",", ": "))
+        _write_diff(d, output, args)
     else:
-        # This printer is to keep the unit tests passing,
-        # some tests capture output with capsys which doesn't
-        # pick up on sys.stdout.write()
-        class Printer:
-            def write(self, text):
-                print(text, end="")
         # This sets up what to ignore:
-        config = prettyprint_config_from_args(args, out=Printer())
+        config = prettyprint_config_from_args(args, out=out)
         # Separate out filenames:
         base_name = base if isinstance(base, str) else base.name
         remote_name = remote if isinstance(remote, str) else remote.name
@@ -85,6 +295,32 @@ def _handle_diff(base, remote, output, args):
     return 0
 
 
+def _write_diff(d, output, args):
+    blob_threshold = getattr(args, 'blob_threshold', None)
+    if blob_threshold is not None:
+        d, blobs = externalize_blobs(d, blob_threshold)
+        with open(blobs_filename(output), "w") as bf:
+            write_json(blobs, bf)
+    if getattr(args, 'format', 'json') == 'binary':
+        with open(output, "wb") as df:
+            write_binary_diff(d, df)
+    else:
+        with open(output, "w") as df:
+            write_json(d, df)
+
+
+def _positive_int(value):
+    "Argument type for a positive integer."
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            "expected a positive integer, got %r" % (value,))
+    return number
+
+
 def _build_arg_parser(prog=None):
     """Creates an argument parser for the nbdiff command."""
     parser = ConfigBackedParser(
@@ -118,6 +354,43 @@ def _build_arg_parser(prog=None):
         default=None,
         help="if supplied, the diff is written to this file. "
              "Otherwise it is printed to the terminal.")
+    parser.add_argument(
+        '-q', '--quiet',
+        action='store_true',
+        default=False,
+        help="do not output the diff, exit with status 1 if the notebooks "
+             "differ and 0 if not. With git refs, stops at the first "
+             "notebook that differs.")
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        metavar='N',
+        help="when diffing git refs, diff the changed notebooks in N "
+             "worker processes. The diffs are output in the same order "
+             "as with a single process.")
+    parser.add_argument(
+        '--pager',
+        action='store_true',
+        default=False,
+        help="show the diff in a pager, given by the NBDIME_PAGER or PAGER "
+             "environment variable, or less. Quitting the pager early "
+             "stops the diffing.")
+    parser.add_argument(
+        '--format',
+        choices=('json', 'binary'),
+        default='json',
+        help="the format of the diff written with --out. The binary "
+             "format is more compact, and can be read by nbpatch.")
+    parser.add_argument(
+        '--blob-threshold',
+        type=_positive_int,
+        default=None,
+        metavar='SIZE',
+        help="with --out, replace strings of at least SIZE characters "
+             "in added values by references to their content hash, and "
+             "write the strings to a separate file with the suffix "
+             ".blobs.json. nbpatch reads this file if present.")
 
     return parser
 
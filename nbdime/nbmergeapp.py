@@ -4,13 +4,13 @@
 # Distributed under the terms of the Modified BSD License.
 
 import io
-import json
 import os
 import sys
 
 import nbformat
 
 from .args import ConfigBackedParser, Path, prettyprint_config_from_args
+from .diff_utils import write_json
 from .log import logger
 from .merging import merge_notebooks
 from .prettyprint import pretty_print_merge_decisions
@@ -47,7 +47,8 @@ def main_merge(args):
     l = read_notebook(lfn, on_null='minimal')
     r = read_notebook(rfn, on_null='minimal')
 
-    merged, decisions = merge_notebooks(b, l, r, args)
+    # The merged notebook is only written out
+    merged, decisions = merge_notebooks(b, l, r, args, share=True)
     conflicted = [d for d in decisions if d.conflict]
 
     returncode = 1 if conflicted else 0
@@ -61,7 +62,7 @@ def main_merge(args):
         if mfn:
             # write decisions as JSON file
             with io.open(mfn, "w", encoding="utf8") as outfile:
-                json.dump(decisions, outfile, indent=2)
+                write_json(decisions, outfile, indent=2)
                 outfile.write("\n")
         else:
             # Print merge decisions (including unconflicted)
@@ -12,7 +12,8 @@ import nbformat
 
 from .args import ConfigBackedParser
 from .patching import patch_notebook
-from .diff_utils import to_diffentry_dicts
+from .diff_format import is_binary_diff, read_binary_diff
+from .diff_utils import to_diffentry_dicts, internalize_blobs, blobs_filename
 from .utils import EXPLICIT_MISSING_FILE, read_notebook, setup_std_streams
 from .prettyprint import pretty_print_notebook, PrettyPrintConfig
 
@@ -31,11 +32,16 @@ def main_patch(args):
             return 1
 
     before = read_notebook(base_filename, on_null='empty')
-    with io.open(patch_filename, encoding="utf8") as patch_file:
-        diff = json.load(patch_file)
-    diff = to_diffentry_dicts(diff)
+    with io.open(patch_filename, "rb") as patch_file:
+        if is_binary_diff(patch_file):
+            diff = read_binary_diff(patch_file)
+        else:
+            diff = to_diffentry_dicts(json.load(patch_file))
+    if os.path.exists(blobs_filename(patch_filename)):
+        with io.open(blobs_filename(patch_filename), encoding="utf8") as blobs_file:
+            diff = internalize_blobs(diff, json.load(blobs_file))
 
-    after = patch_notebook(before, diff)
+    after = patch_notebook(before, diff, share=True)
 
     if output_filename:
         nbformat.write(after, output_filename)
@@ -3,7 +3,7 @@
 # Copyright (c) Jupyter Development Team.
 # Distributed under the terms of the Modified BSD License.
 
-import copy
+from copy import deepcopy
 import nbformat
 from nbformat import NotebookNode
 
@@ -15,7 +15,14 @@ from .diff_utils import flatten_list_of_string_diff
 __all__ = ["patch", "patch_notebook"]
 
 
-def patch_list(obj, diff):
+def _take(values, share):
+    "Values not mentioned in diff, deep copied unless share is true."
+    if share:
+        return values
+    return [deepcopy(value) for value in values]
+
+
+def patch_list(obj, diff, share=False):
     # The patched sequence to build and return
     newobj = []
     # Index into obj, the next item to take unless diff says otherwise
@@ -26,7 +33,7 @@ def patch_list(obj, diff):
         assert isinstance(index, int), 'list key must be integer'
 
         # Take values from obj not mentioned in diff, up to not including index
-        newobj.extend(copy.deepcopy(value) for value in obj[take:index])
+        newobj.extend(_take(obj[take:index], share))
 
         if op == DiffOp.ADDRANGE:
             # Extend with new values directly
@@ -36,7 +43,7 @@ def patch_list(obj, diff):
             # Delete a number of values by skipping
             skip = e.length
         elif op == DiffOp.PATCH:
-            newobj.append(patch(obj[index], e.diff))
+            newobj.append(patch(obj[index], e.diff, share))
             skip = 1
         # Note that the operations ADD, REMOVE, REPLACE are not produced by the
         # diff algorithm anymore, keeping these cases just in case we want them back:
@@ -60,7 +67,7 @@ def patch_list(obj, diff):
         take = max(take, index + skip)
 
     # Take values at end not mentioned in diff
-    newobj.extend(copy.deepcopy(value) for value in obj[take:len(obj)])
+    newobj.extend(_take(obj[take:len(obj)], share))
 
     return newobj
 
@@ -72,17 +79,17 @@ def patch_string(obj, diff):
 
     # Flatten line-based diff to character based first!
     diff = flatten_list_of_string_diff(obj, diff)
-    return "".join(patch_list(list(obj), diff))
+    return "".join(patch_list(list(obj), diff, share=True))
 
 
 def patch_singleline_string(obj, diff):
     "Patch a singleline string, assuming diff is character based."
     # This can possibly be optimized for str if wanted, but
     # waiting until patch_list has been tested and debugged better
-    return "".join(patch_list(list(obj), diff))
+    return "".join(patch_list(list(obj), diff, share=True))
 
 
-def patch_dict(obj, diff):
+def patch_dict(obj, diff, share=False):
     newobj = {}
     deleted_keys = set()
 
@@ -102,19 +109,19 @@ def patch_dict(obj, diff):
             newobj[key] = e.value
         elif op == DiffOp.PATCH:
             assert key not in deleted_keys, 'cannot patch deleted key: %r' % key
-            newobj[key] = patch(obj[key], e.diff)
+            newobj[key] = patch(obj[key], e.diff, share)
         else:
             raise NBDiffFormatError("Invalid op {}.".format(op))
 
     # Take items not mentioned in diff
     for key in obj:
         if key not in deleted_keys and key not in newobj:
-            newobj[key] = copy.deepcopy(obj[key])
+            newobj[key] = obj[key] if share else deepcopy(obj[key])
 
     return NotebookNode(newobj)
 
 
-def patch(obj, diff):
+def patch(obj, diff, share=False):
     """Produce a patched version of obj with given hierarchical diff.
 
     A valid input object can be any dict or list of leaf values,
@@ -125,16 +132,57 @@ def patch(obj, diff):
     Leaf values are any non-dict, non-list objects as far as patch
     is concerned, although the intentional use of this library
     is that values are json-serializable.
+
+    Values not mentioned in diff are deep copied, while values added
+    by diff are shared with diff. With share=True, only the containers
+    on the paths touched by diff are new objects, and everything else
+    is shared with obj. That is much faster for large objects, but the
+    result must then be treated as immutable.
     """
     if isinstance(obj, dict):
-        return patch_dict(obj, diff)
+        return patch_dict(obj, diff, share)
     elif isinstance(obj, list):
-        return patch_list(obj, diff)
+        return patch_list(obj, diff, share)
     elif isinstance(obj, str):
         return patch_string(obj, diff)
     else:
         raise ValueError("Invalid object type to patch: {}".format(type(obj).__name__))
 
 
-def patch_notebook(nb, diff):
+def as_notebook_node(obj):
+    """Convert any plain dicts in obj to NotebookNode.
+
+    Unlike nbformat.from_dict this returns obj itself if it needs no
+    conversion, so that subtrees shared by patch are not copied.
+    """
+    if isinstance(obj, dict):
+        newobj = None if isinstance(obj, NotebookNode) else NotebookNode(obj)
+        for key, value in obj.items():
+            if isinstance(value, (dict, list)):
+                newvalue = as_notebook_node(value)
+                if newvalue is not value:
+                    if newobj is None:
+                        newobj = NotebookNode(obj)
+                    newobj[key] = newvalue
+        return obj if newobj is None else newobj
+    elif isinstance(obj, list):
+        newobj = None
+        for i, value in enumerate(obj):
+            if isinstance(value, (dict, list)):
+                newvalue = as_notebook_node(value)
+                if newvalue is not value:
+                    if newobj is None:
+                        newobj = list(obj)
+                    newobj[i] = newvalue
+        return obj if newobj is None else newobj
+    return obj
+
+
+def patch_notebook(nb, diff, share=False):
+    """Produce a patched version of the notebook nb with given diff.
+
+    Unchanged content is shared with nb if share is true, see patch.
+    """
+    if share:
+        return as_notebook_node(patch(nb, diff, share=True))
     return nbformat.from_dict(patch(nb, diff))
@@ -4,6 +4,7 @@
 # Distributed under the terms of the Modified BSD License.
 
 from collections import namedtuple
+import copy
 import datetime
 from difflib import unified_diff
 import hashlib
@@ -26,6 +27,9 @@ from .patching import patch
 from .utils import star_path, split_path, join_path
 from .utils import as_text, as_text_lines
 from .log import warning
+from .textdiff import (
+    diff_render_unified, diff_render_words, patch_lines, render_unified,
+    render_words)
 
 
 # Indentation offset in pretty-print
@@ -80,7 +84,8 @@ class PrettyPrintConfig:
             use_git = True,
             use_diff = True,
             use_color = True,
-            language = None
+            language = None,
+            render_in_process = False
             ):
         self.out = out
         if include is None:
@@ -96,6 +101,7 @@ class PrettyPrintConfig:
         self.use_diff = use_diff
         self.use_color = use_color
         self.language = language
+        self.render_in_process = render_in_process
 
     def should_ignore_path(self, path):
         starred = star_path(split_path(path))
@@ -168,6 +174,9 @@ def external_merge_render(cmd, b, l, r):
     return output, status
 
 
+_no_newline_re = re.compile(r"^\\ No newline at end of file\n?", flags=re.M)
+
+
 def external_diff_render(cmd, a, b):
     a = as_text(a)
     b = as_text(b)
@@ -186,14 +195,72 @@ def external_diff_render(cmd, a, b):
         output, errors = p.communicate()
         status = p.returncode
         output = output.decode('utf8')
-        r = re.compile(r"^\\ No newline at end of file\n?", flags=re.M)
-        output, n = r.subn("", output)
+        output, n = _no_newline_re.subn("", output)
         assert n <= 2, 'unexpected output from external diff renderer'
     finally:
         shutil.rmtree(td)
     return output, status
 
 
+_ansi_escape_re = re.compile(r"\x1b\[[0-9;]*m")
+
+# Header of the diff of each file pair when diffing the before and
+# after directories, by git and diff respectively. The prefixes git
+# puts on the paths are set explicitly for git, see diff_render_batch,
+# but any single path component is accepted:
+_batch_header_re = re.compile(
+    r"^diff (?:--git (?:[^/\s]*/)?)?before/(\d{6}) (?:[^/\s]*/)?after/\1$")
+
+# Options for git diff when rendering in batch, which keep the output
+# independent of the user's diff.noprefix, diff.mnemonicPrefix and
+# diff.external settings, so that it can be split by file pair
+git_diff_batch_options = '--no-ext-diff --src-prefix=a/ --dst-prefix=b/'
+
+
+def external_diff_render_batch(cmd, pairs):
+    """Render the diffs of several pairs of strings with one external process.
+
+    The strings are written to files in 'before' and 'after' directories,
+    which are diffed by cmd. Returns the output for each pair, starting
+    with the header line of the file pair, and empty for equal pairs.
+    Raises ValueError if the output cannot be split by file pair.
+    """
+    td = tempfile.mkdtemp()
+    try:
+        for name in ('before', 'after'):
+            os.mkdir(os.path.join(td, name))
+        for i, (a, b) in enumerate(pairs):
+            fn = '%06d' % i
+            with io.open(os.path.join(td, 'before', fn), 'w', encoding="utf8") as f:
+                f.write(as_text(a))
+            with io.open(os.path.join(td, 'after', fn), 'w', encoding="utf8") as f:
+                f.write(as_text(b))
+        p = Popen(cmd, cwd=td, stdout=PIPE)
+        output, errors = p.communicate()
+        if p.returncode not in (0, 1):
+            raise ValueError('external diff renderer failed with status %d' % p.returncode)
+        output = output.decode('utf8')
+    finally:
+        shutil.rmtree(td)
+
+    outputs = [[] for _ in pairs]
+    current = None
+    for line in output.splitlines(True):
+        m = _batch_header_re.match(_ansi_escape_re.sub("", line).rstrip("\n"))
+        if m is not None and int(m.group(1)) < len(pairs):
+            current = outputs[int(m.group(1))]
+        elif current is None:
+            raise ValueError('unexpected output from external diff renderer')
+        current.append(line)
+    rendered = []
+    for lines in outputs:
+        text, n = _no_newline_re.subn("", "".join(lines))
+        if n > 2:
+            raise ValueError('unexpected output from external diff renderer')
+        rendered.append(text)
+    return rendered
+
+
 def format_merge_render_lines(
         base, local, remote,
         base_title, local_title, remote_title,
@@ -321,17 +388,67 @@ def builtin_diff_render(a, b, config):
     return '\n'.join(uni)
 
 
-def diff_render_with_git(a, b, config):
+def _git_diff_print_cmd(config):
     cmd = git_diff_print_cmd
     if not config.use_color:
         cmd = cmd.replace(" --color-words", "")
     elif not config.color_words:
         # Will do nothing if use_color is not True:
         cmd = cmd.replace("--color-words", "--color")
+    return cmd
+
+
+def diff_render_with_git(a, b, config):
+    cmd = _git_diff_print_cmd(config)
     diff, status = external_diff_render(cmd.split(), a, b)
     return "".join(diff.splitlines(True)[4:])
 
 
+# Formats of diffs of multiline strings rendered in process,
+# see _diff_render_format
+_in_process_formats = ('words', 'nbdime')
+
+
+def _diff_render_format(config):
+    """The format of the diffs rendered by diff_render with config.
+
+    These are 'words' and 'nbdime' for the word and unified diffs
+    rendered in process by nbdime.textdiff, and 'git', 'diff' and
+    'difflib' for the diffs rendered by those.
+    """
+    use_git = config.use_git and not config.render_in_process and which('git')
+    if config.use_color and config.color_words:
+        # Word diffs are rendered in process only when git is not used
+        return 'git' if use_git else 'words'
+    elif config.render_in_process:
+        return 'nbdime'
+    elif use_git:
+        return 'git'
+    elif config.use_diff and which('diff'):
+        return 'diff'
+    else:
+        return 'difflib'
+
+
+def diff_render_changes(alines, blines, ranges, config=DefaultConfig,
+                        render_format=None):
+    """Render known changes between the lines of two strings in process.
+
+    The lines are those split by textdiff.split_lines, and ranges are
+    the changed lines as (i1, i2, j1, j2), such that alines[i1:i2] are
+    replaced by blines[j1:j2]. The diff is rendered in render_format,
+    by default that of config, which must be one of the formats
+    rendered in process.
+    """
+    if render_format is None:
+        render_format = _diff_render_format(config)
+    if render_format == 'words':
+        return render_words(alines, blines, ranges)
+    elif render_format == 'nbdime':
+        return render_unified(alines, blines, ranges, config.use_color)
+    raise ValueError('Diffs cannot be rendered in process in format %r' % render_format)
+
+
 def diff_render_with_diff(a, b):
     cmd = diff_print_cmd
     diff, status = external_diff_render(cmd.split(), a, b)
@@ -343,15 +460,131 @@ def diff_render_with_difflib(a, b, config):
     return "".join(diff.splitlines(True)[2:])
 
 
-def diff_render(a, b, config=DefaultConfig):
-    if config.use_git and which('git'):
+def diff_render(a, b, config=DefaultConfig, render_format=None):
+    """Render the diff of two multiline strings, without file headers.
+
+    The format is that of config, unless render_format from
+    _diff_render_format is given.
+    """
+    if render_format is None:
+        render_format = _diff_render_format(config)
+    if render_format == 'words':
+        return diff_render_words(a, b)
+    elif render_format == 'nbdime':
+        return diff_render_unified(a, b, config.use_color)
+    elif render_format == 'git':
         return diff_render_with_git(a, b, config)
-    elif config.use_diff and which('diff'):
+    elif render_format == 'diff':
         return diff_render_with_diff(a, b)
     else:
         return diff_render_with_difflib(a, b, config)
 
 
+def diff_render_batch(pairs, config=DefaultConfig, render_format=None):
+    """Render the diffs of several pairs of strings, like diff_render.
+
+    Uses a single external git or diff process for all pairs, and
+    falls back to rendering with difflib if that fails. The format
+    is that of config, unless render_format from _diff_render_format
+    is given.
+    """
+    if not pairs:
+        return []
+    if render_format is None:
+        render_format = _diff_render_format(config)
+    if render_format in _in_process_formats:
+        return [diff_render(a, b, config, render_format) for a, b in pairs]
+    elif render_format == 'git':
+        cmd = _git_diff_print_cmd(config).replace(
+            '--no-index', '--no-index ' + git_diff_batch_options)
+        skip = 4
+    elif render_format == 'diff':
+        cmd = diff_print_cmd
+        skip = 1
+    else:
+        cmd = None
+    if cmd is not None:
+        try:
+            rendered = external_diff_render_batch(cmd.split(), pairs)
+        except (OSError, ValueError) as e:
+            warning('Rendering diffs with %r failed, falling back to difflib: %s',
+                    cmd.split()[0], e)
+        else:
+            return ["".join(diff.splitlines(True)[skip:]) for diff in rendered]
+    return [diff_render_with_difflib(a, b, config) for a, b in pairs]
+
+
+class BatchedDiffRenderOutput:
+    """Output stream that renders the multiline string diffs written
+    to it together, with diff_render_batch.
+
+    Text written with write() and diffs added with write_diff() are
+    kept in order, and written to out by flush().
+    """
+
+    def __init__(self, out, config):
+        self.out = out
+        self.config = config
+        self._pieces = []
+        self._pairs = []
+        self._render_format = None
+
+    @property
+    def render_format(self):
+        "The format of the diffs, looking for the tools once rather than for every diff."
+        if self._render_format is None:
+            self._render_format = _diff_render_format(self.config)
+        return self._render_format
+
+    def write(self, text):
+        self._pieces.append(text)
+
+    def write_diff(self, a, b):
+        self._pieces.append(len(self._pairs))
+        self._pairs.append((a, b))
+
+    def flush(self):
+        rendered = diff_render_batch(self._pairs, self.config, self.render_format)
+        for piece in self._pieces:
+            self.out.write(rendered[piece] if isinstance(piece, int) else piece)
+        self._pieces = []
+        self._pairs = []
+
+
+class BufferedOutput:
+    """Output stream that collects the many small pieces of text written
+    by the pretty printers, and writes them to out in chunks of about
+    chunk_size characters.
+
+    The rest is written to out, and out flushed, by flush().
+    """
+
+    def __init__(self, out, chunk_size=65536):
+        self.out = out
+        self.chunk_size = chunk_size
+        self._pieces = []
+        self._size = 0
+
+    def write(self, text):
+        self._pieces.append(text)
+        self._size += len(text)
+        if self._size >= self.chunk_size:
+            self._write_chunk()
+
+    def _write_chunk(self):
+        if self._pieces:
+            chunk = "".join(self._pieces)
+            self._pieces = []
+            self._size = 0
+            self.out.write(chunk)
+
+    def flush(self):
+        self._write_chunk()
+        flush = getattr(self.out, "flush", None)
+        if flush is not None:
+            flush()
+
+
 def merge_render_with_git(b, l, r, strategy=None):
     # Note: git merge-file also takes argument -L to change label if needed
     cmd = git_mergefile_print_cmd
@@ -825,7 +1058,19 @@ def pretty_print_string_diff(a, di, path, config=DefaultConfig):
     "Pretty-print a nbdime diff."
     pretty_print_diff_action("modified", path, config)
 
-    b = patch(a, di)
+    batched = isinstance(config.out, BatchedDiffRenderOutput)
+    if batched:
+        render_format = config.out.render_format
+    else:
+        render_format = _diff_render_format(config)
+    changes = None
+    if render_format in _in_process_formats:
+        # Render the changed lines from di instead of diffing a and b again
+        changes = patch_lines(a, di)
+    if changes is None:
+        b = patch(a, di)
+    else:
+        b = "".join(changes[1])
 
     ta = _trim_base64(a)
     tb = _trim_base64(b)
@@ -841,8 +1086,12 @@ def pretty_print_string_diff(a, di, path, config=DefaultConfig):
             pretty_print_value_at(b, path, config.ADD, config)
     elif "\n" in a or "\n" in b:
         # Delegate multiline diff formatting
-        diff = diff_render(a, b, config)
-        config.out.write(diff)
+        if changes is not None:
+            config.out.write(diff_render_changes(*changes, config, render_format))
+        elif batched:
+            config.out.write_diff(a, b)
+        else:
+            config.out.write(diff_render(a, b, config, render_format))
     else:
         # Just show simple -+ single line (usually metadata values etc)
         config.out.write("%s%s\n" % (config.REMOVE, a))
@@ -894,7 +1143,11 @@ def pretty_print_notebook_diff(afn, bfn, a, di, config=DefaultConfig):
         btime = "  " + file_timestamp(bfn)
         config.out.write(notebook_diff_header.format(
             afn=afn, bfn=bfn, atime=atime, btime=btime))
+        # Render the diffs of all multiline strings in one go
+        config = copy.copy(config)
+        config.out = out = BatchedDiffRenderOutput(config.out, config)
         pretty_print_diff(a, di, path, config)
+        out.flush()
 
 
 def pretty_print_merge_decision(base, decision, config=DefaultConfig):
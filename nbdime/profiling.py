@@ -109,6 +109,159 @@ class TimePaths(object):
 timer = TimePaths(enabled=False)
 
 
+def _best_time(func, repeat):
+    "The best time of repeat calls of func, for the benchmarks below."
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmark_bruteforce_grids(sizes=(10, 50, 100, 120, 140, 160, 200, 400), repeat=3):
+    """Compare the pure Python and numpy bruteforce grid implementations.
+
+    Prints the best time of computing G and R for random square
+    sequences of the given sizes, which shows the crossover point
+    used for seq_bruteforce.NUMPY_GRID_THRESHOLD.
+
+    Run with `python -c "import nbdime.profiling as p; p.benchmark_bruteforce_grids()"`.
+    """
+    import operator
+    import random
+    from .diffing import seq_bruteforce as sb
+    if sb.np is None:
+        raise RuntimeError("numpy is required for this benchmark")
+
+    rng = random.Random(0)
+    lines = []
+    for n in sizes:
+        A = [rng.choice("abcdefgh") for _ in range(n)]
+        B = [rng.choice("abcdefgh") for _ in range(n)]
+        t_py = _best_time(lambda: sb._llcs_grid_python(
+            sb._compare_grid_python(A, B, operator.__eq__)), repeat)
+        t_np = _best_time(lambda: sb._llcs_grid_numpy(
+            sb._compare_grid_numpy(A, B, operator.__eq__)), repeat)
+        lines.append((n * n, t_py, t_np, t_py / t_np))
+    print(tabulate(lines, headers=['N*M', 'Python', 'NumPy', 'Speedup']))
+
+
+def benchmark_sequence_diff_builder(sizes=(1000, 10000, 100000), repeat=3):
+    """Time building sequence diffs with entries added in and out of order.
+
+    Entries are added in sorted order by the diff algorithms, which is
+    linear time, while shuffled entries are sorted once by validated().
+
+    Run with `python -c "import nbdime.profiling as p; p.benchmark_sequence_diff_builder()"`.
+    """
+    import random
+    from .diff_format import SequenceDiffBuilder, op_addrange, op_removerange, op_patch
+
+    def build(entries):
+        di = SequenceDiffBuilder()
+        for e in entries:
+            di.append(e)
+        di.validated()
+
+    rng = random.Random(0)
+    lines = []
+    for n in sizes:
+        # Like a regenerated output: each line is removed and added again
+        entries = []
+        for key in range(n):
+            entries.append(op_addrange(key, ["line %d\n" % key]))
+            entries.append(op_removerange(key, 1))
+            entries.append(op_patch(key, [op_removerange(0, 1)]))
+        shuffled = list(entries)
+        rng.shuffle(shuffled)
+        lines.append((len(entries), _best_time(lambda: build(entries), repeat),
+                      _best_time(lambda: build(shuffled), repeat)))
+    print(tabulate(lines, headers=['Entries', 'In order', 'Shuffled']))
+
+
+def benchmark_diff_entry_memory(a=None, b=None):
+    """Compare the memory used by diff entries to that of plain dicts.
+
+    Diffs the notebooks a and b (file names), or by default a generated
+    notebook where every third line of long sources is changed. Prints
+    the number of diff entries and the total size of the entry objects
+    themselves, excluding the values they refer to, compared to the
+    size of the same entries as dicts.
+
+    Run with `python -c "import nbdime.profiling as p; p.benchmark_diff_entry_memory()"`.
+    """
+    import sys
+    import nbformat
+    from nbformat.v4 import new_notebook, new_code_cell
+    from .diff_format import DiffEntry
+    from .diffing.notebooks import diff_notebooks
+
+    if a is None:
+        def notebook(changed):
+            cells = []
+            for i in range(20):
+                source = "".join(
+                    "x_%d = %d%s\n" % (j, i, " + 1" if changed and j % 3 == 0 else "")
+                    for j in range(1000))
+                # Same ids in both notebooks, for quick alignment of cells
+                cells.append(new_code_cell(source, id="cell-%d" % i))
+            return new_notebook(cells=cells)
+        a = notebook(False)
+        b = notebook(True)
+    else:
+        a = nbformat.read(a, as_version=4)
+        b = nbformat.read(b, as_version=4)
+
+    d = diff_notebooks(a, b)
+
+    def entries(diff):
+        for e in diff:
+            yield e
+            if e.op == "patch":
+                yield from entries(e.diff)
+
+    count = 0
+    slotted = 0
+    dicts = 0
+    for e in entries(d):
+        assert isinstance(e, DiffEntry)
+        count += 1
+        slotted += sys.getsizeof(e)
+        dicts += sys.getsizeof(e.to_dict())
+    print(tabulate(
+        [(count, slotted, dicts, dicts / slotted)],
+        headers=['Entries', 'Bytes', 'Bytes as dicts', 'Ratio']))
+
+
+def benchmark_patch_notebook(cells=(100, 1000), repeat=3):
+    """Time patching one cell of notebooks with large image outputs.
+
+    Compares the default patch, which deep copies unchanged content,
+    to sharing it with the input notebook with share=True.
+
+    Run with `python -c "import nbdime.profiling as p; p.benchmark_patch_notebook()"`.
+    """
+    from nbformat.v4 import new_notebook, new_code_cell, new_output
+    from .diff_format import op_patch, op_addrange, op_removerange
+    from .patching import patch_notebook
+
+    image = "iVBORw0KGgo" * 10000
+    lines = []
+    for n in cells:
+        nb = new_notebook(cells=[
+            new_code_cell("plot(%d)" % i, outputs=[new_output(
+                "display_data", data={"image/png": image, "text/plain": "<Figure>"},
+                metadata={"image/png": {"width": 640, "height": 480}})])
+            for i in range(n)])
+        diff = [op_patch("cells", [op_patch(n // 2, [op_patch("source", [
+            op_addrange(0, ["plot(-1)"]), op_removerange(0, 1)])])])]
+        t_copy = _best_time(lambda: patch_notebook(nb, diff), repeat)
+        t_shared = _best_time(lambda: patch_notebook(nb, diff, share=True), repeat)
+        lines.append((n, t_copy, t_shared, t_copy / t_shared))
+    print(tabulate(lines, headers=['Cells', 'Copy', 'Shared', 'Speedup']))
+
+
 def profile_diff_paths(args=None):
     import nbdime.nbdiffapp
     import nbdime.profiling
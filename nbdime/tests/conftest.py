@@ -23,6 +23,8 @@ import nbformat
 
 from .utils import call, have_git, have_hg, wait_up, TEST_TOKEN
 
+from nbdime.diff_format import (
+    set_diff_validation, get_diff_validation, DIFF_VALIDATION_ENV)
 from nbdime.diffing.notebooks import reset_notebook_differ
 
 
@@ -39,6 +41,23 @@ def testspath():
     return os.path.abspath(os.path.dirname(__file__))
 
 
+@fixture(autouse=True)
+def diff_validation(monkeypatch):
+    """Validate the diffs computed by each test deeply, also in subprocesses.
+
+    Returns a function for tests to set another validation mode.
+    """
+    previous = get_diff_validation()
+
+    def set_mode(mode):
+        set_diff_validation(mode)
+        monkeypatch.setenv(DIFF_VALIDATION_ENV, mode)
+
+    set_mode("deep")
+    yield set_mode
+    set_diff_validation(previous)
+
+
 @fixture
 def slow(request):
     if request.config.getoption('--quick', default=False):
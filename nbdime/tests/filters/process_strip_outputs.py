@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Jupyter Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+"""A test filter that removes outputs on clean, using git's long-running
+process protocol (filter.<driver>.process).
+
+Each cleaned notebook gets the number of files cleaned by the process
+so far in its metadata, to check that the process is reused.
+"""
+
+import sys
+
+import nbformat
+
+
+def read_pkt(stream):
+    length = int(stream.read(4), 16)
+    if length == 0:
+        return None
+    return stream.read(length - 4)
+
+
+def read_pkt_list(stream):
+    items = []
+    while True:
+        data = read_pkt(stream)
+        if data is None:
+            return items
+        items.append(data.decode('utf8').rstrip('\n'))
+
+
+def write_pkt(stream, data):
+    stream.write(b'%04x' % (len(data) + 4) + data)
+
+
+def write_pkt_list(stream, items):
+    for item in items:
+        write_pkt(stream, (item + '\n').encode('utf8'))
+    stream.write(b'0000')
+    stream.flush()
+
+
+def clean(content, count):
+    nb = nbformat.reads(content.decode('utf8'), as_version=4)
+    for cell in nb['cells']:
+        if 'outputs' in cell:
+            cell['outputs'] = []
+    nb.metadata['filter_count'] = count
+    return nbformat.writes(nb).encode('utf8')
+
+
+def main():
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    read_pkt_list(stdin)
+    write_pkt_list(stdout, ['git-filter-server', 'version=2'])
+    read_pkt_list(stdin)
+    write_pkt_list(stdout, ['capability=clean'])
+    count = 0
+    while True:
+        try:
+            command = read_pkt_list(stdin)
+        except ValueError:
+            # End of input
+            return
+        content = b''
+        while True:
+            data = read_pkt(stdin)
+            if data is None:
+                break
+            content += data
+        count += 1
+        output = clean(content, count)
+        write_pkt_list(stdout, ['status=success'])
+        for start in range(0, len(output), 65516):
+            write_pkt(stdout, output[start:start + 65516])
+        write_pkt_list(stdout, [])
+        write_pkt_list(stdout, [])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -25,6 +25,7 @@ from .utils import (
 
 import nbdime
 from nbdime.args import process_exclusive_ignorables
+from nbdime.diff_format import get_diff_validation
 from nbdime.diffing.notebooks import notebook_differs
 from nbdime.nbshowapp import main_show
 from nbdime.nbdiffapp import main_diff
@@ -63,6 +64,18 @@ def test_nbshow_app(filespath, capsys):
     assert nbdime.log.logger.level == logging.CRITICAL
 
 
+def test_nbdiff_app_diff_validation_off(filespath, tmpdir):
+    afn = os.path.join(filespath, "multilevel-test-base.ipynb")
+    bfn = os.path.join(filespath, "multilevel-test-local.ipynb")
+    dfn = str(tmpdir.join("diff.json"))
+    pfn = str(tmpdir.join("patched.ipynb"))
+
+    assert 0 == nbdiffapp.main([afn, bfn, '--out', dfn, '--diff-validation', 'off'])
+    assert get_diff_validation() == 'off'
+    assert 0 == nbpatchapp.main([afn, dfn, '-o', pfn])
+    assert nbformat.read(pfn, as_version=4) == nbformat.read(bfn, as_version=4)
+
+
 def test_nbpatch_app(capsys, filespath):
     # this entrypoint is not exported,
     # but exercise it anyway
@@ -84,6 +97,106 @@ def test_nbdiff_app(filespath):
     assert nbdime.log.logger.level == logging.WARN
 
 
+def test_nbdiff_app_blobs(filespath, tmpdir):
+    afn = os.path.join(filespath, "src-and-output--1.ipynb")
+    bfn = os.path.join(filespath, "src-and-output--2.ipynb")
+    dfn = str(tmpdir.join("diff.json"))
+    pfn = str(tmpdir.join("patched.ipynb"))
+
+    assert 0 == nbdiffapp.main([afn, bfn, '--out', dfn, '--blob-threshold', '10'])
+    with io.open(dfn + ".blobs.json", encoding="utf8") as f:
+        assert json.load(f)
+    with io.open(dfn, encoding="utf8") as f:
+        assert "nbdime_blob" in f.read()
+
+    assert 0 == nbpatchapp.main([afn, dfn, '-o', pfn])
+    assert nbformat.read(pfn, as_version=4) == nbformat.read(bfn, as_version=4)
+
+
+@pytest.mark.parametrize('threshold', ['0', '-1', 'many', '1.5'])
+def test_nbdiff_app_invalid_blob_threshold(filespath, tmpdir, capsys, threshold):
+    afn = os.path.join(filespath, "src-and-output--1.ipynb")
+    bfn = os.path.join(filespath, "src-and-output--2.ipynb")
+    dfn = str(tmpdir.join("diff.json"))
+
+    with pytest.raises(SystemExit) as e:
+        nbdiffapp.main([afn, bfn, '--out', dfn, '--blob-threshold', threshold])
+    assert e.value.code == 2
+    assert 'positive integer' in capsys.readouterr().err
+    assert not os.path.exists(dfn)
+
+
+def test_nbdiff_app_binary_format(filespath, tmpdir):
+    afn = os.path.join(filespath, "multilevel-test-base.ipynb")
+    bfn = os.path.join(filespath, "multilevel-test-local.ipynb")
+    dfn = str(tmpdir.join("diff.bin"))
+    pfn = str(tmpdir.join("patched.ipynb"))
+
+    assert 0 == nbdiffapp.main([afn, bfn, '--out', dfn, '--format', 'binary'])
+    assert 0 == nbpatchapp.main([afn, dfn, '-o', pfn])
+    assert nbformat.read(pfn, as_version=4) == nbformat.read(bfn, as_version=4)
+
+
+def test_nbdiff_app_quiet(filespath, capsys):
+    afn = os.path.join(filespath, "multilevel-test-base.ipynb")
+    bfn = os.path.join(filespath, "multilevel-test-local.ipynb")
+
+    assert 1 == nbdiffapp.main([afn, bfn, '--quiet'])
+    assert 0 == nbdiffapp.main([afn, afn, '-q'])
+    assert capsys.readouterr().out == ''
+
+
+def test_nbdiff_app_quiet_does_not_diff(filespath, tmpdir, monkeypatch):
+    afn = os.path.join(filespath, "multilevel-test-base.ipynb")
+    bfn = os.path.join(filespath, "multilevel-test-local.ipynb")
+    cfn = str(tmpdir.join("outputs-changed.ipynb"))
+    nb = nbformat.read(afn, as_version=4)
+    for cell in nb.cells:
+        if cell.cell_type == 'code':
+            cell.execution_count = 42
+            cell.outputs = []
+    nbformat.write(nb, cfn)
+
+    def fail(a, b):
+        raise AssertionError("quiet diffing should stop at the first difference")
+    monkeypatch.setattr(nbdiffapp, 'diff_notebooks', fail)
+    assert 1 == nbdiffapp.main([afn, bfn, '--quiet'])
+    assert 0 == nbdiffapp.main([afn, afn, '--quiet'])
+    assert 1 == nbdiffapp.main([afn, cfn, '--quiet'])
+    # Only differs in ignored outputs and details
+    assert 0 == nbdiffapp.main([afn, cfn, '--quiet', '-s'])
+
+
+def test_nbdiff_app_pager(filespath, tmpdir, capsys, monkeypatch):
+    afn = os.path.join(filespath, "multilevel-test-base.ipynb")
+    bfn = os.path.join(filespath, "multilevel-test-local.ipynb")
+    assert 0 == nbdiffapp.main([afn, bfn, '--no-color'])
+    expected = capsys.readouterr().out
+
+    pfn = str(tmpdir.join("paged.txt"))
+    script = tmpdir.join("pager.py")
+    script.write(
+        "import shutil, sys\n"
+        "with open(sys.argv[1], 'w') as f:\n"
+        "    shutil.copyfileobj(sys.stdin, f)\n")
+    monkeypatch.setenv('NBDIME_PAGER', '"%s" "%s" "%s"' % (sys.executable, script, pfn))
+    assert 0 == nbdiffapp.main([afn, bfn, '--no-color', '--pager'])
+    assert capsys.readouterr().out == ''
+    with io.open(pfn) as f:
+        assert f.read() == expected
+
+    # Quitting the pager before reading stops the diffing quietly
+    monkeypatch.setenv('NBDIME_PAGER', '"%s" -c pass' % sys.executable)
+    assert 0 == nbdiffapp.main([afn, bfn, '--pager'])
+
+    # A missing pager falls back to stdout, a failing one to an error
+    monkeypatch.setenv('NBDIME_PAGER', str(tmpdir.join("no-such-pager")))
+    assert 0 == nbdiffapp.main([afn, bfn, '--no-color', '--pager'])
+    assert capsys.readouterr().out == expected
+    monkeypatch.setenv('NBDIME_PAGER', '"%s" -c "import sys; sys.exit(3)"' % sys.executable)
+    assert 1 == nbdiffapp.main([afn, bfn, '--pager'])
+
+
 def test_nbdiff_app_null_file(filespath):
     fn = os.path.join(filespath, "multilevel-test-base.ipynb")
 
@@ -114,6 +227,48 @@ def test_nbdiff_app_gitrefs(git_repo2):
     assert 0 == main_diff(args)
 
 
+def test_nbdiff_app_gitrefs_parallel(git_repo2, capsys):
+    for extra in ([], ['sub/subfile.ipynb', 'diff.ipynb']):
+        args = nbdiffapp._build_arg_parser().parse_args(
+            ['local', 'remote'] + extra + ['--no-color'])
+        assert 0 == main_diff(args)
+        sequential, _ = capsys.readouterr()
+
+        args = nbdiffapp._build_arg_parser().parse_args(
+            ['local', 'remote'] + extra + ['--no-color', '-j', '2'])
+        assert 0 == main_diff(args)
+        parallel, _ = capsys.readouterr()
+        assert parallel == sequential
+
+    args = nbdiffapp._build_arg_parser().parse_args(['local', 'remote', '-q', '-j', '2'])
+    assert 1 == main_diff(args)
+
+
+def test_nbdiff_app_parallel_window(filespath):
+    afn = os.path.join(filespath, "multilevel-test-base.ipynb")
+    bfn = os.path.join(filespath, "multilevel-test-local.ipynb")
+    consumed = []
+
+    def pairs():
+        for i in range(10):
+            consumed.append(i)
+            yield afn, bfn
+
+    class Output:
+        def __init__(self):
+            self.consumed = []
+
+        def write(self, text):
+            self.consumed.append(len(consumed))
+
+    args = nbdiffapp._build_arg_parser().parse_args([afn, bfn, '--no-color'])
+    out = Output()
+    assert 0 == nbdiffapp._handle_diffs_parallel(pairs(), None, args, 2, out)
+    assert len(out.consumed) == 10
+    # Pairs are only read a window ahead of the output
+    assert out.consumed[0] <= 4
+
+
 def test_nbdiff_app_unicode_safe(filespath):
     afn = os.path.join(filespath, "unicode--1.ipynb")
     bfn = os.path.join(filespath, "unicode--2.ipynb")
@@ -368,6 +523,22 @@ def test_nbmerge_app_conflict(tempfiles, capsys, reset_log):
     assert nb_stdout == nb_file
 
 
+def test_nbmerge_app_metadata_conflict(tmpdir, reset_log):
+    fns = []
+    for name, value in (('base', 1), ('local', 2), ('remote', 3)):
+        nb = nbformat.v4.new_notebook(metadata={'extra': {'value': value}})
+        fn = str(tmpdir.join(name + '.ipynb'))
+        nbformat.write(nb, fn)
+        fns.append(fn)
+    ofn = str(tmpdir.join('merged.ipynb'))
+
+    assert 1 == nbmergeapp.main(fns + ['--out', ofn])
+    merged = nbformat.read(ofn, as_version=4)
+    conflicts = merged.metadata['nbdime-conflicts']
+    assert conflicts['local_diff'][0]['key'] == 'extra'
+    assert conflicts['remote_diff'][0]['key'] == 'extra'
+
+
 def test_nbmerge_app_decisions(tempfiles, capsys, caplog, reset_log):
     bfn = os.path.join(tempfiles, "inline-conflict--1.ipynb")
     lfn = os.path.join(tempfiles, "inline-conflict--2.ipynb")
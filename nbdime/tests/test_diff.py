@@ -12,7 +12,10 @@ import operator
 
 from nbdime import diff
 from nbdime.diff_format import op_patch, op_add, op_replace, op_remove
-from nbdime.diffing.snakes import compute_snakes_multilevel
+import nbdime.diffing.snakes
+from nbdime.diffing.snakes import (
+    compute_snakes, compute_snakes_multilevel, compute_snakes_anchored,
+    find_unique_anchors)
 
 from .utils import check_symmetric_diff_and_patch
 
@@ -131,3 +134,60 @@ def test_compute_snakes_multilevel():
     assert snakes == [(0,0,1), (2,2,1)]
     snakes = compute_snakes_multilevel(A, B, compares)
     assert snakes == [(0,0,4)]
+
+
+def test_compute_snakes_myers_matches_bruteforce():
+    calls = []
+    def compare(x, y):
+        calls.append((x, y))
+        return x == y
+
+    A = list(range(200))
+    B = A[:50] + [-1] + A[51:120] + [-2, -3] + A[120:]
+
+    alg = nbdime.diffing.snakes.compute_snakes_algorithm
+    try:
+        nbdime.diffing.snakes.compute_snakes_algorithm = "bruteforce"
+        expected = compute_snakes(A, B, compare)
+        bruteforce_calls = len(calls)
+        del calls[:]
+        nbdime.diffing.snakes.compute_snakes_algorithm = "myers"
+        snakes = compute_snakes(A, B, compare)
+    finally:
+        nbdime.diffing.snakes.compute_snakes_algorithm = alg
+
+    assert snakes == expected == [(0, 0, 50), (51, 51, 69), (120, 122, 80)]
+    # Predicates should only be evaluated along explored diagonals
+    assert bruteforce_calls >= len(A) * len(B)
+    assert len(calls) < 3 * (len(A) + len(B))
+
+
+def test_find_unique_anchors():
+    A = ["a", "b", "x", "c", "d", "x", "e"]
+    B = ["b", "a", "c", "x", "y", "e", "d"]
+    # x is repeated in A, and of the crossing pairs (a, b) and (d, e)
+    # only one each can be kept in increasing order
+    assert find_unique_anchors(A, B, lambda x: x) == [(1, 0), (3, 2), (6, 5)]
+    # Items with None key are never anchors
+    assert find_unique_anchors(A, B, lambda x: None if x == "c" else x) == [(1, 0), (6, 5)]
+    # Restricting to a rectangle
+    assert find_unique_anchors(A, B, lambda x: x, rect=(2, 2, 5, 5)) == [(3, 2)]
+
+
+def test_compute_snakes_anchored():
+    calls = []
+    def compare(x, y):
+        calls.append((x, y))
+        return x[0] == y[0]
+
+    A = ["a0", "b0", "c0", "d0", "e0", "f0"]
+    B = ["a0", "b1", "c0", "x0", "d1", "e0", "f0"]
+    expected = compute_snakes_multilevel(A, B, [compare])
+    del calls[:]
+    snakes = compute_snakes_anchored(A, B, [compare], [lambda x: x])
+    assert snakes == expected == [(0, 0, 3), (3, 4, 3)]
+    # Only the items between the anchors are compared
+    assert set(calls) <= {("b0", "b1"), ("d0", "x0"), ("d0", "d1")}
+
+    # Without keys this is the plain multilevel algorithm
+    assert compute_snakes_anchored(A, B, [compare], []) == expected
@@ -1,5 +1,20 @@
+import io
+import random
+
+import pytest
 from jsonschema import Draft4Validator as Validator
 from nbdime import diff, diff_notebooks
+from nbdime.diff_utils import to_clean_dicts
+from nbdime.diff_format import (
+    set_diff_validation, get_diff_validation, SequenceDiffBuilder, DiffEntry,
+    DiffOp, op_add, op_addrange, op_removerange, op_patch, NBDiffFormatError,
+    write_binary_diff, read_binary_diff, is_binary_diff)
+import nbdime.diff_format
+import nbdime.diffing.generic
+from nbdime.diffing.config import DiffConfig
+from nbdime.diffing.lcs import diff_from_lcs
+from nbdime.diffing.seq_difflib import diff_sequence_difflib
+from nbdime.diffing.snakes import compute_diff_from_snakes
 
 
 def test_check_schema(json_schema_diff):
@@ -11,7 +26,7 @@ def test_validate_obj_diff(diff_validator):
     b = {"foo": [1, 3, 4], "bar": {"tang": 126, "hello": "world"}}
     d = diff(a, b)
 
-    diff_validator.validate(d)
+    diff_validator.validate(to_clean_dicts(d))
 
 
 def test_validate_array_diff(diff_validator):
@@ -19,11 +34,129 @@ def test_validate_array_diff(diff_validator):
     b = [1, 2, 4, 6]
     d = diff(a, b)
 
-    diff_validator.validate(d)
+    diff_validator.validate(to_clean_dicts(d))
 
 
 def test_validate_matching_notebook_diff(matching_nb_pairs, diff_validator):
     a, b = matching_nb_pairs
     d = diff_notebooks(a, b)
 
-    diff_validator.validate(d)
+    diff_validator.validate(to_clean_dicts(d))
+
+
+@pytest.mark.parametrize("mode, expected", [
+    ("off", []), ("shallow", [False]), ("deep", [True])])
+def test_diff_validation_modes(mode, expected, monkeypatch, diff_validation):
+    calls = []
+    def validate_diff(d, deep=False):
+        calls.append(deep)
+    monkeypatch.setattr(nbdime.diffing.generic, "validate_diff", validate_diff)
+    diff_validation(mode)
+    diff("abc", "abd")
+    assert calls == expected
+
+
+def test_diff_validation_once_per_diff(monkeypatch):
+    calls = []
+    def validate_diff(d, deep=False):
+        calls.append(deep)
+    monkeypatch.setattr(nbdime.diffing.generic, "validate_diff", validate_diff)
+    a = {"foo": [1, {"bar": "x\ny"}], "baz": {"ting": "a"}}
+    b = {"foo": [2, {"bar": "x\nz"}], "baz": {"ting": "b"}}
+    d = diff(a, b)
+    assert len(d) == 2
+    assert calls == [True]
+
+
+def test_diff_validation_checks_builder_entries(diff_validation):
+    entry = DiffEntry(op="add", key=0, value=1)
+    diff_validation("off")
+    SequenceDiffBuilder().append(entry)
+    diff_validation("shallow")
+    with pytest.raises(AssertionError):
+        SequenceDiffBuilder().append(entry)
+
+
+def test_diff_validation_off(matching_nb_pairs, diff_validation):
+    a, b = matching_nb_pairs
+    expected = diff_notebooks(a, b)
+    diff_validation("off")
+    assert get_diff_validation() == "off"
+    assert diff_notebooks(a, b) == expected
+
+
+def test_invalid_diff_validation_mode():
+    with pytest.raises(ValueError):
+        set_diff_validation("paranoid")
+
+
+def _insert_sorted(diff, entry):
+    "Reference implementation of sorted insertion of sequence diff entries."
+    pos = len(diff)
+    if entry.op == DiffOp.ADDRANGE:
+        while pos > 0 and diff[pos-1].key >= entry.key:
+            pos -= 1
+    else:
+        while pos > 0 and diff[pos-1].key > entry.key:
+            pos -= 1
+    diff.insert(pos, entry)
+
+
+@pytest.mark.parametrize("monotonic", [True, False])
+def test_sequence_diff_builder_order(monotonic):
+    rng = random.Random(0)
+    for _ in range(200):
+        keys = [rng.randint(0, 5) for _ in range(rng.randint(0, 12))]
+        if monotonic:
+            keys.sort()
+        builder = SequenceDiffBuilder()
+        expected = []
+        for i, key in enumerate(keys):
+            e = rng.choice([
+                op_addrange(key, [i]), op_removerange(key, 1), op_patch(key, [i])])
+            builder.append(e)
+            _insert_sorted(expected, e)
+        assert builder.validated() == expected
+
+
+def test_replace_diffs_need_no_sort(monkeypatch):
+    def no_sort(*args, **kwargs):
+        raise AssertionError("replace diff was not built in sorted order")
+    monkeypatch.setattr(nbdime.diff_format, "sorted", no_sort, raising=False)
+    a, b = list("axbyc"), list("apbqqc")
+    expected = [op_addrange(1, ["p"]), op_removerange(1, 1),
+                op_addrange(3, ["q", "q"]), op_removerange(3, 1)]
+    assert diff_from_lcs(a, b, [0, 2, 4], [0, 2, 5]) == expected
+    snakes = [(0, 0, 1), (2, 2, 1), (4, 5, 1)]
+    assert compute_diff_from_snakes(a, b, snakes, config=DiffConfig()) == expected
+    assert diff_sequence_difflib(a, b) == expected
+
+
+def _binary_roundtrip(d):
+    f = io.BytesIO()
+    write_binary_diff(d, f)
+    f.seek(0)
+    assert is_binary_diff(f)
+    return read_binary_diff(f)
+
+
+def test_binary_diff_roundtrip(any_nb_pair):
+    d = diff_notebooks(*any_nb_pair)
+    assert to_clean_dicts(_binary_roundtrip(d)) == to_clean_dicts(d)
+
+
+def test_binary_diff_values():
+    value = [0, 1, -1, 2**70, -2**70, 0.5, -1e300, True, False, None,
+             "", "short", "x" * 1000, "\u00f8\u2603", [], {}, {"a": {"a": [1]}}]
+    d = [op_add("value", value), op_patch("list", [op_addrange(0, "abc")])]
+    assert _binary_roundtrip(d) == d
+
+
+def test_binary_diff_errors():
+    f = io.BytesIO()
+    write_binary_diff([op_add("x", "y" * 100)], f)
+    data = f.getvalue()
+    assert not is_binary_diff(io.BytesIO(b'[{"op": "add"}]'))
+    for bad in (b"[]", data[:-10], data + b"\0"):
+        with pytest.raises(NBDiffFormatError):
+            read_binary_diff(io.BytesIO(bad))
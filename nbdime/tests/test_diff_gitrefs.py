@@ -7,7 +7,7 @@ import pytest
 
 from git import InvalidGitRepositoryError
 
-from ..gitfiles import changed_notebooks
+from ..gitfiles import changed_notebooks, get_repo, read_blobs
 from ..utils import EXPLICIT_MISSING_FILE
 
 
@@ -188,6 +188,38 @@ def test_ref_vs_ref_subdir_filename_path(git_repo2):
         assert _nb_name(actual[1]) == expected[1]
 
 
+# Test reading of blobs through a single git process:
+
+def test_read_blobs(git_repo2):
+    repo = get_repo(git_repo2)[0]
+    blobs = [
+        item for item in repo.commit('local').tree.traverse()
+        if item.type == 'blob'
+    ]
+    blobs += blobs[::-1]
+    expected = [blob.data_stream.read() for blob in blobs]
+    assert list(read_blobs(repo, blobs)) == expected
+
+
+def test_read_blobs_fallback(git_repo2, monkeypatch):
+    repo = get_repo(git_repo2)[0]
+    blob = repo.commit('local').tree / _filename
+    expected = blob.data_stream.read()
+
+    def fail(*args, **kwargs):
+        raise OSError('no git')
+    monkeypatch.setattr('subprocess.Popen', fail)
+    assert list(read_blobs(repo, [blob])) == [expected]
+
+
+def test_read_blobs_stopped_early(git_repo2):
+    repo = get_repo(git_repo2)[0]
+    blob = repo.commit('local').tree / _filename
+    contents = read_blobs(repo, [blob] * 1000)
+    assert next(contents) == blob.data_stream.read()
+    contents.close()
+
+
 # Test failure of one/two args with path to invalid file:
 
 def test_head_vs_workdir_non_existant(git_repo2):
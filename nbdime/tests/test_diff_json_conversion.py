@@ -1,8 +1,13 @@
 
+import io
 import pytest
 import json
 from nbdime import diff
-from nbdime.diff_utils import to_clean_dicts, to_json_patch
+from nbdime.diff_format import DiffEntry, op_patch, op_add
+from nbdime.diff_utils import (
+    to_clean_dicts, to_diffentry_dicts, to_json_patch, iter_json, iter_json_chunks,
+    write_json, externalize_blobs, internalize_blobs, blob_digest, BLOB_REF_KEY,
+    BLOB_ESCAPE_KEY)
 
 def test_diff_to_json():
     a = { "foo": [1,2,3], "bar": {"ting": 7, "tang": 123 } }
@@ -13,13 +18,97 @@ def test_diff_to_json():
     assert len(d2) == len(d1)
     assert all(len(e2) == len(e1) for e1, e2 in zip(d1, d2))
 
-    j = json.dumps(d1)
+    j = json.dumps(d2)
     d3 = json.loads(j)
     assert len(d3) == len(d1)
     assert all(len(e3) == len(e1) for e1, e3 in zip(d1, d3))
     assert d2 == d3
 
 
+def test_diff_entry_as_mapping():
+    e = op_add("foo", {"bar": 1})
+    assert e.op == e["op"] == "add"
+    assert "value" in e
+    assert "diff" not in e
+    assert e.get("diff") is None
+    assert dict(e.items()) == {"op": "add", "key": "foo", "value": {"bar": 1}}
+    assert e == {"op": "add", "key": "foo", "value": {"bar": 1}}
+    assert e != {"op": "add", "key": "foo"}
+    assert DiffEntry(e) == e
+    with pytest.raises(KeyError):
+        e["diff"]
+    with pytest.raises(AttributeError):
+        e.diff
+
+
+def test_diff_from_json():
+    d1 = [op_patch("cells", [op_add("foo", {"op": "not an entry"})])]
+    d2 = to_clean_dicts(d1)
+    assert type(d2[0]) is dict
+    assert type(d2[0]["diff"][0]) is dict
+    d3 = to_diffentry_dicts(json.loads(json.dumps(d2)))
+    assert d3 == d1
+    assert isinstance(d3[0].diff[0], DiffEntry)
+    # Values are not converted to diff entries
+    assert type(d3[0].diff[0].value) is dict
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_iter_json_equals_json_dumps(indent):
+    a = {"foo": [1, 2, 3], "bar": {"ting": 7, "tang": 123}, "empty": {}, "t": (1,)}
+    b = {"foo": [1, 3, 4], "bar": {"tang": 126.5, "hello": "w\u00f8rld\n"}, "empty": [], "t": (2,)}
+    nested = [{"decision": [{"diff": diff(a, b), "value": [a, (b,)]}]}]
+    for obj in (diff(a, b), b, [], "text", None, {1: True}, nested):
+        separators = (",", ":") if indent is None else (",", ": ")
+        expected = json.dumps(to_clean_dicts(obj), indent=indent, separators=separators)
+        assert "".join(iter_json(obj, indent)) == expected
+
+
+def test_write_json_in_chunks():
+    d = diff({"foo": {str(i): "x" * 100 for i in range(10)}},
+             {"foo": {str(i): "y" * 100 for i in range(10)}})
+    chunks = list(iter_json_chunks(d, chunk_size=64))
+    assert len(chunks) > 1
+    # Entries without subdiffs are encoded in one go
+    assert all(len(c) < 64 + 160 for c in chunks)
+    f = io.StringIO()
+    write_json(d, f)
+    assert f.getvalue() == "".join(chunks)
+    assert json.loads(f.getvalue()) == to_clean_dicts(d)
+
+
+def test_externalize_blobs():
+    big = "x" * 100
+    a = {"foo": [1], "bar": {"ting": "small"}}
+    b = {"foo": [1, {"data": big}], "bar": {"ting": big}, "new": [big, "small"]}
+    d = diff(a, b)
+    e, blobs = externalize_blobs(d, 50)
+    assert blobs == {blob_digest(big): big}
+    assert big not in json.dumps(to_clean_dicts(e))
+    assert {BLOB_REF_KEY: blob_digest(big)} in e[-1].value
+    assert to_clean_dicts(internalize_blobs(e, blobs)) == to_clean_dicts(d)
+
+    # Nothing above the threshold gives back the same entries
+    e, blobs = externalize_blobs(d, 1000)
+    assert blobs == {}
+    assert all(x is y for x, y in zip(e, d))
+
+
+def test_externalize_blobs_escapes_markers():
+    big = "x" * 100
+    a = {}
+    b = {"ref": {BLOB_REF_KEY: "not a blob"}, "escaped": {BLOB_ESCAPE_KEY: {"y": big}},
+         "other": {BLOB_REF_KEY: 1, "z": 2}}
+    d = diff(a, b)
+    e, blobs = externalize_blobs(d, 50)
+    values = {x.key: x.value for x in e}
+    assert values["ref"] == {BLOB_ESCAPE_KEY: {BLOB_REF_KEY: "not a blob"}}
+    assert values["escaped"] == {
+        BLOB_ESCAPE_KEY: {BLOB_ESCAPE_KEY: {"y": {BLOB_REF_KEY: blob_digest(big)}}}}
+    assert values["other"] is b["other"]
+    assert to_clean_dicts(internalize_blobs(e, blobs)) == to_clean_dicts(d)
+
+
 def test_diff_to_json_patch():
     a = [2, 3, 4]
     b = [1, 2, 4, 6]
@@ -11,7 +11,7 @@ from nbdime import patch
 from nbdime.diff_format import is_valid_diff
 
 import nbdime.diffing.sequences
-from nbdime.diffing.sequences import diff_sequence
+from nbdime.diffing.sequences import diff_sequence, diff_strings_linewise, LineTable
 
 
 def check_diff_sequence_and_patch(a, b):
@@ -22,8 +22,7 @@ def check_diff_sequence_and_patch(a, b):
     assert is_valid_diff(d)
     assert patch(b, d) == a
 
-#algorithms = ["difflib", "bruteforce", "myers"]
-algorithms = ["difflib", "bruteforce"]
+algorithms = ["difflib", "bruteforce", "myers"]
 
 
 @pytest.fixture(params=algorithms)
@@ -56,3 +55,17 @@ def test_diff_sequence(algorithm):
                 for l in range(len(a)+1):
                     b = a[i:j] + a[k:l]
                     check_diff_sequence_and_patch(a, b)
+
+
+def test_diff_strings_linewise_shared_line_table():
+    a = "def f(a, b):\n    c = a * b\n    return c\n"
+    b = "def f(a, b):\n    c = a + b\n    return c\n"
+    expected = diff_strings_linewise(a, b)
+    assert patch(a, expected) == b
+
+    table = LineTable()
+    assert diff_strings_linewise(a, b, line_table=table) == expected
+    assert diff_strings_linewise(b, a, line_table=table) == diff_strings_linewise(b, a)
+    # Lines are interned once across calls
+    assert len(table.lines) == len(table.ids) == 4
+    assert table.intern(b.splitlines(True)) == [0, 3, 2]
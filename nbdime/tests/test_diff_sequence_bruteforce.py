@@ -4,10 +4,15 @@
 # Distributed under the terms of the Modified BSD License.
 
 
+import operator
+import random
+
+import pytest
 
 from nbdime import patch
 from nbdime.diff_format import is_valid_diff
 from nbdime.diffing.lcs import diff_from_lcs
+import nbdime.diffing.seq_bruteforce
 from nbdime.diffing.seq_bruteforce import (bruteforce_compare_grid, bruteforce_llcs_grid,
                                            bruteforce_lcs_indices, diff_sequence_bruteforce)
 
@@ -54,3 +59,32 @@ def test_diff_sequence_bruteforce():
 
         # Test combined function (repeats the above pieces)
         assert patch(a, diff_sequence_bruteforce(a, b)) == b
+
+
+@pytest.mark.parametrize("compare", [operator.__eq__, lambda x, y: x == y])
+def test_bruteforce_grids_numpy(compare, monkeypatch):
+    np = pytest.importorskip("numpy")
+    monkeypatch.setattr(nbdime.diffing.seq_bruteforce, "NUMPY_GRID_THRESHOLD", 1)
+    random.seed(0)
+    for _ in range(100):
+        a = [random.choice("abc") for _ in range(random.randint(1, 30))]
+        b = [random.choice("abc") for _ in range(random.randint(1, 30))]
+        G = bruteforce_compare_grid(a, b, compare)
+        assert isinstance(G, np.ndarray)
+        assert G.tolist() == [[x == y for y in b] for x in a]
+
+        R = bruteforce_llcs_grid(G)
+        assert isinstance(R, np.ndarray)
+        assert R.tolist() == bruteforce_llcs_grid(G.tolist())
+
+        assert patch(a, diff_sequence_bruteforce(a, b, compare)) == b
+
+
+def test_bruteforce_grids_numpy_unhashable(monkeypatch):
+    pytest.importorskip("numpy")
+    monkeypatch.setattr(nbdime.diffing.seq_bruteforce, "NUMPY_GRID_THRESHOLD", 1)
+    a = [[1], [2], [3]]
+    b = [[2], [3], [4]]
+    G = bruteforce_compare_grid(a, b)
+    assert G.tolist() == [[x == y for y in b] for x in a]
+    assert patch(a, diff_sequence_bruteforce(a, b)) == b
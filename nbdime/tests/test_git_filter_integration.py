@@ -1,13 +1,15 @@
 
 import io
 import os
+import sys
 from io import StringIO
 from subprocess import CalledProcessError
 
 import nbformat
 
 from nbdime.vcs.git.filter_integration import (
-    interrogate_filter, apply_possible_filter, get_clean_filter_cmd)
+    interrogate_filter, apply_possible_filter, get_clean_filter_cmd,
+    GitFilters)
 from nbdime.utils import locate_gitattributes
 
 from .utils import call
@@ -108,3 +110,49 @@ def test_apply_filter_valid_filter(git_repo):
     assert isinstance(f, StringIO)
     # Read validates notebook:
     nbformat.validate(nbformat.read(f, as_version=4))
+
+
+def test_filters_lookup(git_repo):
+    gitattr = locate_gitattributes()
+    with io.open(gitattr, 'a', encoding="utf8") as f:
+        f.write(u'\n*.ipynb\tfilter=myfilter\n*.txt\t-filter\n')
+    with GitFilters() as filters:
+        filters.lookup(['diff.ipynb', 'merge-conflict.ipynb', 'foo.txt'])
+        assert filters.filter_attr('diff.ipynb') == 'myfilter'
+        assert filters.filter_attr('merge-conflict.ipynb') == 'myfilter'
+        assert filters.filter_attr('foo.txt') is None
+
+
+def test_filters_lookup_no_repo(filespath):
+    with GitFilters(filespath) as filters:
+        assert filters.filter_attr('foo--1.ipynb') is None
+
+
+def _config_process_filter():
+    path = pjoin(os.path.dirname(__file__), 'filters', 'process_strip_outputs.py')
+    gitattr = locate_gitattributes()
+    with io.open(gitattr, 'a', encoding="utf8") as f:
+        f.write(u'\n*.ipynb\tfilter=myfilter\n')
+    call('git config --local --add filter.myfilter.process "%s %s"' % (
+        sys.executable, os.path.abspath(path)))
+
+
+def test_apply_filter_process(git_repo):
+    _config_process_filter()
+    with GitFilters() as filters:
+        for i, name in enumerate(['diff.ipynb', 'merge-conflict.ipynb'], 1):
+            f = apply_possible_filter(name, filters=filters)
+            assert isinstance(f, StringIO)
+            nb = nbformat.read(f, as_version=4)
+            # The same process cleans both files
+            assert nb.metadata['filter_count'] == i
+            for cell in nb.cells:
+                assert cell.get('outputs', []) == []
+
+
+def test_apply_filter_process_single(git_repo):
+    _config_process_filter()
+    path = pjoin(git_repo, 'diff.ipynb')
+    f = apply_possible_filter(path)
+    assert isinstance(f, StringIO)
+    nbformat.validate(nbformat.read(f, as_version=4))
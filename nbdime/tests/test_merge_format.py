@@ -1,6 +1,7 @@
 
 from jsonschema import Draft4Validator as Validator
 from nbdime import decide_merge
+from nbdime.diff_utils import to_clean_dicts
 from nbdime.merging.notebooks import decide_notebook_merge
 
 
@@ -14,7 +15,7 @@ def test_validate_obj_merge(merge_validator):
     r = {"p": {"b": 1}, "n": {"s": 7, "r": 3}}
     decisions = decide_merge(b, l, r)
 
-    merge_validator.validate(decisions)
+    merge_validator.validate(to_clean_dicts(decisions))
 
 
 def test_validate_array_merge(merge_validator):
@@ -23,11 +24,11 @@ def test_validate_array_merge(merge_validator):
     r = [1, 3, 7, 9]
     decisions = decide_merge(b, l, r)
 
-    merge_validator.validate(decisions)
+    merge_validator.validate(to_clean_dicts(decisions))
 
 
 def test_validate_matching_notebook_merge(matching_nb_triplets, merge_validator, reset_log):
     base, local, remote = matching_nb_triplets
     decisions = decide_notebook_merge(base, local, remote)
 
-    merge_validator.validate(decisions)
+    merge_validator.validate(to_clean_dicts(decisions))
@@ -991,3 +991,19 @@ def test_only_metadata(db, reset_notebook_diff):
             path[4] == 'metadata'
         )
 
+
+
+@pytest.mark.parametrize("share", [False, True])
+def test_merge_notebooks_share(share):
+    base = sources_to_notebook([["x = 1\n"], ["y = 2\n"]])
+    local = sources_to_notebook([["x = 1\n"], ["y = 3\n"]])
+    remote = copy.deepcopy(base)
+    expected_base = copy.deepcopy(base)
+
+    merged, decisions = merge_notebooks(base, local, remote, share=share)
+    assert [cell.source for cell in merged.cells] == ["x = 1\n", "y = 3\n"]
+    assert base == expected_base
+    # Unchanged cells are only shared with base on request
+    assert (merged.cells[0] is base.cells[0]) == share
+    assert merged.cells[1] is not base.cells[1]
+    assert apply_decisions(base, decisions, share=share) == merged
@@ -7,6 +7,13 @@
 
 
 import operator
+import random
+
+from nbdime import patch
+from nbdime.diff_format import is_valid_diff
+from nbdime.diffing.seq_bruteforce import (
+    bruteforce_compare_grid, bruteforce_llcs_grid, diff_sequence_bruteforce)
+from nbdime.diffing.seq_myers import myers_lcs_indices, diff_sequence_myers
 
 
 # Set to true to enable additional assertions, array access checking, and printouts
@@ -443,3 +450,53 @@ def xtest_neil_fraser_case():
     # These cases work:
     #assert list(lcs(list("abyb"), list("ayb"))) == ["a","y","b"]
     #assert list(lcs(list("ayb"), list("ayb"))) == ["a","y","b"]
+
+
+def check_myers_lcs(A, B, compare=operator.__eq__):
+    A_indices, B_indices = myers_lcs_indices(A, B, compare)
+    R = bruteforce_llcs_grid(bruteforce_compare_grid(A, B, compare))
+    llcs = R[len(A)][len(B)] if A and B else 0
+    assert len(A_indices) == len(B_indices) == llcs
+    assert A_indices == sorted(set(A_indices))
+    assert B_indices == sorted(set(B_indices))
+    assert all(compare(A[i], B[j]) for i, j in zip(A_indices, B_indices))
+
+    d = diff_sequence_myers(A, B, compare)
+    assert is_valid_diff(d)
+    if compare is operator.__eq__:
+        assert patch(A, d) == B
+
+
+def test_myers_lcs_with_neil_fraser_cases():
+    check_myers_lcs(list("abcab"), list("ayb"))
+    check_myers_lcs(list("xaxcxabc"), list("abcy"))
+    assert diff_sequence_myers(list("abcab"), list("ayb")) == \
+        diff_sequence_bruteforce(list("abcab"), list("ayb"))
+
+
+def test_myers_lcs_random():
+    random.seed(0)
+    for _ in range(1000):
+        A = [random.choice("abc") for _ in range(random.randint(0, 12))]
+        B = [random.choice("abc") for _ in range(random.randint(0, 12))]
+        check_myers_lcs(A, B)
+
+
+def test_myers_lcs_custom_compare():
+    def compare(x, y):
+        return x.lower() == y.lower()
+    random.seed(1)
+    for _ in range(200):
+        A = [random.choice("abAB") for _ in range(random.randint(0, 10))]
+        B = [random.choice("abAB") for _ in range(random.randint(0, 10))]
+        check_myers_lcs(A, B, compare)
+
+
+def test_myers_lcs_large_sequences():
+    # Only a few edits in long sequences, which is the case the
+    # linear space algorithm is made for
+    A = list(range(20000))
+    B = A[:5000] + [-1, -2] + A[5003:15000] + A[15001:] + [-3]
+    A_indices, B_indices = myers_lcs_indices(A, B)
+    assert len(A_indices) == 20000 - 4
+    assert patch(A, diff_sequence_myers(A, B)) == B
@@ -6,12 +6,23 @@
 """This file contains tests applying to reference notebook files from the nbdime/tests/files/ directory."""
 
 
+import argparse
+import copy
 
-
+import pytest
 import nbformat
+from nbformat.v4 import new_notebook, new_code_cell, new_output
 
 from nbdime import patch, patch_notebook, diff_notebooks
-from nbdime.diffing.notebooks import diff_cells
+from nbdime.diffing import snakes
+from nbdime.diffing.snakes import set_subdiff_processes
+from nbdime.diffing.generic import diff_sequence_multilevel, get_text_similarity_options
+from nbdime.diffing.notebooks import (
+    diff_cells, set_notebook_cell_anchoring, notebook_config,
+    CellFingerprint, make_cell_rejects, diff_cells_multilevel,
+    notebooks_equivalent, set_notebook_diff_targets,
+    diff_single_outputs,
+)
 
 # pytest conf.py stuff is tricky to use robustly, this works with no magic
 from .utils import assert_is_valid_notebook, check_diff_and_patch
@@ -59,3 +70,139 @@ def test_diff_and_patch_notebooks(any_nb_pair):
     "Test diff/patch on any pair of notebooks in the test suite."
     a, b = any_nb_pair
     assert patch_notebook(a, diff_notebooks(a, b)) == nbformat.from_dict(b)
+
+
+def test_diff_and_patch_notebooks_with_cell_anchoring(matching_nb_pairs):
+    "Test that anchoring cells gives the same diff for notebooks in the test suite."
+    a, b = matching_nb_pairs
+    expected = diff_notebooks(a, b)
+    set_notebook_cell_anchoring(True)
+    try:
+        d = diff_notebooks(a, b)
+    finally:
+        set_notebook_cell_anchoring(False)
+    assert d == expected
+    assert patch_notebook(a, d) == nbformat.from_dict(b)
+
+
+def test_cell_fingerprint_rejects_are_sound(matching_nb_pairs):
+    "Test that cell predicates are never true for pairs rejected by fingerprints."
+    a, b = matching_nb_pairs
+    settings = get_text_similarity_options()
+    rejects = make_cell_rejects(settings)
+    fa = [CellFingerprint(c, settings["ignore_whitespace_lines"]) for c in a.cells]
+    fb = [CellFingerprint(c, settings["ignore_whitespace_lines"]) for c in b.cells]
+    for compare, reject in rejects.items():
+        for fx in fa:
+            for fy in fb:
+                if reject(fx, fy):
+                    assert not compare(fx.cell, fy.cell)
+
+
+def test_diff_cells_multilevel_matches_generic(matching_nb_pairs):
+    "Test that fingerprinting cells does not change the cell alignment."
+    a, b = matching_nb_pairs
+    expected = diff_sequence_multilevel(
+        a.cells, b.cells, path="/cells", config=notebook_config)
+    assert diff_cells_multilevel(
+        a.cells, b.cells, path="/cells", config=notebook_config) == expected
+
+
+def test_notebooks_equivalent_respects_ignores(reset_notebook_diff):
+    a = new_notebook(cells=[
+        new_code_cell("x = 1", execution_count=1, outputs=[new_output(
+            "execute_result", data={"text/plain": "1"}, execution_count=1)])])
+    b = copy.deepcopy(a)
+    b.cells[0].execution_count = 2
+    b.cells[0].outputs[0].execution_count = 2
+    b.metadata["foo"] = "bar"
+
+    assert notebooks_equivalent(a, copy.deepcopy(a))
+    assert not notebooks_equivalent(a, b)
+    assert diff_notebooks(a, b)
+
+    set_notebook_diff_targets(details=False, metadata=False)
+    assert notebooks_equivalent(a, b)
+    assert diff_notebooks(a, b) == []
+
+    b.cells[0].source = "x = 2"
+    assert not notebooks_equivalent(a, b)
+    assert diff_notebooks(a, b)
+
+
+def test_notebooks_equivalent_matches_empty_diff(any_nb_pair):
+    a, b = any_nb_pair
+    assert notebooks_equivalent(a, b) == (diff_notebooks(a, b) == [])
+    assert notebooks_equivalent(a, copy.deepcopy(a))
+
+
+def test_notebooks_equivalent_compares_values_like_diff():
+    a = new_notebook(metadata={"a": "1"})
+    b = new_notebook(metadata={"a": 1})
+    assert not notebooks_equivalent(a, b)
+    assert diff_notebooks(a, b)
+
+    # Equal numbers of different types have an empty diff
+    c = new_notebook(metadata={"a": 1.0})
+    assert notebooks_equivalent(b, c)
+    assert diff_notebooks(b, c) == []
+
+
+def test_diff_single_outputs_does_not_modify_outputs():
+    a = new_output("display_data", data={"text/plain": "a"}, metadata={"x": [1]})
+    b = new_output("display_data", data={"text/plain": "b"}, metadata={"y": [2]})
+    a_before = copy.deepcopy(a)
+    b_before = copy.deepcopy(b)
+    a_keys = list(a)
+    d = diff_single_outputs(a, b)
+    assert a == a_before and b == b_before
+    assert list(a) == a_keys
+    assert [e.key for e in d] == ["data", "metadata"]
+    assert patch(a, d) == b
+
+
+@pytest.fixture
+def restore_subdiff_processes():
+    options = dict(snakes._subdiff_options)
+    yield
+    snakes._subdiff_options.update(options)
+
+
+def test_parallel_subdiffs_equal_sequential(db, restore_subdiff_processes):
+    pairs = [
+        (db["multilevel-test-base"], db["multilevel-test-local"]),
+        (db["src-and-output--1"], db["src-and-output--2"]),
+    ]
+    for a, b in pairs:
+        set_subdiff_processes(0)
+        expected = diff_notebooks(a, b)
+        set_subdiff_processes(2, min_pairs=1)
+        assert diff_notebooks(a, b) == expected
+
+
+def test_parallel_subdiffs_only_for_cells(restore_subdiff_processes, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('no pool should be started')
+    monkeypatch.setattr(snakes, 'ProcessPoolExecutor', fail)
+    set_subdiff_processes(2, min_pairs=1)
+    source = '\n'.join('x%d = %d' % (k, k) for k in range(100))
+    a = new_notebook(cells=[new_code_cell(source + '\n# a')])
+    b = new_notebook(cells=[new_code_cell(source + '\n# b')])
+    # The lines of the source are not diffed in parallel
+    assert diff_notebooks(a, b)
+
+
+def test_no_subdiff_processes_in_server(restore_subdiff_processes):
+    from nbdime.args import process_diff_flags
+    from nbdime.ignorables import diff_ignorables
+    args = argparse.Namespace(
+        subdiff_processes=4, **{key: None for key in diff_ignorables})
+    process_diff_flags(args, server=True)
+    assert snakes._subdiff_options['processes'] == 0
+    process_diff_flags(args)
+    assert snakes._subdiff_options['processes'] == 4
+
+
+def test_invalid_subdiff_processes(restore_subdiff_processes):
+    with pytest.raises(ValueError):
+        set_subdiff_processes(-1)
@@ -5,7 +5,9 @@
 
 
 
-from nbdime import patch
+from nbformat.v4 import new_notebook, new_code_cell, new_output
+
+from nbdime import patch, patch_notebook
 from nbdime.diff_format import op_patch, op_add, op_remove, op_replace, op_addrange, op_removerange
 
 
@@ -91,3 +93,41 @@ def test_patch_dict():
     # Test !, item patch
     subdiff = [op_patch(0, [op_patch(0, [op_replace(0, "H")])]), op_patch(1, [op_patch(0, [op_remove(0), op_add(0, "W")])])]
     assert patch({"a": ["hello", "world"], "b": 3}, [op_patch("a", subdiff)]) == {"a": ["Hello", "World"], "b": 3}
+
+
+def test_patch_shares_unchanged_values():
+    a = {"x": [{"y": 1}, {"z": [2]}], "w": {"v": 3}}
+    b = patch(a, [op_patch("x", [op_patch(1, [op_replace("z", 4)])])], share=True)
+    assert b == {"x": [{"y": 1}, {"z": 4}], "w": {"v": 3}}
+    assert a == {"x": [{"y": 1}, {"z": [2]}], "w": {"v": 3}}
+    # Patched containers are new, the rest is shared
+    assert b is not a and b["x"] is not a["x"] and b["x"][1] is not a["x"][1]
+    assert b["w"] is a["w"]
+    assert b["x"][0] is a["x"][0]
+
+
+def test_patch_copy():
+    a = {"x": [{"y": 1}, {"z": [2]}], "w": {"v": 3}}
+    b = patch(a, [op_patch("x", [op_patch(1, [op_replace("z", 4)])])])
+    assert b == {"x": [{"y": 1}, {"z": 4}], "w": {"v": 3}}
+    assert b["w"] is not a["w"]
+    assert b["x"][0] is not a["x"][0]
+
+
+def test_patch_notebook_shares_unchanged_cells():
+    nb = new_notebook(cells=[
+        new_code_cell("a = 1", outputs=[new_output("stream", text="1")]),
+        new_code_cell("b = 2")])
+    diff = [op_patch("cells", [
+        op_patch(1, [op_patch("source", [
+            op_addrange(0, ["b = 3"]), op_removerange(0, 1)])]),
+        op_addrange(2, [{"cell_type": "markdown", "metadata": {}, "source": "c"}]),
+        ])]
+    patched = patch_notebook(nb, diff, share=True)
+    assert patched.cells[0] is nb.cells[0]
+    assert patched.cells[1].source == "b = 3"
+    assert nb.cells[1].source == "b = 2"
+    # Values added by the diff get attribute access
+    assert patched.cells[2].cell_type == "markdown"
+    assert patch_notebook(nb, diff) == patched
+    assert patch_notebook(nb, diff).cells[0] is not nb.cells[0]
@@ -10,10 +10,13 @@ from io import StringIO
 
 from unittest import mock
 
+import pytest
+
 from nbformat import v4
 
 from nbdime import prettyprint as pp
 from nbdime.diffing import diff
+from nbdime.diffing.notebooks import diff_notebooks
 
 
 def b64text(nbytes):
@@ -346,3 +349,160 @@ def test_pretty_print_string_diff_b64():
         '+  %s...<snip base64, md5=%s...>' % (b[:8], hb[:16]),
         '',
     ]
+
+
+def _string_pairs():
+    return [
+        ('line 1\nline 2\nline 3\n', 'line 1\nline 3\nline 4\n'),
+        ('same\n', 'same\n'),
+        ('no newline\nat end', 'no newline\nat the end'),
+        ('', 'added\nlines\n'),
+    ]
+
+
+def test_diff_render_batch():
+    pairs = _string_pairs()
+    for use_git, use_diff in ((True, True), (False, True), (False, False)):
+        for use_color in (True, False):
+            config = pp.PrettyPrintConfig(
+                out=StringIO(), use_color=use_color, use_git=use_git, use_diff=use_diff)
+            expected = [pp.diff_render(a, b, config) for a, b in pairs]
+            assert pp.diff_render_batch(pairs, config) == expected
+
+
+@pytest.mark.skipif(not pp.which('git'), reason='needs git')
+@pytest.mark.parametrize('key, value', [
+    ('diff.noprefix', 'true'),
+    ('diff.mnemonicPrefix', 'true'),
+    ('diff.srcPrefix', 'x/'),
+    ('diff.external', 'false'),
+])
+def test_diff_render_batch_git_config(monkeypatch, key, value):
+    pairs = _string_pairs()
+    config = pp.PrettyPrintConfig(out=StringIO(), use_color=False)
+    expected = [pp.diff_render(a, b, config) for a, b in pairs]
+
+    monkeypatch.setenv('GIT_CONFIG_COUNT', '1')
+    monkeypatch.setenv('GIT_CONFIG_KEY_0', key)
+    monkeypatch.setenv('GIT_CONFIG_VALUE_0', value)
+    with mock.patch('nbdime.prettyprint.Popen', wraps=pp.Popen) as popen:
+        assert pp.diff_render_batch(pairs, config) == expected
+        assert popen.call_count == 1
+
+
+def test_diff_render_batch_fallback():
+    pairs = _string_pairs()
+    config = TestConfig(use_color=False)
+    expected = [pp.diff_render_with_difflib(a, b, config) for a, b in pairs]
+
+    def fail(*args, **kwargs):
+        raise OSError('cannot run diff')
+    with mock.patch('nbdime.prettyprint.Popen', fail):
+        assert pp.diff_render_batch(pairs, config) == expected
+
+
+def test_pretty_print_notebook_diff_batched():
+    a = v4.new_notebook(cells=[
+        v4.new_code_cell('x = %d\ny = x + 1\n' % i) for i in range(5)])
+    b = v4.new_notebook(cells=[
+        v4.new_code_cell('x = %d\ny = x + 2\n' % i) for i in range(5)])
+    di = diff_notebooks(a, b)
+
+    for render_in_process in (False, True):
+        expected = pp.PrettyPrintConfig(
+            out=StringIO(), use_color=False, render_in_process=render_in_process)
+        for e in di:
+            pp.pretty_print_diff_entry(a, e, '', expected)
+        config = pp.PrettyPrintConfig(
+            out=StringIO(), use_color=False, render_in_process=render_in_process)
+        with mock.patch('nbdime.prettyprint.Popen', wraps=pp.Popen) as popen:
+            pp.pretty_print_notebook_diff('a.ipynb', 'b.ipynb', a, di, config)
+            if render_in_process:
+                # All sources are rendered from the diff, without processes
+                assert popen.call_count == 0
+            else:
+                # All sources are rendered by one git or diff process
+                assert popen.call_count <= 1
+        assert config.out.getvalue().endswith(expected.out.getvalue())
+
+
+def test_diff_render_words_format():
+    config = pp.PrettyPrintConfig(out=StringIO(), color_words=True)
+    in_process = pp.PrettyPrintConfig(
+        out=StringIO(), color_words=True, render_in_process=True)
+    no_git = pp.PrettyPrintConfig(out=StringIO(), color_words=True, use_git=False)
+    if pp.which('git'):
+        assert pp._diff_render_format(config) == 'git'
+    assert pp._diff_render_format(in_process) == 'words'
+    assert pp._diff_render_format(no_git) == 'words'
+
+    pairs = _string_pairs()
+
+    def fail(*args, **kwargs):
+        raise AssertionError('no process should be started')
+    with mock.patch('nbdime.prettyprint.Popen', fail):
+        rendered = pp.diff_render_batch(pairs, in_process)
+        assert rendered == [pp.diff_render_words(a, b) for a, b in pairs]
+
+
+def test_pretty_print_string_diff_from_diff():
+    a = 'def f(x):\n    return x + 1\n\nf(1)\n'
+    b = 'def f(x):\n    return x + 2\n\nf(1)\n'
+    di = diff(a, b)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('the strings should not be diffed again')
+    with mock.patch('nbdime.prettyprint.diff_render', fail), \
+            mock.patch('nbdime.prettyprint.Popen', fail):
+        config = pp.PrettyPrintConfig(
+            out=StringIO(), use_color=False, render_in_process=True)
+        pp.pretty_print_string_diff(a, di, '/a', config)
+    assert config.out.getvalue() == (
+        '## modified /a:\n'
+        '@@ -1,4 +1,4 @@\n'
+        ' def f(x):\n'
+        '-    return x + 1\n'
+        '+    return x + 2\n'
+        ' \n'
+        ' f(1)\n'
+        '\n'
+    )
+
+
+def test_pretty_print_string_diff_in_process_split_lines():
+    # Lines split at other line breaks than newlines are diffed again
+    a = 'a\rb\nc\n'
+    b = 'a\rB\nc\n'
+    config = pp.PrettyPrintConfig(
+        out=StringIO(), use_color=False, render_in_process=True)
+    pp.pretty_print_string_diff(a, diff(a, b), '/a', config)
+    assert config.out.getvalue() == (
+        '## modified /a:\n' + pp.diff_render(a, b, config) + '\n')
+
+
+def test_diff_render_formats():
+    a = 'x = 1\ny = 2\n'
+    b = 'x = 1\ny = 3\n'
+    config = pp.PrettyPrintConfig(out=StringIO(), use_color=False)
+    in_process = pp.PrettyPrintConfig(
+        out=StringIO(), use_color=False, render_in_process=True)
+    assert pp.diff_render(a, b, in_process) == (
+        '@@ -1,2 +1,2 @@\n x = 1\n-y = 2\n+y = 3\n')
+    if pp.which('git'):
+        assert pp.diff_render(a, b, config) == pp.diff_render_with_git(a, b, config)
+    with mock.patch('nbdime.prettyprint.which', lambda cmd: None):
+        assert pp.diff_render(a, b, config) == pp.diff_render_with_difflib(a, b, config)
+        assert pp.diff_render(a, b, in_process) == pp.diff_render_unified(a, b, False)
+
+
+def test_buffered_output():
+    out = StringIO()
+    buffered = pp.BufferedOutput(out, chunk_size=10)
+    buffered.write('abc')
+    buffered.write('def')
+    assert out.getvalue() == ''
+    buffered.write('ghij')
+    assert out.getvalue() == 'abcdefghij'
+    buffered.write('k')
+    buffered.flush()
+    assert out.getvalue() == 'abcdefghijk'
@@ -3,11 +3,16 @@
 # Copyright (c) Jupyter Development Team.
 # Distributed under the terms of the Modified BSD License.
 
+import random
+
 import pytest
 
 from nbdime.diffing.generic import (
-    compare_strings_approximate,
+    compare_strings_approximate, set_text_similarity_options,
+    get_text_similarity_options, similar_difflib, similar_fast,
+    SimilarityCache, similarity_cache, content_digest,
 )
+from nbdime.diffing.notebooks import compare_text_approximate
 
 def test_similarity_threshold_is_configurable():
     base = (
@@ -79,3 +84,121 @@ def test_short_strings_with_overlap_but_large_diff_are_different():
     left = "hello-world"
     right = "hello-everyone-this-is-longer"
     assert not compare_strings_approximate(left, right, threshold=0.5)
+
+
+def _mutate(rng, s, n):
+    s = list(s)
+    for _ in range(n):
+        i = rng.randrange(len(s) + 1)
+        op = rng.random()
+        if op < 0.4 and s:
+            del s[min(i, len(s) - 1)]
+        elif op < 0.8:
+            s.insert(i, rng.choice("abcdefg \n"))
+        elif s:
+            s[min(i, len(s) - 1)] = rng.choice("xyz")
+    return "".join(s)
+
+
+def test_fast_engine_decisions_equal_difflib():
+    rng = random.Random(0)
+    for _ in range(1000):
+        x = "".join(rng.choice("abcdefg \n") for _ in range(rng.randint(1, 200)))
+        y = _mutate(rng, x, rng.randint(0, len(x))) or "a"
+        threshold = rng.choice([0.3, 0.5, 0.7, 0.95, rng.random()])
+        maxlen = rng.choice([None, 100])
+        min_match_length = rng.choice([None, 5])
+        assert (similar_fast(x, y, threshold, maxlen, min_match_length) ==
+                similar_difflib(x, y, threshold, maxlen, min_match_length)), (x, y, threshold)
+
+
+def test_fast_engine_decisions_equal_difflib_for_line_lists():
+    rng = random.Random(1)
+    lines = ["line %d\n" % i for i in range(20)]
+    for _ in range(500):
+        x = [rng.choice(lines) for _ in range(rng.randint(1, 60))]
+        y = [rng.choice(lines) for _ in range(rng.randint(1, 60))]
+        for threshold in (0.3, 0.7):
+            assert similar_fast(x, y, threshold) == similar_difflib(x, y, threshold)
+
+
+def test_fast_engine_decisions_equal_difflib_for_notebook_sources(db):
+    sources = sorted(set(
+        cell.source for nb in db.values() for cell in nb.cells if cell.source))
+    for x in sources:
+        for y in sources:
+            for threshold in (0.3, 0.7, 0.95):
+                assert similar_fast(x, y, threshold, None, 5) == similar_difflib(x, y, threshold, None, 5)
+
+
+@pytest.mark.parametrize("engine", ["difflib", "fast"])
+def test_similarity_engine_is_configurable(engine):
+    original = get_text_similarity_options()
+    try:
+        set_text_similarity_options(engine=engine)
+        assert get_text_similarity_options()["engine"] == engine
+        assert compare_strings_approximate("short-text-123", "short-text-XYZ", threshold=0.5)
+        assert not compare_strings_approximate("abcde12345", "vwxyz67890", threshold=0.5)
+    finally:
+        set_text_similarity_options(engine=original["engine"])
+
+
+def test_unknown_similarity_engine():
+    with pytest.raises(ValueError):
+        set_text_similarity_options(engine="nonexistent")
+
+
+def test_content_digest():
+    assert content_digest("abc") == content_digest("abc")
+    assert content_digest("abc") != content_digest("abd")
+    assert content_digest(["ab", "c"]) != content_digest("abc")
+    assert content_digest(["ab", "c"]) != content_digest(["a", "bc"])
+    assert content_digest([1, 2]) is None
+
+
+def test_similarity_cache_hits_on_repeated_comparison():
+    x = "lorem ipsum dolor sit amet consectetur adipiscing elit"
+    y = "lorem ipsum dolor sit amet, consectetur adipiscing elit!"
+    expected = compare_strings_approximate(x, y, threshold=0.5)
+    before = similarity_cache.cache_info()
+    # Equal content in new objects should hit the cache
+    assert compare_strings_approximate(x[:], "".join(y), threshold=0.5) == expected
+    after = similarity_cache.cache_info()
+    assert after.hits == before.hits + 1
+    assert after.misses == before.misses
+
+
+def test_similarity_cache_handles_list_sources():
+    x = ["def f(x):\n", "    return x + 1\n"]
+    y = ["def f(x):\n", "    return x + 2\n"]
+    assert compare_text_approximate(x, y)
+    assert compare_text_approximate(x, y)
+
+
+@pytest.mark.parametrize("eviction, evicted", [("lru", "b"), ("fifo", "a")])
+def test_similarity_cache_eviction(eviction, evicted):
+    cache = SimilarityCache(maxsize=2, eviction=eviction)
+    cache.put("a", True)
+    cache.put("b", False)
+    assert cache.get("a") is True
+    cache.put("c", True)
+    assert cache.get(evicted) is None
+    assert cache.cache_info().currsize == 2
+    info = cache.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+
+def test_similarity_cache_can_be_disabled_and_resized():
+    cache = SimilarityCache(maxsize=3)
+    for key in "abc":
+        cache.put(key, True)
+    cache.configure(maxsize=1)
+    assert cache.cache_info().currsize == 1
+    assert cache.get("c") is True
+    cache.configure(maxsize=0)
+    cache.put("d", True)
+    assert cache.get("d") is None
+    with pytest.raises(ValueError):
+        cache.configure(maxsize=-1)
+    with pytest.raises(ValueError):
+        cache.configure(eviction="random")
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) Jupyter Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+import pytest
+
+from nbdime import prettyprint as pp
+from nbdime import textdiff
+from nbdime.diffing import diff
+
+
+# Pairs of strings that git and nbdime align the same way
+_string_pairs = [
+    ('line 1\nline 2\nline 3\n', 'line 1\nline 3\nline 4\n'),
+    ('same\n', 'same\n'),
+    ('no newline\nat end', 'no newline\nat the end'),
+    ('', 'added\nlines\n'),
+    ('a\nb\n', 'a\n \tb  \n'),
+    ('x = 1\n', 'x = 1\n\n  \n'),
+    ('x = 1\n', 'y = 1\n\n\t\n'),
+    ('a\r\nb\r\n', 'a\r\nc\r\n'),
+    ('a\nb\nc', 'a\nB\nc\n'),
+    ('def f():\n    pass\nf()', 'def f():\n    return 1\nf()\n'),
+    ('\n'.join('line %d' % i for i in range(20)),
+     '\n'.join('line %d' % (i * (i % 7 != 3)) for i in range(20))),
+    ('def f():\n    pass\n\n\n\n\nx = f()\ny = 2\n',
+     'def f():\n    pass\n\n\n\n\nx = f(1)\ny = 2\n'),
+    ('removed words\nonly\n', 'only\n'),
+    ('', 'all new\n'),
+]
+
+
+def _git_render(a, b, use_color, color_words=False):
+    config = pp.PrettyPrintConfig(use_color=use_color, color_words=color_words)
+    rendered = pp.diff_render_with_git(a, b, config)
+    # Left over from the stripped marker of missing newlines
+    return rendered.replace('\n\x1b[m\n', '\n')
+
+
+def test_split_lines():
+    assert textdiff.split_lines('') == []
+    assert textdiff.split_lines('a\nb') == ['a\n', 'b']
+    assert textdiff.split_lines('a\r\nb\n') == ['a\r\n', 'b\n']
+
+
+def test_compact_changes():
+    # An ambiguous insertion is slid down as far as possible, as by git
+    a = ['x', 'y', 'x']
+    b = ['x', 'y', 'x', 'y', 'x']
+    assert textdiff.compact_changes(a, b, [(1, 1, 1, 3)]) == [(3, 3, 3, 5)]
+    assert textdiff.compact_changes(a, b, [(3, 3, 3, 5)]) == [(3, 3, 3, 5)]
+
+
+def test_patch_lines():
+    a = 'a\nb\nc\nd'
+    b = 'a\nB\nc\nd\ne\n'
+    alines, blines, ranges = textdiff.patch_lines(a, diff(a, b))
+    assert alines == ['a\n', 'b\n', 'c\n', 'd']
+    assert blines == ['a\n', 'B\n', 'c\n', 'd\n', 'e\n']
+    assert ranges == [(1, 2, 1, 2), (3, 4, 3, 5)]
+
+    # Lines split at other line breaks than newlines cannot be patched
+    a = 'a\rb\nc\n'
+    b = 'a\rB\nc\n'
+    assert textdiff.patch_lines(a, diff(a, b)) is None
+
+
+@pytest.mark.skipif(not pp.which('git'), reason='needs git')
+@pytest.mark.parametrize('use_color', [True, False])
+def test_render_unified_like_git(use_color):
+    for a, b in _string_pairs:
+        expected = _git_render(a, b, use_color)
+        assert textdiff.diff_render_unified(a, b, use_color) == expected
+        changes = textdiff.patch_lines(a, diff(a, b))
+        assert textdiff.render_unified(*changes, use_color) == expected
+
+
+def test_diff_render_words():
+    a = 'def f(x):\n    return x + 1\n'
+    b = 'def f(x):\n    return x + 2\n'
+    assert textdiff.diff_render_words(a, b) == (
+        '\x1b[36m@@ -1,2 +1,2 @@\x1b[m\n'
+        'def f(x):\x1b[m\n'
+        '    return x + \x1b[31m1\x1b[m\x1b[32m2\x1b[m\n'
+    )
+    assert textdiff.diff_render_words(a, a) == ''
+
+
+@pytest.mark.skipif(not pp.which('git'), reason='needs git')
+def test_render_words_like_git():
+    for a, b in _string_pairs:
+        expected = _git_render(a, b, True, color_words=True)
+        assert textdiff.diff_render_words(a, b) == expected
+        changes = textdiff.patch_lines(a, diff(a, b))
+        assert textdiff.render_words(*changes) == expected
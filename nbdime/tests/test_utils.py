@@ -5,7 +5,7 @@ import tempfile
 
 from nbdime.utils import (
     strings_to_lists, revert_strings_to_lists, is_in_repo,
-    locate_gitattributes
+    locate_gitattributes, defaultdict2
 )
 
 
@@ -55,3 +55,17 @@ def test_locate_gitattributes_global(needs_git):
 def test_locate_gitattributes_system(needs_git):
     gitattr = locate_gitattributes(scope='system')
     assert gitattr is not None
+
+
+def test_defaultdict2_copy():
+    d = defaultdict2(lambda: 0, {"a": 1, "b": 2})
+    d["b"] = 3
+    d["c"] = 4
+    c = d.copy()
+    assert isinstance(c, defaultdict2)
+    assert dict(c) == {"b": 3, "c": 4}
+    assert c["a"] == 1 and c["b"] == 3 and c["c"] == 4 and c["x"] == 0
+    # Copy is independent of original
+    del c["b"]
+    assert c["b"] == 2
+    assert d["b"] == 3
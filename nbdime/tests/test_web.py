@@ -5,6 +5,7 @@
 
 import os
 import json
+import re
 
 import pytest
 import requests
@@ -12,6 +13,7 @@ from tornado import ioloop
 from tornado.httputil import url_concat
 import nbformat
 
+from nbdime.diff_utils import blob_digest
 import nbdime.webapp.nbdiffweb
 import nbdime.webapp.nbmergeweb
 
@@ -120,3 +122,36 @@ def test_api_merge(web_server, nbdime_base_url, merge_validator, filespath, auth
     assert json.dumps(data['base'], sort_keys=True) == json.dumps(expected_base, sort_keys=True)
     # Check that decisions follows schema:
     merge_validator.validate(data['merge_decisions'])
+
+
+@pytest.mark.timeout(timeout=WEB_TEST_TIMEOUT)
+def test_api_diff_blobs(web_server, nbdime_base_url, diff_validator, auth_header):
+    post_data = dict(base=diff_a, remote=diff_b, blob_threshold=10)
+
+    url = web_server + nbdime_base_url + '/api/diff'
+    response = requests.post(url, json=post_data, headers=auth_header)
+    assert response.status_code == 200
+    data = response.json()
+    diff_validator.validate(data['diff'])
+    digests = re.findall(r'"nbdime_blob": "([^"]+)"', json.dumps(data['diff']))
+    assert digests
+
+    for digest in digests:
+        url = web_server + nbdime_base_url + '/api/blob/' + digest
+        response = requests.get(url, headers=auth_header)
+        assert response.status_code == 200
+        assert blob_digest(response.text) == digest
+
+    url = web_server + nbdime_base_url + '/api/blob/sha256:' + '0' * 64
+    response = requests.get(url, headers=auth_header)
+    assert response.status_code == 404
+
+
+@pytest.mark.timeout(timeout=WEB_TEST_TIMEOUT)
+@pytest.mark.parametrize('threshold', ['many', '10', 0, -1, 1.5, True])
+def test_api_diff_invalid_blob_threshold(web_server, nbdime_base_url, auth_header, threshold):
+    post_data = dict(base=diff_a, remote=diff_b, blob_threshold=threshold)
+
+    url = web_server + nbdime_base_url + '/api/diff'
+    response = requests.post(url, json=post_data, headers=auth_header)
+    assert response.status_code == 400
@@ -0,0 +1,495 @@
+# coding: utf-8
+
+# Copyright (c) Jupyter Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+"""Rendering of the line diffs of multiline strings in process.
+
+The diffs are rendered in the formats of git diff, with its change
+compaction, context and colors, but lines and words are aligned by
+nbdime's own sequence diff. Where several alignments give equally
+small diffs, the output can therefore differ from git's.
+"""
+
+import re
+
+import colorama
+
+from .diff_format import DiffOp
+from .diffing.sequences import diff_sequence
+from .patching import patch_singleline_string
+from .utils import as_text
+
+
+# Colors of diffs, as written by git diff --color and --color-words
+_GIT_OLD = colorama.Fore.RED
+_GIT_NEW = colorama.Fore.GREEN
+_GIT_FRAG = colorama.Fore.CYAN
+_GIT_WS = colorama.Back.RED
+_GIT_RESET = '\x1b[m'
+
+# Whitespace, as by C isspace in git
+_git_space = " \t\n\v\f\r"
+
+# Words of git's word diff, separated by (ASCII) whitespace
+_word_re = re.compile(r"[^ \t\n\v\f\r]+")
+
+# Number of context lines around changes, as git diff
+_CONTEXT_LINES = 3
+
+
+def split_lines(text):
+    "Split text into lines ending with newline, like git."
+    lines = text.split("\n")
+    last = lines.pop()
+    lines = [line + "\n" for line in lines]
+    if last:
+        lines.append(last)
+    return lines
+
+
+def change_ranges(a, b):
+    """The changes between the sequences a and b, as (i1, i2, j1, j2)
+    tuples where a[i1:i2] is replaced by b[j1:j2], using nbdime's own
+    sequence diff."""
+    ranges = []
+    offset = 0
+    for e in diff_sequence(a, b):
+        if e.op == DiffOp.ADDRANGE:
+            i1 = i2 = e.key
+            added = len(e.valuelist)
+        else:
+            i1, i2 = e.key, e.key + e.length
+            added = 0
+        if ranges and ranges[-1][1] == i1:
+            # Adjacent to previous change, e.g. the addition of a replacement
+            r = ranges[-1]
+            ranges[-1] = (r[0], i2, r[2], r[3] + added)
+        else:
+            ranges.append((i1, i2, i1 + offset, i1 + offset + added))
+        offset += added - (i2 - i1)
+    return ranges
+
+
+def compact_changes(a, b, ranges):
+    """Slide ambiguous changes down as far as possible, like git diff.
+
+    Groups of changed items of one sequence that can be shifted
+    while giving an equally short diff are moved to the last such
+    position, or to line up with a change in the other sequence.
+    This is git's change compaction, without its indent heuristic.
+    """
+    # Changed flags, with unchanged sentinels at both ends
+    achg = [False] * (len(a) + 2)
+    bchg = [False] * (len(b) + 2)
+    for i1, i2, j1, j2 in ranges:
+        achg[i1 + 1:i2 + 1] = [True] * (i2 - i1)
+        bchg[j1 + 1:j2 + 1] = [True] * (j2 - j1)
+
+    def group_at(chg, start):
+        end = start
+        while chg[end + 1]:
+            end += 1
+        return [start, end]
+
+    def next_group(chg, n, g):
+        if g[1] == n:
+            return False
+        g[:] = group_at(chg, g[1] + 1)
+        return True
+
+    def previous_group(chg, g):
+        if g[0] == 0:
+            return False
+        g[1] = g[0] - 1
+        g[0] = g[1]
+        while chg[g[0]]:
+            g[0] -= 1
+        return True
+
+    def slide_up(seq, chg, g):
+        if g[0] > 0 and seq[g[0] - 1] == seq[g[1] - 1]:
+            g[0] -= 1
+            g[1] -= 1
+            chg[g[0] + 1] = True
+            chg[g[1] + 1] = False
+            while chg[g[0]]:
+                g[0] -= 1
+            return True
+        return False
+
+    def slide_down(seq, chg, g):
+        if g[1] < len(seq) and seq[g[0]] == seq[g[1]]:
+            chg[g[0] + 1] = False
+            chg[g[1] + 1] = True
+            g[0] += 1
+            g[1] += 1
+            while chg[g[1] + 1]:
+                g[1] += 1
+            return True
+        return False
+
+    for seq, chg, oseq, ochg in ((a, achg, b, bchg), (b, bchg, a, achg)):
+        g = group_at(chg, 0)
+        go = group_at(ochg, 0)
+        while True:
+            if g[1] != g[0]:
+                while True:
+                    size = g[1] - g[0]
+                    end_matching_other = None
+                    while slide_up(seq, chg, g):
+                        previous_group(ochg, go)
+                    earliest_end = g[1]
+                    if go[1] > go[0]:
+                        end_matching_other = g[1]
+                    while slide_down(seq, chg, g):
+                        next_group(ochg, len(oseq), go)
+                        if go[1] > go[0]:
+                            end_matching_other = g[1]
+                    if size == g[1] - g[0]:
+                        break
+                if g[1] != earliest_end and end_matching_other is not None:
+                    # Line up with the last change in the other sequence
+                    while go[1] == go[0]:
+                        slide_up(seq, chg, g)
+                        previous_group(ochg, go)
+            if not next_group(chg, len(seq), g):
+                break
+            next_group(ochg, len(oseq), go)
+
+    # Pair up the changed groups of both sequences again
+    compacted = []
+    i = j = 0
+    while i < len(a) or j < len(b):
+        if achg[i + 1] or bchg[j + 1]:
+            i1, j1 = i, j
+            while achg[i + 1]:
+                i += 1
+            while bchg[j + 1]:
+                j += 1
+            compacted.append((i1, i, j1, j))
+        else:
+            i += 1
+            j += 1
+    return compacted
+
+
+def _format_range(start, stop):
+    # As in unified diff headers
+    length = stop - start
+    if length == 1:
+        return '%d' % (start + 1)
+    if not length:
+        return '%d,0' % start
+    return '%d,%d' % (start + 1, length)
+
+
+def _func_line(lines, before):
+    """The function context git shows in hunk headers, i.e. the last
+    line before index before that starts with a letter, _ or $."""
+    for line in reversed(lines[:before]):
+        c = line[:1]
+        if (c.isascii() and c.isalpha()) or c in ('_', '$'):
+            return line[:80].rstrip()
+    return None
+
+
+def _write_words(out, color, text):
+    "Write text in color, coloring each line separately."
+    for k, line in enumerate(text.split("\n")):
+        if k:
+            out.append("\n")
+        if line:
+            out.append(color + line + _GIT_RESET if color else line)
+
+
+def _render_word_diff(minus, plus, out):
+    "Render the words of the text minus replaced by the text plus."
+    if not plus:
+        _write_words(out, _GIT_OLD, minus)
+        return
+    mwords = [m.span() for m in _word_re.finditer(minus)]
+    pwords = [m.span() for m in _word_re.finditer(plus)]
+    current = 0
+    mtokens = [minus[s:e] for s, e in mwords]
+    ptokens = [plus[s:e] for s, e in pwords]
+    for i1, i2, j1, j2 in compact_changes(
+            mtokens, ptokens, change_ranges(mtokens, ptokens)):
+        if i2 > i1:
+            mbegin, mend = mwords[i1][0], mwords[i2 - 1][1]
+        else:
+            mbegin = mend = mwords[i1 - 1][1] if i1 else 0
+        if j2 > j1:
+            pbegin, pend = pwords[j1][0], pwords[j2 - 1][1]
+        else:
+            pbegin = pend = pwords[j1 - 1][1] if j1 else 0
+        # Unchanged text is shown as in plus
+        if current != pbegin:
+            _write_words(out, '', plus[current:pbegin])
+        if mbegin != mend:
+            _write_words(out, _GIT_OLD, minus[mbegin:mend])
+        if pbegin != pend:
+            _write_words(out, _GIT_NEW, plus[pbegin:pend])
+        current = pend
+    if current != len(plus):
+        _write_words(out, '', plus[current:])
+
+
+def _write_context_line(out, line):
+    newline = line.endswith("\n")
+    if newline:
+        line = line[:-1]
+    cr = line.endswith("\r")
+    if cr:
+        line = line[:-1]
+    if line:
+        out.append(line + _GIT_RESET)
+    if cr:
+        out.append("\r")
+    if newline:
+        out.append("\n")
+
+
+def _hunks(alines, ranges):
+    """Group changes into hunks with context, merging hunks whose
+    contexts would overlap or touch.
+
+    Yields the lines (i1, i2, j1, j2) covered by each hunk, and the
+    changes of the hunk.
+    """
+    hunks = []
+    for r in ranges:
+        if hunks and r[0] - hunks[-1][-1][1] <= 2 * _CONTEXT_LINES:
+            hunks[-1].append(r)
+        else:
+            hunks.append([r])
+
+    for hunk in hunks:
+        first, last = hunk[0], hunk[-1]
+        i1 = max(0, first[0] - _CONTEXT_LINES)
+        i2 = min(len(alines), last[1] + _CONTEXT_LINES)
+        j1 = first[2] - (first[0] - i1)
+        j2 = last[3] + (i2 - last[1])
+        yield i1, i2, j1, j2, hunk
+
+
+def _with_final_newline(lines):
+    # As with git, a missing newline at the end is only significant
+    # when comparing lines, the output always ends with one
+    if lines and not lines[-1].endswith("\n"):
+        lines = lines[:-1] + [lines[-1] + "\n"]
+    return lines
+
+
+def _write_hunk_header(out, alines, i1, i2, j1, j2, use_color):
+    header = '@@ -%s +%s @@' % (_format_range(i1, i2), _format_range(j1, j2))
+    func = _func_line(alines, i1)
+    if use_color:
+        out.append(_GIT_FRAG + header + _GIT_RESET)
+        if func is not None:
+            out.append(' %s%s%s' % (_GIT_RESET, func, _GIT_RESET))
+    else:
+        out.append(header)
+        if func is not None:
+            out.append(' ' + func)
+    out.append('\n')
+
+
+def render_words(alines, blines, ranges):
+    """Render changed lines in the format of git diff --color-words.
+
+    The lines are those split by split_lines, and ranges are the
+    changed lines as (i1, i2, j1, j2), such that alines[i1:i2] are
+    replaced by blines[j1:j2], e.g. from compact_changes.
+    """
+    alines = _with_final_newline(alines)
+    blines = _with_final_newline(blines)
+    out = []
+    for i1, i2, j1, j2, hunk in _hunks(alines, ranges):
+        _write_hunk_header(out, alines, i1, i2, j1, j2, True)
+        pos = i1
+        for ci1, ci2, cj1, cj2 in hunk:
+            for line in alines[pos:ci1]:
+                _write_context_line(out, line)
+            _render_word_diff(
+                "".join(alines[ci1:ci2]), "".join(blines[cj1:cj2]), out)
+            pos = ci2
+        for line in alines[pos:i2]:
+            _write_context_line(out, line)
+    return "".join(out)
+
+
+def _diff_lines(a, b):
+    alines = split_lines(as_text(a))
+    blines = split_lines(as_text(b))
+    return alines, blines, compact_changes(alines, blines, change_ranges(alines, blines))
+
+
+def diff_render_words(a, b):
+    """Render a colored word diff of two strings, without the file header,
+    in the format of git diff --color-words."""
+    return render_words(*_diff_lines(a, b))
+
+
+def _split_eol(line):
+    "Split a line into its content, and the newline and carriage return ending it."
+    content = line[:-1] if line.endswith("\n") else line
+    if content.endswith("\r"):
+        content = content[:-1]
+    return content, line[len(content):]
+
+
+def _git_emit_line(out, color, sign, line):
+    "Write a diff line starting with sign in color, as git diff --color."
+    content, eol = _split_eol(line)
+    out.append(color + sign + content + _GIT_RESET + eol)
+
+
+def _git_ws_check_emit(out, line):
+    """Write the content of an added line in color, highlighting
+    whitespace errors as git diff --color does by default, i.e.
+    trailing whitespace and spaces before tabs in the indentation."""
+    content = line[:-1] if line.endswith("\n") else line
+    trailing = len(content.rstrip(_git_space))
+    written = 0
+    for i in range(trailing):
+        c = content[i]
+        if c == ' ':
+            continue
+        if c != '\t':
+            break
+        if written < i:
+            out.append(_GIT_WS + content[written:i] + _GIT_RESET + '\t')
+        else:
+            out.append('\t')
+        written = i + 1
+    if trailing > written:
+        out.append(_GIT_NEW + content[written:trailing] + _GIT_RESET)
+    if trailing != len(content):
+        out.append(_GIT_WS + content[trailing:] + _GIT_RESET)
+    out.append(line[len(content):])
+
+
+def _git_count_trailing_blank(text):
+    """Count the blank lines at the end of text, as git does when
+    looking for blank lines added at the end of a file."""
+    count = 0
+    end = len(text) - 1
+    if text.endswith("\n"):
+        end -= 1
+    while end > 0:
+        eol = text.rfind("\n", 0, end + 1)
+        if text[eol + 1:end + 1].strip(_git_space):
+            break
+        count += 1
+        end = eol - 1
+    return count
+
+
+def render_unified(alines, blines, ranges, use_color):
+    """Render changed lines as hunks of a unified diff, like git diff.
+
+    The lines and ranges are as for render_words. With use_color, this
+    uses git's colors, and highlights the whitespace errors git
+    highlights by default in added lines.
+    """
+    if use_color:
+        # Added blank lines at the end are highlighted as whitespace
+        # errors when there are more of them than before
+        blank_a = _git_count_trailing_blank("".join(alines))
+        blank_b = _git_count_trailing_blank("".join(blines))
+        if blank_b > blank_a:
+            blank_a = len(alines) - blank_a + 1
+            blank_b = len(blines) - blank_b + 1
+        else:
+            blank_a = blank_b = 0
+    alines = _with_final_newline(alines)
+    blines = _with_final_newline(blines)
+    out = []
+    for i1, i2, j1, j2, hunk in _hunks(alines, ranges):
+        _write_hunk_header(out, alines, i1, i2, j1, j2, use_color)
+        pos = i1
+        for ci1, ci2, cj1, cj2 in hunk + [(i2, i2, j2, j2)]:
+            if use_color:
+                for line in alines[pos:ci1]:
+                    _git_emit_line(out, '', ' ', line)
+                for line in alines[ci1:ci2]:
+                    _git_emit_line(out, _GIT_OLD, '-', line)
+                for j in range(cj1, cj2):
+                    line = blines[j]
+                    # Line numbers as counted by git, at this line
+                    lno_a = i1 + (i2 > i1) + ci2 - i1
+                    lno_b = j1 + (j2 > j1) + j - j1 + 1
+                    if (blank_a and blank_a <= lno_a and blank_b <= lno_b and
+                            not line.strip(_git_space)):
+                        _git_emit_line(out, _GIT_WS, '+', line)
+                    else:
+                        out.append(_GIT_NEW + '+' + _GIT_RESET)
+                        _git_ws_check_emit(out, line)
+            else:
+                out.extend(' ' + line for line in alines[pos:ci1])
+                out.extend('-' + line for line in alines[ci1:ci2])
+                out.extend('+' + line for line in blines[cj1:cj2])
+            pos = ci2
+    return "".join(out)
+
+
+def diff_render_unified(a, b, use_color):
+    "Render a unified diff of two strings, without the file header, like git diff."
+    return render_unified(*_diff_lines(a, b), use_color)
+
+
+def patch_lines(a, di):
+    """Apply the line based diff di to the string a, as patch does.
+
+    Returns the lines of a and of the patched string, as split by
+    split_lines, and the lines changed by di as (i1, i2, j1, j2).
+    Returns None if di changes how the strings split into lines,
+    e.g. by patching a newline into a line.
+    """
+    alines = a.splitlines(True)
+    blines = []
+    ranges = []
+    pos = 0
+    for e in di:
+        op = e.op
+        key = e.key
+        if key > pos:
+            blines.extend(alines[pos:key])
+            pos = key
+        elif key < pos and not (op == DiffOp.ADDRANGE and ranges and
+                                ranges[-1][0] <= key and ranges[-1][1] == pos):
+            # Only additions can follow a removal of the same lines
+            return None
+        if op == DiffOp.ADDRANGE and isinstance(e.valuelist, list):
+            lines = e.valuelist
+            length = 0
+        elif op == DiffOp.REMOVERANGE:
+            lines = []
+            length = e.length
+        elif op == DiffOp.PATCH:
+            lines = [patch_singleline_string(alines[key], e.diff)]
+            length = 1
+        else:
+            return None
+        if not lines and not length:
+            continue
+        j = len(blines)
+        blines.extend(lines)
+        if ranges and ranges[-1][1] >= key and ranges[-1][3] == j:
+            # Adjacent to the previous change
+            i1, i2, j1, j2 = ranges.pop()
+            ranges.append((i1, max(i2, key + length), j1, j + len(lines)))
+        else:
+            ranges.append((key, key + length, j, j + len(lines)))
+        pos = max(pos, key + length)
+    blines.extend(alines[pos:])
+
+    # Lines split by str.splitlines can end with other line breaks
+    for lines in (alines, blines):
+        for line in lines[:-1]:
+            if not line.endswith("\n") or "\n" in line[:-1]:
+                return None
+        if lines and "\n" in lines[-1][:-1]:
+            return None
+    return alines, blines, compact_changes(alines, blines, ranges)
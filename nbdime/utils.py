@@ -337,9 +337,7 @@ class defaultdict2(defaultdict):
         self.default_values = default_values
 
     def copy(self):
-        c = super(defaultdict2, self).copy()
-        c.default_values = self.default_values.copy()
-        return c
+        return type(self)(self.default_factory, self.default_values.copy(), self)
 
     def __missing__(self, key):
         try:
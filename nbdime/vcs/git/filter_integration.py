@@ -1,6 +1,7 @@
 
 import io
-from subprocess import check_output, STDOUT, CalledProcessError
+import os
+from subprocess import check_output, run, Popen, PIPE, STDOUT, CalledProcessError
 
 from io import StringIO
 
@@ -11,77 +12,299 @@ class NamedStringIO(StringIO):
     name = ''
 
 
+def _parse_filter_attr(info):
+    if not info or info in ('unspecified', 'set', 'unset'):
+        return None
+    return info
+
+
 def interrogate_filter(path):
     """Check whether a filter git attribute is set for path.
 
     Returns None if no valid filter attribute could be found.
+    Use GitFilters.filter_attr to look up several paths.
     """
-    # Ask for the filter attributes of file on path (-z = null-terminated fields)
-    try:
-        spec = check_output(['git', 'check-attr', '-z', 'filter', path])
-    except CalledProcessError:
-        return None
-    try:
-        path_list, attr, info = [s.decode('utf8', 'replace') for s in spec.split(b'\x00')[:3]]
-    except ValueError:
-        # For older versions of git, the `-z` flag is unsupported
-        # This will then raise a ValueError when trying to unpack
-        return None
-    if attr != 'filter' or path != path_list:
-        raise ValueError(
-            'Unexpected output from git check-attr. ' +
-            ('Expected to start with "%s\x00filter", ' % path) +
-            ('started with "%s\x00%s"' % (path_list, attr))
-        )
-    if not info or info in ('unspecified', 'set', 'unset'):
-        return None
-    # We have a valid attribute
-    return info
+    return GitFilters().filter_attr(path)
 
 
 def get_clean_filter_cmd(filter_attr):
     """Given a filter attribute, look up its driver in git config.
 
-    Returns None if noe valid config could be found.
+    Returns None if no valid config could be found.
+    Use GitFilters.filter_config to look up several drivers.
     """
-    try:
-        spec = check_output([
-            'git', 'config', '--get', '-z', 'filter.%s.clean' % filter_attr
-        ])
-        return spec.split(b'\x00')[0].decode('utf8', 'replace') or None
-    except CalledProcessError:
-        return None
+    return GitFilters().filter_config(filter_attr, 'clean')
 
 
-def apply_possible_filter(git_path, path=None):
+def apply_possible_filter(git_path, path=None, filters=None):
     """Apply any configured git filters to path.
 
     Returns the original remote path if no filter is configured,
     or a StringIO instance with the filtered content if a filter
     should be applied.
+
+    Pass a GitFilters instance as filters to reuse its attribute
+    lookups, configuration and filter processes for several files.
+    """
+    if filters is None:
+        with GitFilters() as filters:
+            return filters.apply(git_path, path)
+    return filters.apply(git_path, path)
+
+
+# Maximal length of data in a pkt-line, as used by git's long-running
+# process protocol
+_PKT_MAX_DATA = 65516
+
+
+def _write_pkt(stream, data):
+    stream.write(b'%04x' % (len(data) + 4) + data)
+
+
+def _write_pkt_text(stream, text):
+    _write_pkt(stream, (text + '\n').encode('utf8'))
+
+
+def _write_flush(stream):
+    stream.write(b'0000')
+
+
+def _read_pkt(stream):
+    """Read a pkt-line from stream, returns None for a flush packet"""
+    header = stream.read(4)
+    if len(header) != 4:
+        raise RuntimeError('Unexpected end of output from git filter process')
+    length = int(header, 16)
+    if length == 0:
+        return None
+    return stream.read(length - 4)
+
+
+def _read_pkt_list(stream):
+    """Read text pkt-lines from stream until the next flush packet"""
+    items = []
+    while True:
+        data = _read_pkt(stream)
+        if data is None:
+            return items
+        items.append(data.decode('utf8').rstrip('\n'))
+
+
+def _read_pkt_content(stream):
+    """Read binary pkt-lines from stream until the next flush packet"""
+    chunks = []
+    while True:
+        data = _read_pkt(stream)
+        if data is None:
+            return b''.join(chunks)
+        chunks.append(data)
+
+
+def _status(items, default):
+    for item in reversed(items):
+        if item.startswith('status='):
+            return item[len('status='):]
+    return default
+
+
+class LongRunningFilter(object):
+    """A filter process speaking git's long-running process protocol
+
+    As configured by filter.<driver>.process, the filter process is
+    started once and then cleans any number of files.
+    """
+
+    def __init__(self, cmd, cwd=None):
+        self.cmd = cmd
+        self.proc = Popen(cmd, shell=True, cwd=cwd, stdin=PIPE, stdout=PIPE)
+        try:
+            self._handshake()
+        except Exception:
+            self.close()
+            raise
+
+    def _handshake(self):
+        stdin, stdout = self.proc.stdin, self.proc.stdout
+        _write_pkt_text(stdin, 'git-filter-client')
+        _write_pkt_text(stdin, 'version=2')
+        _write_flush(stdin)
+        stdin.flush()
+        welcome = _read_pkt_list(stdout)
+        if 'git-filter-server' not in welcome or 'version=2' not in welcome:
+            raise RuntimeError(
+                'Unexpected welcome from git filter process %r: %r' % (self.cmd, welcome))
+        _write_pkt_text(stdin, 'capability=clean')
+        _write_flush(stdin)
+        stdin.flush()
+        capabilities = _read_pkt_list(stdout)
+        if 'capability=clean' not in capabilities:
+            raise RuntimeError(
+                'Git filter process %r does not support clean' % self.cmd)
+
+    def clean(self, pathname, content):
+        """Clean the bytes content of the file at pathname"""
+        stdin, stdout = self.proc.stdin, self.proc.stdout
+        _write_pkt_text(stdin, 'command=clean')
+        _write_pkt_text(stdin, 'pathname=%s' % pathname)
+        _write_flush(stdin)
+        for start in range(0, len(content), _PKT_MAX_DATA):
+            _write_pkt(stdin, content[start:start + _PKT_MAX_DATA])
+        _write_flush(stdin)
+        stdin.flush()
+        status = _status(_read_pkt_list(stdout), None)
+        if status == 'success':
+            output = _read_pkt_content(stdout)
+            # The status can be changed after the content
+            status = _status(_read_pkt_list(stdout), status)
+        if status != 'success':
+            raise RuntimeError(
+                'Git filter process %r failed to clean %r with status %r' % (
+                    self.cmd, pathname, status))
+        return output
+
+    def close(self):
+        if self.proc.poll() is None:
+            try:
+                self.proc.stdin.close()
+            except OSError:
+                pass
+            self.proc.wait()
+        self.proc.stdout.close()
+
+
+class GitFilters(object):
+    """Applies git clean filters to files in a working tree
+
+    Caches the filter configuration of the repository, looks up the
+    filter attributes of several paths with a single git process, and
+    starts filter processes configured by filter.<driver>.process once,
+    for all files. Use as a context manager, or call close() when done.
+    All paths are relative to cwd (default: the current directory).
     """
-    if path is None:
-        path = git_path
-
-    if path == EXPLICIT_MISSING_FILE:
-        return path
-
-    filter_attr = interrogate_filter(git_path)
-    if not filter_attr:
-        return path
-    filter_cmd = get_clean_filter_cmd(filter_attr)
-    if not filter_cmd:
-        return path
-
-    # Apply filter and pipe to a string buffer
-    with io.open(path, 'r', encoding="utf8") as f:
-        output = check_output(
-            filter_cmd,
-            stdin=f,
-            stderr=STDOUT, shell=True
-        ).decode('utf8', 'replace')
-    buffer = NamedStringIO()
-    buffer.name = path
-    buffer.write(output)
-    buffer.seek(0)
-    return buffer
+
+    def __init__(self, cwd=None):
+        self.cwd = os.path.abspath(cwd or os.curdir)
+        self._attributes = {}
+        self._config = None
+        self._root = None
+        self._processes = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Stop any filter processes that have been started"""
+        processes, self._processes = self._processes, {}
+        for process in processes.values():
+            process.close()
+
+    def lookup(self, paths):
+        """Look up the filter attributes of paths in one batch.
+
+        The attributes are cached for filter_attr().
+        """
+        paths = [p for p in paths if p not in self._attributes]
+        if not paths:
+            return
+        for p in paths:
+            self._attributes[p] = None
+        proc = run(
+            ['git', 'check-attr', '-z', '--stdin', 'filter'],
+            input=b''.join(p.encode('utf8') + b'\x00' for p in paths),
+            stdout=PIPE, stderr=PIPE, cwd=self.cwd)
+        if proc.returncode != 0:
+            # E.g. not in a repository
+            return
+        fields = proc.stdout.split(b'\x00')
+        if len(fields) < 3 * len(paths):
+            # For older versions of git, the `-z` flag is unsupported
+            return
+        for i, p in enumerate(paths):
+            path_out, attr, info = [
+                s.decode('utf8', 'replace') for s in fields[3 * i:3 * i + 3]]
+            if attr != 'filter' or path_out != p:
+                raise ValueError(
+                    'Unexpected output from git check-attr. ' +
+                    ('Expected "%s\x00filter", ' % p) +
+                    ('got "%s\x00%s"' % (path_out, attr))
+                )
+            self._attributes[p] = _parse_filter_attr(info)
+
+    def filter_attr(self, path):
+        """The filter attribute of path, or None if no valid filter attribute is set"""
+        self.lookup([path])
+        return self._attributes[path]
+
+    def filter_config(self, filter_attr, key):
+        """The value of filter.<filter_attr>.<key> in the git config, or None"""
+        if self._config is None:
+            self._config = {}
+            try:
+                spec = check_output(
+                    ['git', 'config', '-z', '--get-regexp', r'^filter\.'],
+                    cwd=self.cwd)
+            except CalledProcessError:
+                # No filters configured
+                spec = b''
+            for entry in spec.split(b'\x00'):
+                name, _, value = entry.decode('utf8', 'replace').partition('\n')
+                driver, _, var = name[len('filter.'):].rpartition('.')
+                if driver:
+                    self._config[(driver, var.lower())] = value or None
+        return self._config.get((filter_attr, key))
+
+    def _toplevel(self):
+        if self._root is None:
+            self._root = os.path.abspath(check_output(
+                ['git', 'rev-parse', '--show-toplevel'], cwd=self.cwd
+            ).decode('utf8').strip())
+        return self._root
+
+    def _process(self, cmd):
+        process = self._processes.get(cmd)
+        if process is None:
+            # Git runs filters in the root of the working tree
+            process = LongRunningFilter(cmd, cwd=self._toplevel())
+            self._processes[cmd] = process
+        return process
+
+    def apply(self, git_path, path=None):
+        """Apply any configured git filters to path, see apply_possible_filter"""
+        if path is None:
+            path = git_path
+
+        if path == EXPLICIT_MISSING_FILE:
+            return path
+
+        filter_attr = self.filter_attr(git_path)
+        if not filter_attr:
+            return path
+        process_cmd = self.filter_config(filter_attr, 'process')
+        if process_cmd:
+            with io.open(os.path.join(self.cwd, path), 'rb') as f:
+                content = f.read()
+            # Filter processes are passed paths relative to the root
+            pathname = os.path.relpath(
+                os.path.join(self.cwd, git_path), self._toplevel())
+            pathname = pathname.replace(os.sep, '/')
+            output = self._process(process_cmd).clean(pathname, content)
+        else:
+            filter_cmd = self.filter_config(filter_attr, 'clean')
+            if not filter_cmd:
+                return path
+            # Apply filter and pipe to a string buffer
+            with io.open(os.path.join(self.cwd, path), 'r', encoding="utf8") as f:
+                output = check_output(
+                    filter_cmd,
+                    stdin=f,
+                    stderr=STDOUT, shell=True,
+                    cwd=self.cwd,
+                )
+        buffer = NamedStringIO()
+        buffer.name = path
+        buffer.write(output.decode('utf8', 'replace'))
+        buffer.seek(0)
+        return buffer
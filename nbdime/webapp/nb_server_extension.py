@@ -52,6 +52,7 @@ from .nbdimeserver import (
     NbdimeHandler,
     MainDifftoolHandler,
     ApiDiffHandler,
+    ApiBlobHandler,
     APIHandler,
 )
 
@@ -193,7 +194,7 @@ class ExtensionApiDiffHandler(BaseGitDiffHandler):
             base_nb, remote_nb = await self._get_checkpoint_notebooks(base[len('checkpoint:'):])
         else:
             # Regular files, call super
-            super(ExtensionApiDiffHandler, self).post()
+            await super(ExtensionApiDiffHandler, self).post()
             return
 
         # Perform actual diff and return data:
@@ -205,9 +206,9 @@ class ExtensionApiDiffHandler(BaseGitDiffHandler):
 
         data = {
             'base': base_nb,
-            'diff': thediff,
+            'diff': self.externalize_blobs(thediff),
             }
-        self.finish(data)
+        await self.finish_json(data)
 
 
 class GitDiffHandler(BaseGitDiffHandler):
@@ -282,9 +283,9 @@ class GitDiffHandler(BaseGitDiffHandler):
 
             data = {
                 'base': base_nb,
-                'diff': thediff,
+                'diff': self.externalize_blobs(thediff),
             }
-            self.finish(data)
+            yield self.finish_json(data)
         except HTTPError:
             raise
         except Exception:
@@ -310,6 +311,12 @@ class IsGitHandler(NbdimeHandler, APIHandler):
         self.finish(data)
 
 
+class ExtensionApiBlobHandler(ApiBlobHandler):
+    @authenticated
+    def get(self, digest):
+        return super(ExtensionApiBlobHandler, self).get(digest)
+
+
 def _load_jupyter_server_extension(nb_server_app, nb6_entrypoint=False):
     """
     Called when the extension is loaded.
@@ -346,7 +353,7 @@ def _load_jupyter_server_extension(nb_server_app, nb6_entrypoint=False):
     for k in diff_ignorables:
         config[k] = config.get(k, None)
     ns = Namespace(config)
-    process_diff_flags(ns)
+    process_diff_flags(ns, server=True)
     if ignore:
         set_notebook_diff_ignores(ignore)
 
@@ -362,7 +369,8 @@ def _load_jupyter_server_extension(nb_server_app, nb6_entrypoint=False):
         (r'/nbdime/git-difftool', GitDifftoolHandler, params),
         (r'/nbdime/api/diff', ExtensionApiDiffHandler, params),
         (r'/nbdime/api/isgit', IsGitHandler, params),
-        (r'/nbdime/api/gitdiff', GitDiffHandler, params)
+        (r'/nbdime/api/gitdiff', GitDiffHandler, params),
+        (r'/nbdime/api/blob/(sha256:[0-9a-f]+)', ExtensionApiBlobHandler, params),
     ]
 
     # Prefix routes with base_url:
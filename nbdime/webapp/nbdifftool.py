@@ -40,7 +40,7 @@ def main_parsed(opts):
 
     Called by both main here and gitdifftool
     """
-    process_diff_flags(opts)
+    process_diff_flags(opts, server=True)
     base = opts.local
     remote = opts.remote
     return run_server(
@@ -75,7 +75,7 @@ def handle_gitrefs(base, remote, path, arguments):
 
 
 def main_diff(opts):
-    process_diff_flags(opts)
+    process_diff_flags(opts, server=True)
     base, remote, path = resolve_diff_args(opts)
     if is_gitref(base) and is_gitref(remote):
         # We are asked to do a gui for git diff
@@ -7,6 +7,7 @@ import json
 import logging
 import os
 import sys
+from collections import OrderedDict
 
 from jinja2 import FileSystemLoader, Environment
 import nbformat
@@ -18,6 +19,7 @@ from tornado import ioloop, web, escape, netutil, httpserver
 
 from .. import __file__ as nbdime_root
 from ..args import ConfigBackedParser, add_generic_args, add_web_args
+from ..diff_utils import iter_json_chunks, externalize_blobs
 from ..diffing.notebooks import diff_notebooks
 from ..log import logger
 from ..merging.notebooks import decide_notebook_merge
@@ -39,10 +41,76 @@ static_path = os.path.join(here, 'static')
 template_path = os.path.join(here, 'templates')
 
 
+class BlobStore(object):
+    """Blobs externalized from diffs, by content digest.
+
+    The oldest blobs are dropped when the total size exceeds maxsize
+    characters.
+    """
+
+    def __init__(self, maxsize=256 * 2**20):
+        self.maxsize = maxsize
+        self.size = 0
+        self._blobs = OrderedDict()
+
+    def update(self, blobs):
+        for digest, value in blobs.items():
+            if digest in self._blobs:
+                self._blobs.move_to_end(digest)
+                continue
+            self._blobs[digest] = value
+            self.size += len(value)
+        while self.size > self.maxsize and len(self._blobs) > 1:
+            _, value = self._blobs.popitem(last=False)
+            self.size -= len(value)
+
+    def get(self, digest):
+        return self._blobs.get(digest)
+
+
 class NbdimeHandler(JupyterHandler):
     def initialize(self, **params):
         self.params = params
 
+    async def finish_json(self, data):
+        """Finish the response with data as JSON.
+
+        The JSON is written and flushed in chunks as it is serialized,
+        so large diffs are never held in memory as a single string.
+        """
+        self.set_header('Content-Type', 'application/json')
+        for chunk in iter_json_chunks(data):
+            self.write(chunk)
+            await self.flush()
+        await self.finish()
+
+    @property
+    def blob_store(self):
+        return self.settings.setdefault('nbdime_blob_store', BlobStore())
+
+    def externalize_blobs(self, diff):
+        """Externalize large strings in diff if the request asks for it.
+
+        If the request body has a "blob_threshold", strings of at least
+        that many characters added by diff are replaced by references,
+        see diff_utils.externalize_blobs. Clients fetch the ones they
+        need from /api/blob/<digest>.
+        """
+        try:
+            body = json.loads(escape.to_unicode(self.request.body))
+            threshold = body.get('blob_threshold')
+        except (ValueError, AttributeError):
+            threshold = None
+        if threshold is None:
+            return diff
+        if (not isinstance(threshold, int) or isinstance(threshold, bool) or
+                threshold < 1):
+            raise web.HTTPError(
+                400, 'blob_threshold must be a positive integer, got %r' % (threshold,))
+        diff, blobs = externalize_blobs(diff, threshold)
+        self.blob_store.update(blobs)
+        return diff
+
     def base_args(self):
         fn = self.params.get('outputfilename', None)
         base = {
@@ -207,7 +275,7 @@ class MainMergetoolHandler(NbdimeHandler):
 
 
 class ApiDiffHandler(NbdimeHandler, APIHandler):
-    def post(self):
+    async def post(self):
         base_nb = self.get_notebook_argument('base')
         remote_nb = self.get_notebook_argument('remote')
 
@@ -219,9 +287,9 @@ class ApiDiffHandler(NbdimeHandler, APIHandler):
 
         data = {
             'base': base_nb,
-            'diff': thediff,
+            'diff': self.externalize_blobs(thediff),
             }
-        self.finish(data)
+        await self.finish_json(data)
 
     def get_notebook_argument(self, argname):
         if 'difftool_args' in self.params:
@@ -235,7 +303,7 @@ class ApiDiffHandler(NbdimeHandler, APIHandler):
 
 
 class ApiMergeHandler(NbdimeHandler, APIHandler):
-    def post(self):
+    async def post(self):
         base_nb = self.get_notebook_argument('base')
         local_nb = self.get_notebook_argument('local')
         remote_nb = self.get_notebook_argument('remote')
@@ -256,7 +324,7 @@ class ApiMergeHandler(NbdimeHandler, APIHandler):
             'base': base_nb,
             'merge_decisions': decisions
             }
-        self.finish(data)
+        await self.finish_json(data)
 
     def get_notebook_argument(self, argname):
         if 'mergetool_args' in self.params:
@@ -265,6 +333,14 @@ class ApiMergeHandler(NbdimeHandler, APIHandler):
         return super(ApiMergeHandler, self).get_notebook_argument(argname)
 
 
+class ApiBlobHandler(NbdimeHandler, APIHandler):
+    def get(self, digest):
+        value = self.blob_store.get(digest)
+        if value is None:
+            raise web.HTTPError(404, 'Unknown blob: %s' % digest)
+        self.finish(value, set_content_type='text/plain; charset=UTF-8')
+
+
 class ApiMergeStoreHandler(NbdimeHandler, APIHandler):
     def post(self):
         # I don't think we want to accept arbitrary filenames
@@ -353,6 +429,7 @@ def make_app(**params):
         (r'/mergetool', MainMergetoolHandler, params),
         (r'/api/diff', ApiDiffHandler, params),
         (r'/api/merge', ApiMergeHandler, params),
+        (r'/api/blob/(sha256:[0-9a-f]+)', ApiBlobHandler, params),
         (r'/api/store', ApiMergeStoreHandler, params),
         (r'/api/closetool', ApiCloseHandler, params),
         # Static handler will be added automatically
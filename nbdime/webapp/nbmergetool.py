@@ -41,7 +41,7 @@ def main_parsed(opts):
 
     Called by both main here and gitmergetool
     """
-    process_diff_flags(opts)
+    process_diff_flags(opts, server=True)
     base = opts.base
     local = opts.local
     remote = opts.remote
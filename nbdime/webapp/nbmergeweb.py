@@ -50,7 +50,7 @@ def main(args=None):
     if args is None:
         args = sys.argv[1:]
     arguments = build_arg_parser().parse_args(args)
-    process_diff_flags(arguments)
+    process_diff_flags(arguments, server=True)
     base = arguments.base
     local = arguments.local
     remote = arguments.remote